@@ -35,4 +35,32 @@ class PlaybookStatus(models.TextChoices):
     NOT_STARTED = 'not_started', 'Not Started'
     IN_PROGRESS = 'in_progress', 'In Progress'
     PAUSED = 'paused', 'Paused'
-    COMPLETED = 'completed', 'Completed'
\ No newline at end of file
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+
+class JobStatus(models.TextChoices):
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+class TimingWindow(models.TextChoices):
+    DAY = 'day', 'Day'
+    WEEK = 'week', 'Week'
+    MONTH = 'month', 'Month'
+
+class MTTxMetric(models.TextChoices):
+    MTD = 'mtd', 'Mean Time to Detect'
+    MTA = 'mta', 'Mean Time to Analyze'
+    MTR = 'mtr', 'Mean Time to Respond'
+
+class FeedFormat(models.TextChoices):
+    CSV = 'csv', 'CSV'
+    JSONL = 'jsonl', 'JSON lines'
+    STIX = 'stix', 'STIX 2 bundle'
+
+class ImportStatus(models.TextChoices):
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
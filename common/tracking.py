@@ -0,0 +1,68 @@
+class FieldTrackerMixin:
+    """Remember the values a model instance was loaded with and only write what changed.
+
+    ``save()`` on a loaded instance turns into an ``update_fields`` UPDATE of
+    the dirty fields (plus any ``auto_now`` fields), and is skipped entirely
+    when nothing changed. Because the fields are passed as ``update_fields``,
+    post_save receivers get them in their ``update_fields`` argument and can
+    return early when nothing they care about was touched. Callers that pass
+    ``update_fields`` themselves keep full control.
+
+    Put the mixin before ``models.Model`` in the bases.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_loaded_values()
+        return instance
+
+    def _snapshot_loaded_values(self, field_names=None):
+        fields = self._meta.concrete_fields
+        if field_names is None:
+            self._loaded_values = {}
+        else:
+            fields = [self._meta.get_field(name) for name in field_names]
+            self._loaded_values = getattr(self, '_loaded_values', None) or {}
+        for field in fields:
+            if field.attname in self.__dict__:
+                self._loaded_values[field.attname] = getattr(self, field.attname)
+
+    def get_loaded_value(self, field_name, default=None):
+        """Value ``field_name`` had when the instance was last loaded or saved."""
+        attname = self._meta.get_field(field_name).attname
+        return getattr(self, '_loaded_values', {}).get(attname, default)
+
+    def get_dirty_fields(self):
+        """Names of the concrete fields that differ from the loaded snapshot."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return {field.name for field in self._meta.concrete_fields if not field.primary_key}
+        dirty = set()
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if field.attname not in loaded or loaded[field.attname] != getattr(self, field.attname):
+                dirty.add(field.name)
+        return dirty
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not args and not self._state.adding \
+                and getattr(self, '_loaded_values', None) is not None:
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            dirty.update(
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            )
+            kwargs['update_fields'] = dirty
+        super().save(*args, **kwargs)
+        self._snapshot_loaded_values(update_fields)
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is not None:
+            fields = [f.name for f in self._meta.concrete_fields if f.name in fields or f.attname in fields]
+        self._snapshot_loaded_values(fields)
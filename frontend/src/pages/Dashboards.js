@@ -38,13 +38,16 @@ const Dashboard = () => {
   const fetchIncidents = async () => {
     try {
       const params = new URLSearchParams(filters);
-      const response = await axios.get(
-        `http://localhost:8000/incidents/api/incidents/?${params.toString()}`,
-        {
+      // The API is cursor-paginated: follow the next links to get every page
+      const incidents = [];
+      let url = `http://localhost:8000/incidents/api/incidents/?${params.toString()}`;
+      while (url) {
+        const response = await axios.get(url, {
           headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
-        }
-      );
-      const incidents = response.data;
+        });
+        incidents.push(...response.data.results);
+        url = response.data.next;
+      }
       setAllIncidents(incidents);
       const myAnalystId = user.analyst_id; // Adjust based on your AuthContext
       const myIncidents = incidents.filter((incident) =>
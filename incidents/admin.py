@@ -1,6 +1,12 @@
 from django.contrib import admin
-from .models import Incident, Ticket  # Import your Incident model (adjust if named differently)
+from .models import Incident, Ticket, Job  # Import your Incident model (adjust if named differently)
 
 admin.site.register(Incident)
 admin.site.register(Ticket)
 
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_after', 'created_at', 'completed_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'completed_at', 'locked_by', 'last_error')
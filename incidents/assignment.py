@@ -0,0 +1,87 @@
+"""Set-based auto-assignment of tickets to on-shift analysts.
+
+Workloads for every analyst in the current shift are read from their
+``open_ticket_count`` counters in a single locking query, tickets are handed
+out from an in-memory least-loaded heap that never exceeds ``max_capacity``,
+and the result is written back with one bulk insert on the ticket/analyst
+link table, one UPDATE on tickets and one UPDATE on the counters.
+"""
+import heapq
+from collections import Counter
+from django.db import transaction
+from django.utils import timezone
+from common.enums import TicketStatus
+from users.models import Analyst
+from .models import Ticket
+
+
+def load_analyst_workloads(at=None):
+    """Return on-shift analysts, locked until the end of the transaction, in one query."""
+    at = at or timezone.now()
+    return list(
+        Analyst.objects.select_for_update(of=('self',)).filter(
+            current_shift__start_time__lte=at,
+            current_shift__end_time__gte=at
+        ).order_by('pk')
+    )
+
+
+def plan_assignments(tickets, analysts):
+    """Pick an analyst for each ticket, least loaded first, without touching the database.
+
+    Ties go to the analyst that comes first in ``analysts``. Tickets left
+    over once every analyst is at capacity are not part of the returned
+    ``{ticket_pk: analyst}`` dict.
+    """
+    heap = [
+        (analyst.open_ticket_count, position, analyst)
+        for position, analyst in enumerate(analysts)
+        if analyst.open_ticket_count < analyst.max_capacity
+    ]
+    heapq.heapify(heap)
+    plan = {}
+    for ticket in tickets:
+        if not heap:
+            break
+        load, position, analyst = heapq.heappop(heap)
+        plan[ticket.pk] = analyst
+        load += 1
+        analyst.open_ticket_count = load
+        if load < analyst.max_capacity:
+            heapq.heappush(heap, (load, position, analyst))
+    return plan
+
+
+def assign_tickets(tickets, analysts=None):
+    """Auto-assign ``tickets`` and persist the result in bulk.
+
+    ``tickets`` are expected to be open and not yet assigned. Returns the
+    ``{ticket_pk: analyst}`` dict of assignments made. The in-memory tickets
+    are updated to match what was written.
+    """
+    tickets = list(tickets)
+    if not tickets:
+        return {}
+    current_time = timezone.now()
+    with transaction.atomic():
+        if analysts is None:
+            analysts = load_analyst_workloads(current_time)
+        plan = plan_assignments(tickets, analysts)
+        if not plan:
+            return plan
+
+        through = Ticket.assigned_analysts.through
+        through.objects.bulk_create(
+            [through(ticket_id=ticket_id, analyst_id=analyst.pk) for ticket_id, analyst in plan.items()],
+            ignore_conflicts=True
+        )
+        Ticket.objects.filter(pk__in=plan).update(
+            status=TicketStatus.ASSIGNED, assignment_timestamp=current_time
+        )
+        Analyst.adjust_workloads(Counter(analyst.pk for analyst in plan.values()))
+
+    for ticket in tickets:
+        if ticket.pk in plan:
+            ticket.status = TicketStatus.ASSIGNED
+            ticket.assignment_timestamp = current_time
+    return plan
@@ -0,0 +1,86 @@
+"""Set-based incident ingestion for alert bursts coming from the SIEM.
+
+Creating incidents one by one fires the whole post_save cascade per row
+(create_ticket, assign_ticket_to_analyst, set_deadline_timestamp and
+update_metrics). ``ingest_incidents`` builds the same rows with bulk_create
+instead, so the number of queries depends on the batch, not on its size:
+
+    1  client lookup
+    1  INSERT incidents
+    1  INSERT tickets (deadline computed up front)
+    1  INSERT metrics
+    1  SELECT ... FOR UPDATE on-shift analysts
+    1  INSERT ticket/analyst links
+    1  UPDATE assigned tickets
+    1  UPDATE analyst open ticket counters
+    +  SAVEPOINT/RELEASE pairs when nested in an outer transaction
+
+That is at most ``BULK_INGEST_MAX_QUERIES`` queries for a batch of up to
+``BULK_INGEST_MAX_ITEMS`` incidents. No post_save signal is sent for rows
+created here.
+"""
+from django.db import transaction
+from django.utils import timezone
+from clients.models import Client
+from .assignment import assign_tickets
+from .models import Incident, Ticket, Metrics, SLA_DURATIONS, DEFAULT_SLA_DURATION
+from .serializers import IncidentBulkItemSerializer
+
+BULK_INGEST_MAX_ITEMS = 1000
+BULK_INGEST_MAX_QUERIES = 12
+
+
+def ingest_incidents(items):
+    """Create incidents, tickets and metrics for ``items`` and auto-assign them.
+
+    Returns one result dict per item, in input order. Valid items get
+    ``{'index', 'id', 'ticket', 'assigned_analyst'}``, invalid ones
+    ``{'index', 'errors'}``; invalid items never prevent the others from
+    being created.
+    """
+    results = [None] * len(items)
+    validated = []
+    for index, item in enumerate(items):
+        serializer = IncidentBulkItemSerializer(data=item)
+        if serializer.is_valid():
+            validated.append((index, serializer.validated_data))
+        else:
+            results[index] = {'index': index, 'errors': serializer.errors}
+
+    client_ids = {data['client'] for _, data in validated}
+    existing_clients = set(Client.objects.filter(pk__in=client_ids).values_list('pk', flat=True)) if client_ids else set()
+    rows = []
+    for index, data in validated:
+        if data['client'] not in existing_clients:
+            results[index] = {'index': index, 'errors': {'client': [f"Invalid pk \"{data['client']}\" - object does not exist."]}}
+        else:
+            rows.append((index, data))
+
+    if rows:
+        with transaction.atomic():
+            incidents = Incident.objects.bulk_create([
+                Incident(
+                    client_id=data['client'],
+                    severity=data['severity'],
+                    incident_type=data.get('incident_type', ''),
+                    sla_duration=data.get('sla_duration') or SLA_DURATIONS.get(data['severity'], DEFAULT_SLA_DURATION),
+                )
+                for _, data in rows
+            ])
+            now = timezone.now()
+            tickets = Ticket.objects.bulk_create([
+                Ticket(incident=incident, deadline_timestamp=now + incident.sla_duration)
+                for incident in incidents
+            ])
+            Metrics.objects.bulk_create([Metrics(ticket=ticket) for ticket in tickets])
+            assignments = assign_tickets(tickets)
+
+        for (index, _), incident, ticket in zip(rows, incidents, tickets):
+            analyst = assignments.get(ticket.pk)
+            results[index] = {
+                'index': index,
+                'id': incident.pk,
+                'ticket': ticket.pk,
+                'assigned_analyst': analyst.pk if analyst else None,
+            }
+    return results
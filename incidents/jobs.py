@@ -0,0 +1,213 @@
+"""Postgres-backed job queue for work that should not hold up a request.
+
+``enqueue()`` inserts a ``Job`` row, in the caller's transaction, naming a
+handler registered with ``@job_handler``. Workers (``manage.py run_jobs``)
+claim due jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``, so concurrent
+workers never block on or double-claim a row, and push the job's
+``run_after`` out by its visibility timeout; a heartbeat thread keeps
+pushing it out while the handler runs, however long that takes. A worker
+that dies mid-job leaves it to be claimed again once that timeout passes, so
+handlers must be safe to run more than once. A job whose worker died on its
+last attempt is marked failed instead of being claimed again.
+
+A handler that raises is retried with exponential backoff until
+``max_attempts``, then marked failed with its last error. Results are only
+recorded by the worker still holding the claim.
+"""
+import logging
+import os
+import random
+import threading
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from common.enums import ImportStatus, JobStatus
+from .models import Analysis, Incident, Job
+
+logger = logging.getLogger(__name__)
+
+JOB_VISIBILITY_TIMEOUT = getattr(settings, 'JOB_VISIBILITY_TIMEOUT', timezone.timedelta(minutes=5))
+JOB_RETRY_BASE_DELAY = getattr(settings, 'JOB_RETRY_BASE_DELAY', timezone.timedelta(seconds=10))
+JOB_RETRY_MAX_DELAY = getattr(settings, 'JOB_RETRY_MAX_DELAY', timezone.timedelta(hours=1))
+JOB_MAX_ATTEMPTS = getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+JOB_POLL_INTERVAL = getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+JOB_RETENTION = getattr(settings, 'JOB_RETENTION', timezone.timedelta(days=7))
+
+JOB_HANDLERS = {}
+
+
+def job_handler(name):
+    """Register the decorated function as the handler of jobs called ``name``; it gets the payload as kwargs."""
+    def register(function):
+        JOB_HANDLERS[name] = function
+        return function
+    return register
+
+
+def enqueue(name, max_attempts=JOB_MAX_ATTEMPTS, run_after=None, **payload):
+    if name not in JOB_HANDLERS:
+        raise ValueError(f"No job handler registered for {name!r}")
+    return Job.objects.create(
+        name=name, payload=payload, max_attempts=max_attempts, run_after=run_after or timezone.now()
+    )
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: doubling from JOB_RETRY_BASE_DELAY, capped, with jitter."""
+    delay = min(JOB_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim_jobs(worker_id, limit=1, visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+    """Claim up to ``limit`` due jobs for ``worker_id``, oldest first."""
+    now = timezone.now()
+    with transaction.atomic():
+        Job.objects.filter(status=JobStatus.RUNNING, run_after__lte=now, attempts__gte=F('max_attempts')).update(
+            status=JobStatus.FAILED, locked_by='', completed_at=now,
+            last_error="Worker stopped responding during the last attempt",
+        )
+        ids = list(Job.objects.select_for_update(skip_locked=True).filter(
+            status__in=[JobStatus.QUEUED, JobStatus.RUNNING], run_after__lte=now, attempts__lt=F('max_attempts')
+        ).order_by('run_after').values_list('id', flat=True)[:limit])
+        Job.objects.filter(id__in=ids).update(
+            status=JobStatus.RUNNING, locked_by=worker_id,
+            run_after=now + visibility_timeout, attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(id__in=ids, locked_by=worker_id).order_by('run_after'))
+
+
+@contextmanager
+def _heartbeat(claimed, visibility_timeout):
+    """Keep pushing the claimed job's ``run_after`` out until the block exits."""
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(visibility_timeout.total_seconds() / 3):
+                claimed.update(run_after=timezone.now() + visibility_timeout)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name='job-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run_job(job, visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+    """Run a claimed job's handler and record the outcome; returns the job's new status."""
+    claimed = Job.objects.filter(pk=job.pk, locked_by=job.locked_by, status=JobStatus.RUNNING)
+    try:
+        handler = JOB_HANDLERS[job.name]
+        with _heartbeat(claimed, visibility_timeout):
+            handler(**job.payload)
+    except Exception as error:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.name, job.attempts)
+        if job.attempts >= job.max_attempts:
+            status, changes = JobStatus.FAILED, {'completed_at': timezone.now()}
+        else:
+            status, changes = JobStatus.QUEUED, {'run_after': timezone.now() + retry_delay(job.attempts)}
+        claimed.update(status=status, locked_by='', last_error=f"{type(error).__name__}: {error}", **changes)
+        return status
+    claimed.update(status=JobStatus.DONE, locked_by='', completed_at=timezone.now())
+    return JobStatus.DONE
+
+
+def prune_jobs(before):
+    """Delete finished jobs completed before ``before``."""
+    return Job.objects.filter(
+        status__in=[JobStatus.DONE, JobStatus.FAILED], completed_at__lt=before
+    ).delete()[0]
+
+
+class Worker:
+    """Claims and runs jobs on ``concurrency`` threads until stopped."""
+
+    def __init__(self, concurrency=1, poll_interval=JOB_POLL_INTERVAL, visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.stopping = threading.Event()
+
+    def work(self, burst=False):
+        """Run jobs on the calling thread; with ``burst`` return once none are due. Returns the jobs run."""
+        done = 0
+        worker_id = f"{self.worker_id}-{threading.get_ident()}"
+        while not self.stopping.is_set():
+            close_old_connections()
+            jobs = claim_jobs(worker_id, visibility_timeout=self.visibility_timeout)
+            if not jobs:
+                if burst:
+                    break
+                self.stopping.wait(self.poll_interval)
+                continue
+            for job in jobs:
+                run_job(job, visibility_timeout=self.visibility_timeout)
+                done += 1
+        close_old_connections()
+        return done
+
+    def run(self, burst=False):
+        threads = [
+            threading.Thread(target=self.work, kwargs={'burst': burst}, name=f"job-worker-{number}")
+            for number in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        """Finish the jobs in hand, then exit."""
+        self.stopping.set()
+
+
+@job_handler('incidents.notify_client')
+def notify_client(incident_id, message):
+    Incident.objects.select_related('client', 'ticket').get(pk=incident_id).notify_client(message, fail_silently=False)
+
+
+@job_handler('incidents.start_playbook')
+def start_playbook(playbook_id, analysis_id):
+    from threat_intelligence.models import Playbook, PlaybookExecution  # Lazy import to avoid circular import
+    from threat_intelligence.playbook_runtime import PlaybookAlreadyRunning
+    with transaction.atomic():
+        if PlaybookExecution.objects.filter(playbook_id=playbook_id, analysis_id=analysis_id).exists():
+            return  # Already started by an earlier attempt
+        analysis = Analysis.objects.select_related('incident', 'ticket').get(pk=analysis_id)
+        try:
+            analysis.incident.start_playbook(Playbook.objects.get(pk=playbook_id), analysis.ticket, analysis)
+        except PlaybookAlreadyRunning:
+            logger.info("Playbook %s already running for incident %s", playbook_id, analysis.incident_id)
+
+
+@job_handler('threat_intelligence.run_playbook')
+def run_playbook(execution_id):
+    from threat_intelligence.playbook_engine import run_execution  # Lazy import to avoid circular import
+    run_execution(execution_id)
+
+
+@job_handler('threat_intelligence.import_feed')
+def import_ioc_feed(import_id):
+    from threat_intelligence.feeds import import_feed  # Lazy import to avoid circular import
+    from threat_intelligence.models import IOCFeedImport
+    job = IOCFeedImport.objects.get(pk=import_id)
+    if job.status == ImportStatus.COMPLETED:
+        return  # Finished by an earlier attempt
+    # A retry carries on after the batches the failed attempt already stored
+    with open(job.path, 'rb') as stream:
+        import_feed(stream, job.file_format, job.path, job=job)
+    os.remove(job.path)
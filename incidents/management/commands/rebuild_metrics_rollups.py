@@ -0,0 +1,15 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from incidents.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the MTTx MetricsRollup rows from the per-ticket Metrics."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--until', type=date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        written = rebuild_rollups(since=options['since'], until=options['until'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} rollup row(s)."))
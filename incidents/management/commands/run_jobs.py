@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from incidents.jobs import Worker, prune_jobs, JOB_POLL_INTERVAL, JOB_RETENTION, JOB_VISIBILITY_TIMEOUT
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (playbooks, client notifications) until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help="Jobs run at once by this process.")
+        parser.add_argument('--poll-interval', type=float, default=JOB_POLL_INTERVAL,
+                            help="Seconds an idle worker waits before looking for due jobs again.")
+        parser.add_argument('--visibility-timeout', type=int, default=int(JOB_VISIBILITY_TIMEOUT.total_seconds()),
+                            help="Seconds before a claimed job whose worker vanished is handed out again.")
+        parser.add_argument('--burst', action='store_true', help="Exit once no jobs are due.")
+
+    def handle(self, *args, **options):
+        pruned = prune_jobs(timezone.now() - JOB_RETENTION)
+        worker = Worker(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            visibility_timeout=timezone.timedelta(seconds=options['visibility_timeout']),
+        )
+        self.stdout.write(
+            f"Job worker {worker.worker_id} started with {options['concurrency']} threads "
+            f"({pruned} finished jobs pruned)."
+        )
+        worker.run(burst=options['burst'])
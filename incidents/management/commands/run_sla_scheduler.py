@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from incidents.sla import SLAScheduler, SLA_WARNING_THRESHOLDS
+
+
+class Command(BaseCommand):
+    help = "Fire SLA warning and breach events for unresolved tickets as their thresholds pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--thresholds', default=','.join(str(t) for t in SLA_WARNING_THRESHOLDS),
+            help="Comma separated shares of the SLA duration to warn at (1.0 = breach)."
+        )
+        parser.add_argument(
+            '--refresh-interval', type=int, default=30,
+            help="Seconds between incremental reloads of changed tickets."
+        )
+
+    def handle(self, *args, **options):
+        thresholds = [float(value) for value in options['thresholds'].split(',') if value]
+        scheduler = SLAScheduler(thresholds=thresholds)
+        self.stdout.write(f"SLA scheduler started with thresholds {thresholds}.")
+        scheduler.run_forever(refresh_interval=options['refresh_interval'])
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from incidents.sla import sweep_sla, SWEEP_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Refresh Ticket.sla_remaining and flag SLA breaches for unresolved tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and sweep every INTERVAL seconds (default: sweep once and exit)."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            updated = sweep_sla(batch_size=options['batch_size'])
+            self.stdout.write(f"Swept {updated} unresolved ticket(s).")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
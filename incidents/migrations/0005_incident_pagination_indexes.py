@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0001_initial'),
+        ('incidents', '0004_alter_ticket_status'),
+        ('threat_intelligence', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['creation_timestamp', 'id'], name='incident_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['status', 'creation_timestamp', 'id'], name='incident_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['severity', 'creation_timestamp', 'id'], name='incident_severity_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('incidents', '0005_incident_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='sla_breached',
+            field=models.BooleanField(default=False),
+        ),
+    ]
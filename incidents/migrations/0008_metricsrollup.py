@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:21
+
+import common.tracking
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0001_initial'),
+        ('incidents', '0007_ticket_updated_at_open_deadline_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('severity', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], max_length=10)),
+                ('day', models.DateField()),
+                ('metric', models.CharField(choices=[('mtd', 'Mean Time to Detect'), ('mta', 'Mean Time to Analyze'), ('mtr', 'Mean Time to Respond')], max_length=3)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('sketch', models.JSONField(default=dict)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metrics_rollups', to='clients.client')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['metric', 'day'], name='rollup_metric_day_idx')],
+                'unique_together': {('client', 'severity', 'day', 'metric')},
+            },
+            bases=(common.tracking.FieldTrackerMixin, models.Model),
+        ),
+    ]
@@ -1,16 +1,33 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Case, When, Value, Count, Exists, OuterRef
+from django.db.models.functions import Greatest, Now
 from django.utils import timezone
 from django.core.mail import send_mail
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from users.models import CustomUser, Analyst
 import logging
-from common.enums import IncidentStatus, TicketStatus, SeverityChoices
+from common.enums import IncidentStatus, TicketStatus, SeverityChoices, MTTxMetric, JobStatus
+from common.tracking import FieldTrackerMixin
+from .sketch import QuantileSketch
 
 logger = logging.getLogger(__name__)
 
-
-class Incident(models.Model):
+SLA_DURATIONS = {
+    SeverityChoices.LOW: timezone.timedelta(hours=24),
+    SeverityChoices.MEDIUM: timezone.timedelta(hours=12),
+    SeverityChoices.HIGH: timezone.timedelta(hours=4),
+}
+DEFAULT_SLA_DURATION = timezone.timedelta(hours=24)
+OPEN_TICKET_STATUSES = [TicketStatus.NEW, TicketStatus.ASSIGNED, TicketStatus.IN_PROGRESS]
+# Ticket fields the Metrics row is derived from
+METRICS_SOURCE_FIELDS = {
+    'status', 'creation_timestamp', 'start_timestamp', 'completion_timestamp',
+    'deadline_timestamp', 'client_response_timestamp',
+}
+
+
+class Incident(FieldTrackerMixin, models.Model):
     client = models.ForeignKey('clients.Client', on_delete=models.CASCADE, related_name='incidents')
     status = models.CharField(max_length=20, choices=IncidentStatus.choices, default=IncidentStatus.OPEN)
     severity = models.CharField(max_length=10, choices=SeverityChoices.choices, default=SeverityChoices.MEDIUM)
@@ -20,19 +37,28 @@ class Incident(models.Model):
     resolution_confirmed_timestamp = models.DateTimeField(null=True, blank=True)
     iocs = models.ManyToManyField('threat_intelligence.IOC', through='IncidentIOC', related_name='incidents')
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the incident API, unfiltered and per status/severity filter
+            models.Index(fields=['creation_timestamp', 'id'], name='incident_created_id_idx'),
+            models.Index(fields=['status', 'creation_timestamp', 'id'], name='incident_status_created_idx'),
+            models.Index(fields=['severity', 'creation_timestamp', 'id'], name='incident_severity_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        sla_map = {
-            SeverityChoices.LOW: timezone.timedelta(hours=24),
-            SeverityChoices.MEDIUM: timezone.timedelta(hours=12),
-            SeverityChoices.HIGH: timezone.timedelta(hours=4),
-        }
         if not self.pk:  # New instance
             if not self.sla_duration:
-                self.sla_duration = sla_map.get(self.severity, timezone.timedelta(hours=24))
+                self.sla_duration = SLA_DURATIONS.get(self.severity, DEFAULT_SLA_DURATION)
         else:  # Existing instance
-            original = Incident.objects.get(pk=self.pk)
-            if original.severity != self.severity and original.sla_duration == sla_map.get(original.severity):
-                self.sla_duration = sla_map.get(self.severity, timezone.timedelta(hours=24))
+            if hasattr(self, '_loaded_values'):
+                original_severity = self.get_loaded_value('severity')
+                original_sla_duration = self.get_loaded_value('sla_duration')
+            else:
+                original_severity, original_sla_duration = Incident.objects.values_list(
+                    'severity', 'sla_duration'
+                ).get(pk=self.pk)
+            if original_severity != self.severity and original_sla_duration == SLA_DURATIONS.get(original_severity):
+                self.sla_duration = SLA_DURATIONS.get(self.severity, DEFAULT_SLA_DURATION)
         super().save(*args, **kwargs)
 
     def assign_to_analyst(self, analyst):
@@ -75,7 +101,7 @@ class Incident(models.Model):
             self.resolution_confirmed_timestamp = timezone.now()
             self.save()
 
-    def notify_client(self, message):
+    def notify_client(self, message, fail_silently=True):
         subject = f"Incident {self.id} Update"
         if not self.client or not self.client.contact_email:
             logger.error(f"No contact email for client {self.client.id if self.client else 'Unknown'}")
@@ -87,16 +113,78 @@ class Incident(models.Model):
                 self.ticket.save()
         except Exception as e:
             logger.error(f"Failed to send email for Incident {self.id}: {e}")
+            if not fail_silently:
+                raise
 
     def add_ioc(self, ioc_type, ioc_value, source=None):
         from threat_intelligence.models import IOC  # Lazy import inside method
+        from threat_intelligence.normalization import ioc_lookup_key, normalize_ioc
         source = source or 'internal'
+        ioc_type, ioc_value = normalize_ioc(ioc_type, ioc_value) or (ioc_type, ioc_value)
         ioc, created = IOC.objects.get_or_create(
-            type=ioc_type,
-            value=ioc_value,
-            defaults={'source': source}
+            lookup_key=ioc_lookup_key(ioc_type, ioc_value),
+            defaults={'type': ioc_type, 'value': ioc_value, 'source': source}
         )
+        if not created:
+            ioc.sighted()
         IncidentIOC.objects.get_or_create(incident=self, ioc=ioc)
+        self.rescore_severity()
+        return ioc
+
+    def add_iocs(self, indicators, source=None):
+        """Attach many ``(type, value)`` indicators at once and re-score severity once.
+
+        Existing IOCs are found by lookup key in one query, missing ones are
+        created with one upsert, and the links are written with one insert.
+        Returns one result dict per indicator, in input order:
+        ``{'index', 'id', 'created'}``, or ``{'index', 'error'}`` when the
+        indicator is not valid.
+        """
+        from threat_intelligence.models import IOC  # Lazy import inside method
+        from threat_intelligence.normalization import ioc_lookup_key, normalize_ioc
+        source = source or 'internal'
+        results = [None] * len(indicators)
+        wanted = {}
+        for index, (ioc_type, ioc_value) in enumerate(indicators):
+            normalized = normalize_ioc(ioc_type, ioc_value)
+            if normalized is None:
+                results[index] = {'index': index, 'error': f"Not a valid {ioc_type or 'indicator'}: {ioc_value!r}"}
+            else:
+                wanted.setdefault(ioc_lookup_key(*normalized), (normalized, []))[1].append(index)
+        if not wanted:
+            return results
+
+        now = timezone.now()
+        with transaction.atomic():
+            existing = dict(IOC.objects.filter(lookup_key__in=wanted).values_list('lookup_key', 'pk'))
+            if existing:
+                # Seen again: restart confidence decay
+                IOC.objects.filter(pk__in=existing.values()).update(
+                    last_seen_at=now, confidence_score=F('base_confidence')
+                )
+            missing = [key for key in wanted if key not in existing]
+            # A concurrent request may create the same IOC; the upsert then returns its pk.
+            created = IOC.objects.bulk_create(
+                [
+                    IOC(type=wanted[key][0][0], value=wanted[key][0][1], source=source, last_seen_at=now)
+                    for key in missing
+                ],
+                update_conflicts=True, unique_fields=['lookup_key'], update_fields=['last_seen_at'],
+            )
+            ioc_ids = {**existing, **{ioc.lookup_key: ioc.pk for ioc in created}}
+            IncidentIOC.objects.bulk_create(
+                [IncidentIOC(incident=self, ioc_id=ioc_id) for ioc_id in ioc_ids.values()],
+                ignore_conflicts=True
+            )
+            self.rescore_severity()
+
+        for key, (_, indexes) in wanted.items():
+            for index in indexes:
+                results[index] = {'index': index, 'id': ioc_ids[key], 'created': key not in existing}
+        return results
+
+    def rescore_severity(self):
+        """Escalate severity one level when most of this incident's IOCs were seen on other incidents."""
         match_score = self.check_iocs_against_db()
         if match_score > 50:  # Adjust severity based on matches
             if self.severity == SeverityChoices.LOW:
@@ -104,42 +192,45 @@ class Incident(models.Model):
             elif self.severity == SeverityChoices.MEDIUM:
                 self.severity = SeverityChoices.HIGH
             self.save()
-        return ioc
+        return match_score
 
     def check_iocs_against_db(self):
-        incident_iocs = self.iocs.all()
-        if not incident_iocs:
-            return 0
-        match_score = 0
-        for ioc in incident_iocs:
-            other_incidents_count = IncidentIOC.objects.filter(ioc=ioc).exclude(incident=self).count()
-            if other_incidents_count > 0:
-                match_score += 1
-        return (match_score / incident_iocs.count()) * 100 if incident_iocs.count() > 0 else 0
+        """Percentage of this incident's IOCs also seen on another incident, in one aggregate query."""
+        seen_elsewhere = IncidentIOC.objects.filter(ioc=OuterRef('ioc')).exclude(incident=self)
+        counts = IncidentIOC.objects.filter(incident=self).aggregate(
+            total=Count('pk'),
+            matched=Count('pk', filter=Exists(seen_elsewhere)),
+        )
+        return (counts['matched'] / counts['total']) * 100 if counts['total'] else 0
+
+    def correlated_incidents(self, limit=None):
+        """Other incidents sharing IOCs with this one, most shared first, in one grouped query.
+
+        Returns a list of ``{'incident': id, 'shared_iocs': count}`` dicts.
+        """
+        correlated = IncidentIOC.objects.filter(
+            ioc__in=IncidentIOC.objects.filter(incident=self).values('ioc')
+        ).exclude(incident=self).values('incident').annotate(
+            shared_iocs=Count('ioc')
+        ).order_by('-shared_iocs', 'incident')
+        if limit:
+            correlated = correlated[:limit]
+        return list(correlated)
 
     def start_playbook(self, playbook, ticket, analysis):
-        if ticket.incident != self:
-            raise ValueError("Ticket does not belong to this incident")
-        from threat_intelligence.models import PlaybookExecution  # Lazy import inside method
-        execution = PlaybookExecution.objects.create(
-            playbook=playbook,
-            incident=self,
-            ticket=ticket,
-            analysis=analysis
-        )
-        execution.execute()
-        return execution
+        from threat_intelligence.playbook_runtime import start_playbook  # Lazy import inside method
+        return start_playbook(self, playbook, ticket, analysis)
 
     def __str__(self):
         return f"Incident {self.id} - {self.incident_type}"
 
-class IncidentIOC(models.Model):
+class IncidentIOC(FieldTrackerMixin, models.Model):
     incident = models.ForeignKey(Incident, on_delete=models.CASCADE)
     ioc = models.ForeignKey('threat_intelligence.IOC', on_delete=models.CASCADE) 
     class Meta:
         unique_together = ['incident', 'ioc']
 
-class Analysis(models.Model):
+class Analysis(FieldTrackerMixin, models.Model):
     incident = models.ForeignKey(Incident, on_delete=models.CASCADE, related_name='analyses')
     analyst = models.ForeignKey(Analyst, on_delete=models.CASCADE, related_name='analyses')
     ticket = models.ForeignKey('Ticket', on_delete=models.CASCADE, related_name='analyses')
@@ -156,7 +247,19 @@ class Analysis(models.Model):
     def __str__(self):
         return f"Analysis for Incident {self.incident.id}"
 
-class Ticket(models.Model):
+class TicketQuerySet(models.QuerySet):
+    def unresolved(self):
+        return self.exclude(status=TicketStatus.COMPLETED)
+
+    def with_sla_remaining(self):
+        """Annotate ``live_sla_remaining``, computed by the database from ``deadline_timestamp``."""
+        return self.annotate(live_sla_remaining=Case(
+            When(Q(deadline_timestamp__isnull=True) | Q(status=TicketStatus.COMPLETED), then=Value(timezone.timedelta(0))),
+            default=Greatest(F('deadline_timestamp') - Now(), Value(timezone.timedelta(0))),
+            output_field=models.DurationField(),
+        ))
+
+class Ticket(FieldTrackerMixin, models.Model):
     incident = models.OneToOneField(Incident, on_delete=models.CASCADE, related_name='ticket')
     assigned_analysts = models.ManyToManyField(Analyst, related_name='assigned_tickets', blank=True)
     status = models.CharField(max_length=20, choices=TicketStatus.choices, default=TicketStatus.NEW)
@@ -169,37 +272,70 @@ class Ticket(models.Model):
     deadline_timestamp = models.DateTimeField(null=True, blank=True)
     client_notified_timestamp = models.DateTimeField(null=True, blank=True)
     client_response_timestamp = models.DateTimeField(null=True, blank=True)
+    sla_breached = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = TicketQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Deadline lookups for the SLA scheduler only ever concern unresolved tickets
+            models.Index(
+                fields=['deadline_timestamp'], condition=~Q(status='completed'), name='ticket_open_deadline_idx'
+            ),
+        ]
+
+    def _transition(self, status):
+        """Move to ``status`` and keep the assigned analysts' open ticket counters in step.
+
+        Runs inside the caller's transaction and locks the ticket row, so two
+        concurrent transitions can never apply the same counter change twice.
+        """
+        current = Ticket.objects.select_for_update().values_list('status', flat=True).get(pk=self.pk)
+        was_open = current in OPEN_TICKET_STATUSES
+        is_open = status in OPEN_TICKET_STATUSES
+        if was_open != is_open:
+            Analyst.objects.filter(assigned_tickets=self).update(
+                open_ticket_count=Greatest(F('open_ticket_count') + (1 if is_open else -1), 0)
+            )
+        self.status = status
 
     def assign_to_analyst(self, analyst):
-        if isinstance(analyst, Analyst) and analyst.can_take_ticket(self.incident.severity):
-            self.assigned_analysts.add(analyst)
+        if not isinstance(analyst, Analyst):
+            raise ValueError("Analyst cannot take this ticket due to capacity or invalid type.")
+        with transaction.atomic():
+            already_assigned = self.assigned_analysts.filter(pk=analyst.pk).exists()
+            self._transition(TicketStatus.ASSIGNED)
+            if not already_assigned:
+                # Conditional increment: capacity check and reservation are one statement.
+                if not analyst.reserve_ticket_slot():
+                    raise ValueError("Analyst cannot take this ticket due to capacity or invalid type.")
+                self.assigned_analysts.add(analyst)
             self.assignment_timestamp = timezone.now()
-            self.status = TicketStatus.ASSIGNED
             self.save()
-        else:
-            raise ValueError("Analyst cannot take this ticket due to capacity or invalid type.")
 
     def start_work(self):
-        self.status = TicketStatus.IN_PROGRESS
-        self.start_timestamp = timezone.now()
-        self.save()
+        with transaction.atomic():
+            self._transition(TicketStatus.IN_PROGRESS)
+            self.start_timestamp = timezone.now()
+            self.save()
 
     def pause_work(self):
-        self.status = TicketStatus.PAUSED
-        self.save()
+        with transaction.atomic():
+            self._transition(TicketStatus.PAUSED)
+            self.save()
 
     def complete_work(self):
-        self.status = TicketStatus.COMPLETED
-        self.completion_timestamp = timezone.now()
-        self.save()
+        with transaction.atomic():
+            self._transition(TicketStatus.COMPLETED)
+            self.completion_timestamp = timezone.now()
+            self.save()
 
-    def calculate_sla_remaining(self):
+    def calculate_sla_remaining(self, now=None):
+        # Pure computation: the stored sla_remaining column is refreshed by `manage.py sweep_sla`.
         if self.deadline_timestamp and self.status != TicketStatus.COMPLETED:
-            now = timezone.now()
-            remaining = self.deadline_timestamp - now
-            self.sla_remaining = remaining if remaining.total_seconds() > 0 else timezone.timedelta(0)
-            self.save()
-            return self.sla_remaining
+            remaining = self.deadline_timestamp - (now or timezone.now())
+            return remaining if remaining.total_seconds() > 0 else timezone.timedelta(0)
         return timezone.timedelta(0)
 
     def set_client_response(self):
@@ -209,7 +345,7 @@ class Ticket(models.Model):
     def __str__(self):
         return f"Ticket {self.id} - {self.status}"
 
-class Metrics(models.Model):
+class Metrics(FieldTrackerMixin, models.Model):
     ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, related_name='metrics')
     mtd = models.DurationField(null=True, blank=True, help_text="Mean Time to Detect")
     mta = models.DurationField(null=True, blank=True, help_text="Mean Time to Analyze")
@@ -240,6 +376,81 @@ class Metrics(models.Model):
     def __str__(self):
         return f"Metrics for Ticket {self.ticket.id}"
 
+class MetricsRollup(FieldTrackerMixin, models.Model):
+    """Per client x severity x day aggregate of one MTTx metric.
+
+    Maintained incrementally whenever a Metrics value changes, and rebuilt
+    from scratch with ``manage.py rebuild_metrics_rollups``. The day is the
+    ticket's creation date and the severity the incident's current one: a
+    severity change moves the ticket's values to the new bucket.
+    """
+    client = models.ForeignKey('clients.Client', on_delete=models.CASCADE, related_name='metrics_rollups')
+    severity = models.CharField(max_length=10, choices=SeverityChoices.choices)
+    day = models.DateField()
+    metric = models.CharField(max_length=3, choices=MTTxMetric.choices)
+    count = models.PositiveIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    sketch = models.JSONField(default=dict)
+
+    class Meta:
+        unique_together = ['client', 'severity', 'day', 'metric']
+        indexes = [models.Index(fields=['metric', 'day'], name='rollup_metric_day_idx')]
+
+    def get_sketch(self):
+        return QuantileSketch.from_dict(self.sketch)
+
+    @classmethod
+    def record_change(cls, client_id, severity, day, metric, old, new):
+        """Move one ticket's ``metric`` from ``old`` to ``new`` (timedeltas, either may be None)."""
+        with transaction.atomic():
+            rollup, _ = cls.objects.select_for_update().get_or_create(
+                client_id=client_id, severity=severity, day=day, metric=metric
+            )
+            sketch = rollup.get_sketch()
+            if old is not None:
+                rollup.count = max(rollup.count - 1, 0)
+                rollup.total_seconds -= old.total_seconds()
+                sketch.remove(old.total_seconds())
+            if new is not None:
+                rollup.count += 1
+                rollup.total_seconds += new.total_seconds()
+                sketch.add(new.total_seconds())
+            rollup.sketch = sketch.to_dict()
+            rollup.save()
+
+    def __str__(self):
+        return f"{self.metric} rollup for client {self.client_id} / {self.severity} on {self.day}"
+
+class Job(models.Model):
+    """Unit of background work, claimed by ``manage.py run_jobs`` workers (see ``incidents.jobs``).
+
+    ``run_after`` is when the job is next visible to workers: its enqueue or
+    retry time while queued, and the end of its visibility timeout while
+    running (pushed out by the worker's heartbeat), after which a job whose
+    worker died is claimed again.
+    """
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['run_after'], name='job_claimable_idx',
+                condition=Q(status__in=[JobStatus.QUEUED, JobStatus.RUNNING]),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} {self.name} ({self.status})"
+
 @receiver(post_save, sender=Incident)
 def create_ticket(sender, instance, created, **kwargs):
     if created and not hasattr(instance, 'ticket'):
@@ -253,7 +464,9 @@ def set_deadline_timestamp(sender, instance, created, **kwargs):
         instance.save(update_fields=['deadline_timestamp'])
 
 @receiver(post_save, sender=Ticket)
-def update_metrics(sender, instance, created, **kwargs):
+def update_metrics(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields is not None and not METRICS_SOURCE_FIELDS.intersection(update_fields):
+        return
     metrics, _ = Metrics.objects.get_or_create(ticket=instance)
     if instance.status == TicketStatus.IN_PROGRESS:
         metrics.calculate_mtd()
@@ -264,24 +477,40 @@ def update_metrics(sender, instance, created, **kwargs):
         metrics.calculate_mtr()
 
 def assign_ticket_to_analyst(ticket):
-    current_time = timezone.now()
-    # Get analysts in the current shift
-    analysts_in_shift = Analyst.objects.filter(
-        current_shift__start_time__lte=current_time,
-        current_shift__end_time__gte=current_time
-    )
-    if not analysts_in_shift.exists():
-        return None
+    from .assignment import assign_tickets  # Lazy import, the engine depends on these models
+    return assign_tickets([ticket]).get(ticket.pk)
+
+@receiver(post_save, sender=Metrics)
+def update_metrics_rollups(sender, instance, created, update_fields=None, **kwargs):
+    changes = []
+    for metric in MTTxMetric.values:
+        if update_fields is not None and metric not in update_fields:
+            continue
+        old = None if created else instance.get_loaded_value(metric)
+        new = getattr(instance, metric)
+        if old != new:
+            changes.append((metric, old, new))
+    if not changes:
+        return
+    ticket = instance.ticket
+    incident = ticket.incident
+    day = timezone.localdate(ticket.creation_timestamp)
+    for metric, old, new in changes:
+        MetricsRollup.record_change(incident.client_id, incident.severity, day, metric, old, new)
 
-    # Compute workload in Python and find an available analyst
-    available_analysts = [
-        analyst for analyst in analysts_in_shift
-        if analyst.current_workload < analyst.max_capacity
-    ]
-    if not available_analysts:
-        return None
-
-    # Sort by workload and pick the analyst with the least
-    analyst = min(available_analysts, key=lambda a: a.current_workload)
-    ticket.assign_to_analyst(analyst)
-    return analyst
\ No newline at end of file
+@receiver(post_save, sender=Incident)
+def move_metrics_rollups(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not {'client', 'severity'}.intersection(update_fields)):
+        return
+    old_bucket = (instance.get_loaded_value('client', instance.client_id), instance.get_loaded_value('severity', instance.severity))
+    if old_bucket == (instance.client_id, instance.severity):
+        return
+    metrics = Metrics.objects.filter(ticket__incident=instance).select_related('ticket').first()
+    if metrics is None:
+        return
+    day = timezone.localdate(metrics.ticket.creation_timestamp)
+    for metric in MTTxMetric.values:
+        value = getattr(metrics, metric)
+        if value is not None:
+            MetricsRollup.record_change(*old_bucket, day, metric, value, None)
+            MetricsRollup.record_change(instance.client_id, instance.severity, day, metric, None, value)
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IncidentCursorPagination(CursorPagination):
+    """Keyset pagination over (creation_timestamp, id).
+
+    Each page is a range scan on the matching composite index, so the cost of
+    a page does not grow with the number of incidents before it.
+    """
+    ordering = ('creation_timestamp', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,84 @@
+"""Rebuild and query the MetricsRollup tables.
+
+Rollups are kept up to date incrementally by the ``update_metrics_rollups``
+receiver; ``rebuild_rollups`` recomputes them from the Metrics rows (e.g.
+after severities changed) and ``summarize_rollups`` merges them into the
+buckets a dashboard asks for, touching only rollup rows.
+"""
+from django.db import transaction
+from django.utils import timezone
+from common.enums import MTTxMetric
+from .models import Metrics, MetricsRollup
+from .sketch import QuantileSketch
+
+ROLLUP_GROUP_FIELDS = ('client', 'severity', 'day')
+ROLLUP_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def rebuild_rollups(since=None, until=None, chunk_size=5000):
+    """Recompute every rollup for tickets created between ``since`` and ``until`` (dates, inclusive).
+
+    Returns the number of rollup rows written.
+    """
+    metrics = Metrics.objects.all()
+    rollups = MetricsRollup.objects.all()
+    if since:
+        metrics = metrics.filter(ticket__creation_timestamp__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+    if until:
+        metrics = metrics.filter(ticket__creation_timestamp__date__lte=until)
+        rollups = rollups.filter(day__lte=until)
+
+    buckets = {}
+    rows = metrics.values_list(
+        'ticket__incident__client_id', 'ticket__incident__severity', 'ticket__creation_timestamp', *MTTxMetric.values
+    )
+    for client_id, severity, created, *values in rows.iterator(chunk_size=chunk_size):
+        day = timezone.localdate(created)
+        for metric, value in zip(MTTxMetric.values, values):
+            if value is None:
+                continue
+            rollup = buckets.get((client_id, severity, day, metric))
+            if rollup is None:
+                rollup = buckets[(client_id, severity, day, metric)] = [0, 0.0, QuantileSketch()]
+            rollup[0] += 1
+            rollup[1] += value.total_seconds()
+            rollup[2].add(value.total_seconds())
+
+    with transaction.atomic():
+        rollups.delete()
+        MetricsRollup.objects.bulk_create([
+            MetricsRollup(
+                client_id=client_id, severity=severity, day=day, metric=metric,
+                count=count, total_seconds=total, sketch=sketch.to_dict()
+            )
+            for (client_id, severity, day, metric), (count, total, sketch) in buckets.items()
+        ], batch_size=chunk_size)
+    return len(buckets)
+
+
+def summarize_rollups(rollups, group_by=ROLLUP_GROUP_FIELDS):
+    """Merge ``rollups`` per metric and ``group_by`` fields into count/mean/percentile rows."""
+    groups = {}
+    for row in rollups.values('client', 'severity', 'day', 'metric', 'count', 'total_seconds', 'sketch'):
+        key = tuple(row[field] for field in group_by) + (row['metric'],)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [0, 0.0, QuantileSketch()]
+        group[0] += row['count']
+        group[1] += row['total_seconds']
+        group[2].merge(QuantileSketch.from_dict(row['sketch']))
+
+    results = []
+    for key in sorted(groups, key=lambda k: tuple(str(part) for part in k)):
+        count, total, sketch = groups[key]
+        if not count:
+            continue
+        result = dict(zip(group_by, key))
+        result['metric'] = key[-1]
+        result['count'] = count
+        result['mean_seconds'] = total / count
+        for q in ROLLUP_QUANTILES:
+            result[f'p{round(q * 100)}_seconds'] = sketch.quantile(q)
+        results.append(result)
+    return results
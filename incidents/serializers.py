@@ -1,3 +1,4 @@
+from django.db.models import F
 from rest_framework import serializers
 from .models import Incident, Ticket, Analysis
 from common.enums import IncidentStatus, TicketStatus, SeverityChoices
@@ -28,4 +29,62 @@ class IncidentSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'client', 'status', 'severity', 'incident_type', 'creation_timestamp',
             'sla_duration', 'resolution_confirmed_timestamp', 'ticket', 'analyses'
-        ]
\ No newline at end of file
+        ]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            # Flat ticket summary fields are only rendered when asked for with ?fields=
+            optional_fields = {
+                'ticket_status': serializers.CharField(source='ticket.status', read_only=True, allow_null=True),
+                'deadline': serializers.DateTimeField(source='ticket.deadline_timestamp', read_only=True, allow_null=True),
+            }
+            for name, field in optional_fields.items():
+                if name in fields:
+                    self.fields[name] = field
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class IncidentCompactSerializer(serializers.Serializer):
+    """Flat, read-only incident representation built from ``.values()`` rows.
+
+    Used for list requests that only ask for flat fields, so no model
+    instances or nested serializers are involved.
+    """
+    id = serializers.IntegerField()
+    client = serializers.IntegerField()
+    status = serializers.CharField()
+    severity = serializers.CharField()
+    incident_type = serializers.CharField()
+    creation_timestamp = serializers.DateTimeField()
+    sla_duration = serializers.DurationField(allow_null=True)
+    resolution_confirmed_timestamp = serializers.DateTimeField(allow_null=True)
+    ticket_status = serializers.CharField(allow_null=True)
+    deadline = serializers.DateTimeField(allow_null=True)
+
+    # What to pass to .values() for each field; ticket columns come through the one-to-one join.
+    VALUES = {
+        'ticket_status': F('ticket__status'),
+        'deadline': F('ticket__deadline_timestamp'),
+    }
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def values_arguments(cls, fields):
+        """Positional and keyword arguments for ``QuerySet.values()`` covering ``fields``."""
+        names = [name for name in fields if name not in cls.VALUES]
+        expressions = {name: cls.VALUES[name] for name in fields if name in cls.VALUES}
+        return names, expressions
+
+class IncidentBulkItemSerializer(serializers.Serializer):
+    # Client is validated as a plain id; the bulk ingester resolves all of them in one query.
+    client = serializers.IntegerField()
+    severity = serializers.ChoiceField(choices=SeverityChoices.choices, default=SeverityChoices.MEDIUM)
+    incident_type = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    sla_duration = serializers.DurationField(required=False, allow_null=True)
@@ -0,0 +1,74 @@
+import math
+
+
+class QuantileSketch:
+    """Mergeable log-bucketed histogram of non-negative durations (in seconds).
+
+    Every value lands in bucket ``ceil(log_gamma(value))``, so any quantile
+    is answered with a relative error of at most ``relative_accuracy``
+    whatever the number of values. Values can be removed again, which lets
+    rollups follow a metric that gets recomputed. Serialises to a small
+    JSON-compatible dict.
+    """
+
+    def __init__(self, relative_accuracy=0.02, buckets=None, zeros=0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {int(key): count for key, count in (buckets or {}).items()}
+        self.zeros = zeros
+
+    @property
+    def count(self):
+        return self.zeros + sum(self.buckets.values())
+
+    def _key(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value, count=1):
+        if value <= 0:
+            self.zeros += count
+            return
+        key = self._key(value)
+        self.buckets[key] = self.buckets.get(key, 0) + count
+        if self.buckets[key] <= 0:
+            del self.buckets[key]
+
+    def remove(self, value):
+        if value <= 0:
+            self.zeros = max(self.zeros - 1, 0)
+        else:
+            self.add(value, -1)
+
+    def merge(self, other):
+        self.zeros += other.zeros
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        return self
+
+    def quantile(self, q):
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'zeros': self.zeros,
+            'buckets': {str(key): count for key, count in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        return cls(data.get('relative_accuracy', 0.02), data.get('buckets'), data.get('zeros', 0))
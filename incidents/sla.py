@@ -0,0 +1,163 @@
+"""SLA bookkeeping for unresolved tickets.
+
+``Ticket.calculate_sla_remaining`` and ``TicketQuerySet.with_sla_remaining``
+compute the remaining time on the fly and never write. The stored
+``Ticket.sla_remaining`` / ``Ticket.sla_breached`` columns are refreshed in
+set-based batches by ``sweep_sla`` (run by ``manage.py sweep_sla``).
+
+``SLAScheduler`` fires ``sla_threshold_reached`` when a ticket has used up a
+given share of its ``sla_duration`` (50%/80%/100% by default), from an
+in-memory timer heap instead of polling (run by ``manage.py run_sla_scheduler``).
+"""
+import heapq
+import itertools
+import logging
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.dispatch import Signal
+from django.utils import timezone
+from common.enums import TicketStatus
+from .models import Ticket
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 5000
+SLA_WARNING_THRESHOLDS = getattr(settings, 'SLA_WARNING_THRESHOLDS', (0.5, 0.8, 1.0))
+# Re-read a little before the last sync so rows committed late with an earlier updated_at are not missed
+REFRESH_OVERLAP = timezone.timedelta(seconds=5)
+
+# Sent with ``event`` (an SLAEvent) each time a ticket crosses a threshold; 1.0 means breached.
+sla_threshold_reached = Signal()
+
+SLAEvent = namedtuple('SLAEvent', ['ticket_id', 'threshold', 'fire_at', 'deadline'])
+
+
+def sweep_sla(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """Refresh ``sla_remaining`` and flag breaches for every unresolved ticket.
+
+    Tickets are walked in primary key ranges of ``batch_size`` rows and each
+    range is handled by a single UPDATE. Returns the number of tickets updated.
+    """
+    now = now or timezone.now()
+    tickets = Ticket.objects.unresolved().filter(deadline_timestamp__isnull=False)
+    updated = 0
+    last_pk = 0
+    while True:
+        batch = tickets.filter(pk__gt=last_pk)
+        upper = list(batch.order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size])
+        if upper:
+            batch = batch.filter(pk__lte=upper[0])
+        updated += batch.update(
+            sla_remaining=Greatest(F('deadline_timestamp') - Value(now), Value(timezone.timedelta(0))),
+            sla_breached=Case(
+                When(deadline_timestamp__lte=now, then=Value(True)),
+                default=F('sla_breached'),
+            ),
+        )
+        if not upper:
+            return updated
+        last_pk = upper[0]
+
+
+class SLAScheduler:
+    """Timer heap of upcoming SLA thresholds for unresolved tickets.
+
+    ``load()`` reads every unresolved ticket once through the partial
+    deadline index; afterwards ``refresh()`` only re-reads tickets whose
+    ``updated_at`` moved since the previous sync. Rescheduled or resolved
+    tickets are invalidated lazily: heap entries carry a version and stale
+    ones are dropped when they reach the top.
+
+    ``clock`` is only used to decide what is due, so tests can drive the
+    scheduler with a fake clock.
+    """
+
+    def __init__(self, thresholds=SLA_WARNING_THRESHOLDS, clock=timezone.now):
+        self.thresholds = sorted(thresholds)
+        self.clock = clock
+        self._heap = []
+        self._versions = {}
+        self._version_counter = itertools.count(1)
+        self._synced_at = None
+
+    def __len__(self):
+        return len(self._versions)
+
+    def _ticket_rows(self, tickets):
+        return tickets.values_list(
+            'pk', 'status', 'creation_timestamp', 'deadline_timestamp', 'incident__sla_duration', 'sla_breached'
+        )
+
+    def load(self):
+        self._heap = []
+        self._versions = {}
+        self._synced_at = timezone.now()
+        tickets = Ticket.objects.unresolved().filter(deadline_timestamp__isnull=False).order_by('deadline_timestamp')
+        for row in self._ticket_rows(tickets).iterator(chunk_size=SWEEP_BATCH_SIZE):
+            self.schedule(*row)
+
+    def refresh(self):
+        """Pick up tickets created or changed since the last sync."""
+        if self._synced_at is None:
+            return self.load()
+        synced_at, self._synced_at = self._synced_at, timezone.now()
+        for row in self._ticket_rows(Ticket.objects.filter(updated_at__gte=synced_at - REFRESH_OVERLAP)):
+            self.schedule(*row)
+
+    def schedule(self, ticket_id, status, created, deadline, sla_duration=None, breached=False):
+        """(Re)schedule the thresholds of one ticket, dropping whatever was queued for it before."""
+        if status == TicketStatus.COMPLETED or deadline is None:
+            self._versions.pop(ticket_id, None)
+            return
+        version = self._versions[ticket_id] = next(self._version_counter)
+        duration = sla_duration or (deadline - created)
+        now = self.clock()
+        for threshold in self.thresholds:
+            fire_at = deadline - duration * (1 - threshold)
+            # Warnings that already went by are not replayed; a missed breach is, unless already flagged.
+            if fire_at <= now and (threshold < 1 or breached):
+                continue
+            heapq.heappush(self._heap, (fire_at, ticket_id, threshold, version, deadline))
+
+    def next_fire_at(self):
+        while self._heap and self._heap[0][3] != self._versions.get(self._heap[0][1]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def due(self):
+        """Pop and return the SLAEvents whose time has come, earliest first."""
+        now = self.clock()
+        events = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, ticket_id, threshold, version, deadline = heapq.heappop(self._heap)
+            if self._versions.get(ticket_id) == version:
+                events.append(SLAEvent(ticket_id, threshold, fire_at, deadline))
+        return events
+
+    def run_pending(self):
+        """Fire due events, flagging breached tickets with a single UPDATE."""
+        events = self.due()
+        breached = [event.ticket_id for event in events if event.threshold >= 1]
+        if breached:
+            Ticket.objects.filter(pk__in=breached, sla_breached=False).update(sla_breached=True)
+        for event in events:
+            logger.warning(
+                "Ticket %s reached %d%% of its SLA (deadline %s)",
+                event.ticket_id, event.threshold * 100, event.deadline
+            )
+            sla_threshold_reached.send(sender=self.__class__, event=event)
+        return events
+
+    def run_forever(self, refresh_interval=30, sleep=time.sleep):
+        self.load()
+        while True:
+            self.run_pending()
+            next_fire_at = self.next_fire_at()
+            wait = refresh_interval
+            if next_fire_at is not None:
+                wait = min(wait, max((next_fire_at - self.clock()).total_seconds(), 0))
+            sleep(wait)
+            self.refresh()
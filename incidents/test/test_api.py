@@ -34,8 +34,8 @@ def test_incident_list_api(api_client, analyst_user):
     Incident.objects.create(client=client, severity="HIGH")
     response = api_client.get('/incidents/api/incidents/')
     assert response.status_code == 200
-    assert len(response.data) == 1
-    assert response.data[0]['severity'] == "HIGH"
+    assert len(response.data['results']) == 1
+    assert response.data['results'][0]['severity'] == "HIGH"
 
 @pytest.mark.django_db
 def test_assign_ticket_api(api_client):
@@ -78,4 +78,133 @@ def test_start_work_api(api_client, analyst_user):
     response = api_client.post(f'/incidents/api/ticket/{ticket.id}/start/')
     assert response.status_code == 200
     ticket.refresh_from_db()
-    assert ticket.status == TicketStatus.IN_PROGRESS.value  # Use enum value
\ No newline at end of file
+    assert ticket.status == TicketStatus.IN_PROGRESS.value  # Use enum value
+
+@pytest.mark.django_db
+def test_bulk_incident_api(api_client, analyst_user):
+    user, analyst, token = analyst_user
+    api_client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    payload = {'incidents': [
+        {'client': client.id, 'severity': 'high', 'incident_type': 'phishing'},
+        {'client': client.id, 'severity': 'low'},
+        {'client': 999999, 'severity': 'low'},
+        {'client': client.id, 'severity': 'critical'},
+    ]}
+    response = api_client.post('/incidents/api/incidents/bulk/', payload, format='json')
+    assert response.status_code == 201
+    assert response.data['created'] == 2
+    results = response.data['results']
+    assert [r['index'] for r in results] == [0, 1, 2, 3]
+    assert 'client' in results[2]['errors']
+    assert 'severity' in results[3]['errors']
+
+    incident = Incident.objects.get(pk=results[0]['id'])
+    ticket = incident.ticket
+    assert incident.sla_duration == timezone.timedelta(hours=4)
+    assert ticket.deadline_timestamp is not None
+    assert ticket.metrics is not None
+    assert ticket.status == TicketStatus.ASSIGNED.value
+    assert results[0]['assigned_analyst'] == analyst.pk
+    assert analyst in ticket.assigned_analysts.all()
+
+
+@pytest.mark.django_db
+def test_bulk_ingest_query_count_is_per_batch(analyst_user, django_assert_max_num_queries):
+    from incidents.bulk import ingest_incidents, BULK_INGEST_MAX_QUERIES
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    items = [{'client': client.id, 'severity': 'medium'} for _ in range(50)]
+    with django_assert_max_num_queries(BULK_INGEST_MAX_QUERIES):
+        results = ingest_incidents(items)
+    assert Incident.objects.count() == 50
+    # max_capacity=5 on the fixture analyst
+    assert sum(1 for r in results if r['assigned_analyst']) == 5
+
+
+@pytest.mark.django_db
+def test_incident_list_api_is_cursor_paginated_without_n_plus_one(api_client, analyst_user, django_assert_max_num_queries):
+    user, analyst, token = analyst_user
+    api_client.force_authenticate(user=user)
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    for _ in range(5):
+        incident = Incident.objects.create(client=client, severity="high")
+        incident.add_analysis(analyst, "notes")
+
+    with django_assert_max_num_queries(3):
+        first = api_client.get('/incidents/api/incidents/?page_size=3')
+    assert len(first.data['results']) == 3
+    assert first.data['results'][0]['analyses'][0]['analyst'] == str(analyst)
+    second = api_client.get(first.data['next'])
+    assert len(second.data['results']) == 2
+    ids = [i['id'] for i in first.data['results'] + second.data['results']]
+    assert ids == sorted(ids)
+
+    filtered = api_client.get('/incidents/api/incidents/', {'analyst': user.username})
+    assert len(filtered.data['results']) == 5
+
+
+@pytest.mark.django_db
+def test_incident_list_api_sparse_fieldsets(api_client, analyst_user, django_assert_max_num_queries):
+    user, analyst, token = analyst_user
+    api_client.force_authenticate(user=user)
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    incident = Incident.objects.create(client=client, severity="high")
+    incident.add_analysis(analyst, "notes")
+
+    with django_assert_max_num_queries(1):
+        response = api_client.get('/incidents/api/incidents/', {'fields': 'id,status,severity,deadline'})
+    assert response.status_code == 200
+    row = response.data['results'][0]
+    assert set(row) == {'id', 'status', 'severity', 'deadline'}
+    assert row['deadline'] is not None
+
+    response = api_client.get('/incidents/api/incidents/', {'fields': 'id,deadline', 'expand': 'analyses'})
+    row = response.data['results'][0]
+    assert set(row) == {'id', 'deadline', 'analyses'}
+    assert row['analyses'][0]['notes'] == "notes"
+    assert response.json()['results'][0]['deadline'] == row['deadline']
+
+    assert api_client.get('/incidents/api/incidents/', {'fields': 'id,secret'}).status_code == 400
+    assert api_client.get('/incidents/api/incidents/', {'expand': 'client'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_metrics_rollups_track_updates_and_rebuild(api_client, analyst_user):
+    from incidents.models import Metrics, MetricsRollup
+    from incidents.rollups import rebuild_rollups
+    user, analyst, token = analyst_user
+    api_client.force_authenticate(user=user)
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    for minutes in (10, 20, 30):
+        ticket = Incident.objects.create(client=client, severity="high").ticket
+        ticket.start_timestamp = ticket.creation_timestamp + timezone.timedelta(minutes=minutes)
+        ticket.status = TicketStatus.IN_PROGRESS
+        ticket.save()
+    # Recomputing a value moves it inside the rollup instead of counting it twice
+    metrics = Metrics.objects.get(ticket=ticket)
+    metrics.ticket.start_timestamp = metrics.ticket.creation_timestamp + timezone.timedelta(minutes=60)
+    metrics.calculate_mtd()
+
+    rollup = MetricsRollup.objects.get(metric='mtd')
+    assert rollup.count == 3
+    assert rollup.total_seconds == pytest.approx(90 * 60)
+
+    response = api_client.get('/incidents/api/metrics/rollups/', {'metric': 'mtd', 'group_by': 'severity'})
+    assert response.status_code == 200
+    [row] = response.data['results']
+    assert row['severity'] == 'high' and row['count'] == 3
+    assert row['mean_seconds'] == pytest.approx(30 * 60)
+    assert row['p50_seconds'] == pytest.approx(20 * 60, rel=0.02)
+
+    # Changing the incident's severity moves its values to the new severity's bucket
+    incident = Incident.objects.get(pk=ticket.incident_id)
+    incident.severity = "medium"
+    incident.save()
+    rollups = dict(MetricsRollup.objects.filter(metric='mtd').values_list('severity', 'total_seconds'))
+    assert rollups == {'high': pytest.approx(30 * 60), 'medium': pytest.approx(60 * 60)}
+
+    MetricsRollup.objects.all().delete()
+    assert rebuild_rollups() == 2
+    assert dict(MetricsRollup.objects.filter(metric='mtd').values_list('severity', 'total_seconds')) == rollups
+    assert api_client.get('/incidents/api/metrics/rollups/', {'group_by': 'week'}).status_code == 400
+    assert api_client.get('/incidents/api/metrics/rollups/', {'client': 'acme'}).status_code == 400
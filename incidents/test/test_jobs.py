@@ -0,0 +1,147 @@
+import threading
+import time
+import pytest
+from django.core import mail
+from django.utils import timezone
+from rest_framework.test import APIClient
+from clients.models import Client
+from common.enums import JobStatus, PlaybookStatus
+from incidents.jobs import Worker, claim_jobs, enqueue, job_handler, run_job
+from incidents.models import Analysis, Incident, Job
+from threat_intelligence.models import Playbook, PlaybookExecution
+from users.models import CustomUser, Analyst
+
+calls = []
+calls_lock = threading.Lock()
+
+
+@job_handler('test.record')
+def record(number, fail_times=0):
+    with calls_lock:
+        calls.append(number)
+        if calls.count(number) <= fail_times:
+            raise RuntimeError(f"attempt {calls.count(number)} of {number} failed")
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_workers_run_every_job_exactly_once():
+    for number in range(40):
+        enqueue('test.record', number=number)
+
+    Worker(concurrency=4, poll_interval=0.01).run(burst=True)
+
+    assert sorted(calls) == list(range(40))
+    assert Job.objects.filter(status=JobStatus.DONE, attempts=1).count() == 40
+
+
+@pytest.mark.django_db
+def test_failing_jobs_are_retried_with_backoff_then_given_up():
+    job = enqueue('test.record', max_attempts=2, number=1, fail_times=5)
+
+    [claimed] = claim_jobs('worker-a')
+    assert run_job(claimed) == JobStatus.QUEUED
+    job.refresh_from_db()
+    assert job.attempts == 1 and job.locked_by == ''
+    assert job.run_after > timezone.now()
+    assert "attempt 1 of 1 failed" in job.last_error
+    # Not visible again until the backoff has passed
+    assert claim_jobs('worker-a') == []
+
+    Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+    [claimed] = claim_jobs('worker-a')
+    assert run_job(claimed) == JobStatus.FAILED
+    job.refresh_from_db()
+    assert job.status == JobStatus.FAILED and job.attempts == 2 and job.completed_at is not None
+
+
+@pytest.mark.django_db
+def test_jobs_of_vanished_workers_are_claimed_again_after_the_visibility_timeout():
+    job = enqueue('test.record', number=7)
+    [stale] = claim_jobs('worker-a', visibility_timeout=timezone.timedelta(minutes=5))
+    assert claim_jobs('worker-b') == []
+
+    Job.objects.filter(pk=job.pk).update(run_after=timezone.now() - timezone.timedelta(seconds=1))
+    [reclaimed] = claim_jobs('worker-b')
+    assert reclaimed.pk == job.pk and reclaimed.attempts == 2
+
+    run_job(reclaimed)
+    # The original worker finishing late does not overwrite the new owner's result
+    Job.objects.filter(pk=job.pk).update(status=JobStatus.RUNNING, locked_by='worker-b')
+    run_job(stale)
+    job.refresh_from_db()
+    assert job.status == JobStatus.RUNNING and job.locked_by == 'worker-b'
+
+
+@pytest.mark.django_db
+def test_completing_a_ticket_queues_the_playbook_and_the_client_email():
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    incident = Incident.objects.create(client=client)
+    playbook = Playbook.objects.create(name="Phishing", incident_type='true_positive_phishing')
+    user = CustomUser.objects.create_user(username="analyst1", password="testpass123", email="analyst1@ey.com")
+    analyst = Analyst.objects.create(user=user)
+    ticket = incident.ticket
+    ticket.assign_to_analyst(analyst)
+    ticket.start_work()
+    api_client = APIClient()
+    api_client.force_authenticate(user)
+
+    response = api_client.post(f'/incidents/api/ticket/{ticket.pk}/complete/', {
+        'classification': 'true_positive_phishing', 'notes': 'phish',
+    }, format='json')
+
+    assert response.status_code == 200
+    assert sorted(Job.objects.values_list('name', flat=True)) == ['incidents.notify_client', 'incidents.start_playbook']
+    assert mail.outbox == [] and not PlaybookExecution.objects.exists()
+
+    while jobs := claim_jobs('worker-a', limit=10):
+        for job in jobs:
+            assert run_job(job) == JobStatus.DONE
+    assert len(mail.outbox) == 1
+    execution = PlaybookExecution.objects.get(playbook=playbook, incident=incident)
+    assert execution.status == PlaybookStatus.COMPLETED
+
+
+@pytest.mark.django_db
+def test_starting_an_already_running_playbook_is_not_retried():
+    incident = Incident.objects.create(client=Client.objects.create(name="Test Client", contact_email="test@client.com"))
+    playbook = Playbook.objects.create(name="Phishing", incident_type='true_positive_phishing')
+    analyst = Analyst.objects.create(user=CustomUser.objects.create(username="analyst1", email="analyst1@ey.com"))
+    first, second = (
+        Analysis.objects.create(incident=incident, analyst=analyst, ticket=incident.ticket, notes=notes)
+        for notes in ("first", "second")
+    )
+    incident.start_playbook(playbook, incident.ticket, first).pause()
+    Job.objects.all().delete()
+
+    enqueue('incidents.start_playbook', playbook_id=playbook.pk, analysis_id=second.pk)
+    [job] = claim_jobs('worker-a')
+    assert job.name == 'incidents.start_playbook' and run_job(job) == JobStatus.DONE
+    assert PlaybookExecution.objects.get().analysis_id == first.pk
+
+
+@job_handler('test.slow')
+def slow(seconds):
+    time.sleep(seconds)
+    with calls_lock:
+        calls.append(Job.objects.get(name='test.slow').run_after)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_running_jobs_stay_claimed_and_dead_last_attempts_fail():
+    enqueue('test.slow', seconds=1)
+    [job] = claim_jobs('worker-a', visibility_timeout=timezone.timedelta(seconds=0.3))
+    # The heartbeat kept the job invisible to other workers well past its visibility timeout
+    assert run_job(job, visibility_timeout=timezone.timedelta(seconds=0.3)) == JobStatus.DONE
+    assert calls[0] > job.run_after
+
+    job = enqueue('test.record', max_attempts=1, number=1)
+    claim_jobs('worker-a', visibility_timeout=timezone.timedelta(0))
+    # Its worker died during the only attempt: it is given up, not claimed forever
+    assert claim_jobs('worker-b') == []
+    job.refresh_from_db()
+    assert job.status == JobStatus.FAILED and "stopped responding" in job.last_error and calls == [calls[0]]
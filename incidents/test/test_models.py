@@ -1,5 +1,6 @@
 import pytest
 from django.utils import timezone
+from incidents.assignment import assign_tickets
 from incidents.models import Incident, Ticket, Analysis, Metrics
 from users.models import CustomUser, Analyst
 from clients.models import Client
@@ -61,4 +62,182 @@ def test_metrics_calculation():
     ticket.save()
     metrics = Metrics.objects.get(ticket=ticket)
     metrics.calculate_mta()
-    assert metrics.mta == timezone.timedelta(hours=1)
\ No newline at end of file
+    assert metrics.mta == timezone.timedelta(hours=1)
+
+def _on_shift_analyst(username, shift, max_capacity=5):
+    user = CustomUser.objects.create(username=username, email=f"{username}@ey.com")
+    return Analyst.objects.create(user=user, max_capacity=max_capacity, current_shift=shift)
+
+@pytest.mark.django_db
+def test_auto_assignment_balances_load_and_respects_capacity(django_assert_max_num_queries):
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    incidents = [Incident.objects.create(client=client) for _ in range(6)]
+    shift = Shift.objects.create(
+        start_time=timezone.now() - timezone.timedelta(hours=1),
+        end_time=timezone.now() + timezone.timedelta(hours=1),
+        name="Test Shift",
+        weekday=1
+    )
+    busy = _on_shift_analyst("busy", shift, max_capacity=2)
+    idle = _on_shift_analyst("idle", shift, max_capacity=3)
+    incidents[0].ticket.assign_to_analyst(busy)
+
+    tickets = [incident.ticket for incident in incidents[1:]]
+    with django_assert_max_num_queries(6):
+        plan = assign_tickets(tickets)
+    assigned = list(plan.values())
+    assert assigned.count(idle) == 3
+    assert assigned.count(busy) == 1
+    assert len(plan) == 4
+    busy.refresh_from_db()
+    idle.refresh_from_db()
+    assert busy.current_workload == 2
+    assert idle.current_workload == 3
+    assert tickets[-1].pk not in plan
+
+@pytest.mark.django_db
+def test_new_incident_is_auto_assigned_to_least_loaded_analyst():
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    shift = Shift.objects.create(
+        start_time=timezone.now() - timezone.timedelta(hours=1),
+        end_time=timezone.now() + timezone.timedelta(hours=1),
+        name="Test Shift",
+        weekday=1
+    )
+    first = _on_shift_analyst("first", shift)
+    second = _on_shift_analyst("second", shift)
+    a = Incident.objects.create(client=client)
+    b = Incident.objects.create(client=client)
+    assert set(a.ticket.assigned_analysts.all()) | set(b.ticket.assigned_analysts.all()) == {first, second}
+    assert Ticket.objects.get(pk=a.ticket.pk).status == TicketStatus.ASSIGNED
+
+@pytest.mark.django_db
+def test_workload_counter_follows_ticket_lifecycle():
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    user = CustomUser.objects.create(username="analyst1", email="analyst1@ey.com")
+    analyst = Analyst.objects.create(user=user, max_capacity=1)
+    first = Incident.objects.create(client=client).ticket
+    second = Incident.objects.create(client=client).ticket
+
+    first.assign_to_analyst(analyst)
+    assert Analyst.objects.get(pk=analyst.pk).open_ticket_count == 1
+    with pytest.raises(ValueError):
+        second.assign_to_analyst(analyst)
+    assert not second.assigned_analysts.exists()
+
+    first.start_work()
+    first.pause_work()
+    assert Analyst.objects.get(pk=analyst.pk).open_ticket_count == 0
+    first.start_work()
+    first.complete_work()
+    assert Analyst.objects.get(pk=analyst.pk).open_ticket_count == 0
+    assert analyst.can_take_ticket(SeverityChoices.LOW)
+
+@pytest.mark.django_db
+def test_reconcile_workloads_command_fixes_drift():
+    from io import StringIO
+    from django.core.management import call_command
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    user = CustomUser.objects.create(username="analyst1", email="analyst1@ey.com")
+    analyst = Analyst.objects.create(user=user)
+    Incident.objects.create(client=client).ticket.assign_to_analyst(analyst)
+    Analyst.objects.filter(pk=analyst.pk).update(open_ticket_count=4)
+    out = StringIO()
+    call_command('reconcile_workloads', stdout=out)
+    assert "Fixed 1 drifted" in out.getvalue()
+    assert Analyst.objects.get(pk=analyst.pk).open_ticket_count == 1
+
+@pytest.mark.django_db
+def test_incident_save_only_writes_dirty_fields(django_assert_num_queries):
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    Incident.objects.create(client=client, severity=SeverityChoices.LOW)
+    incident = Incident.objects.get(client=client)
+    with django_assert_num_queries(0):
+        incident.save()
+    assert incident.get_dirty_fields() == set()
+
+    incident.severity = SeverityChoices.HIGH
+    assert incident.get_dirty_fields() == {'severity'}
+    # The UPDATE, then the severity change looks up the ticket's metrics to move their rollups
+    with django_assert_num_queries(2) as captured:
+        incident.save()
+    sql = captured.captured_queries[0]['sql']
+    assert sql.startswith('UPDATE') and '"incident_type"' not in sql
+    assert '"incidents_metrics"' in captured.captured_queries[1]['sql']
+    assert Incident.objects.get(pk=incident.pk).sla_duration == timezone.timedelta(hours=4)
+
+@pytest.mark.django_db
+def test_update_metrics_skips_irrelevant_ticket_changes(django_assert_num_queries):
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    ticket = Ticket.objects.get(pk=Incident.objects.create(client=client).ticket.pk)
+    ticket.description = "Escalated by client"
+    with django_assert_num_queries(1):
+        ticket.save()
+
+@pytest.mark.django_db
+def test_incident_detail_view_does_not_write(client):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    customer = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    incident = Incident.objects.create(client=customer, severity=SeverityChoices.HIGH)
+    user = CustomUser.objects.create_user(username="viewer", password="testpass123", email="viewer@ey.com")
+    client.force_login(user)
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(f'/incidents/{incident.pk}/')
+    assert response.status_code == 200
+    assert response.context['sla_remaining'] > timezone.timedelta(hours=3)
+    writes = [q['sql'] for q in ctx.captured_queries if q['sql'].split()[0] in ('UPDATE', 'INSERT', 'DELETE')]
+    assert not [sql for sql in writes if '"incidents_' in sql]
+
+@pytest.mark.django_db
+def test_sla_sweeper_updates_remaining_and_flags_breaches():
+    from incidents.sla import sweep_sla
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    tickets = [Incident.objects.create(client=client).ticket for _ in range(3)]
+    now = timezone.now()
+    Ticket.objects.filter(pk=tickets[0].pk).update(deadline_timestamp=now - timezone.timedelta(minutes=5))
+    Ticket.objects.filter(pk=tickets[1].pk).update(deadline_timestamp=now + timezone.timedelta(hours=2))
+    Ticket.objects.filter(pk=tickets[2].pk).update(status=TicketStatus.COMPLETED, deadline_timestamp=now - timezone.timedelta(hours=1))
+
+    assert sweep_sla(batch_size=1, now=now) == 2
+    breached, open_ticket, completed = (Ticket.objects.get(pk=t.pk) for t in tickets)
+    assert breached.sla_breached and breached.sla_remaining == timezone.timedelta(0)
+    assert not open_ticket.sla_breached and open_ticket.sla_remaining == timezone.timedelta(hours=2)
+    assert not completed.sla_breached and completed.sla_remaining is None
+    live = Ticket.objects.with_sla_remaining().get(pk=open_ticket.pk).live_sla_remaining
+    assert timezone.timedelta(hours=1, minutes=59) < live <= timezone.timedelta(hours=2)
+
+@pytest.mark.django_db
+def test_sla_scheduler_fires_thresholds_with_fake_clock():
+    from incidents.sla import SLAScheduler, sla_threshold_reached
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    ticket = Incident.objects.create(client=client, severity=SeverityChoices.HIGH).ticket
+    other = Incident.objects.create(client=client, severity=SeverityChoices.HIGH).ticket
+    start = ticket.creation_timestamp
+    clock = {'now': start}
+    received = []
+    handler = lambda sender, event, **kwargs: received.append(event)
+    sla_threshold_reached.connect(handler)
+    try:
+        scheduler = SLAScheduler(thresholds=(0.5, 0.8, 1.0), clock=lambda: clock['now'])
+        scheduler.load()
+        assert len(scheduler) == 2
+        assert scheduler.run_pending() == []
+
+        clock['now'] = start + timezone.timedelta(hours=2, minutes=1)
+        assert {(e.ticket_id, e.threshold) for e in scheduler.run_pending()} == {(ticket.pk, 0.5), (other.pk, 0.5)}
+
+        other.start_work()
+        other.complete_work()
+        scheduler.refresh()
+        assert len(scheduler) == 1
+
+        clock['now'] = start + timezone.timedelta(hours=5)
+        events = scheduler.run_pending()
+        assert [(e.ticket_id, e.threshold) for e in events] == [(ticket.pk, 0.8), (ticket.pk, 1.0)]
+        assert scheduler.next_fire_at() is None
+    finally:
+        sla_threshold_reached.disconnect(handler)
+    assert len(received) == 4
+    assert Ticket.objects.get(pk=ticket.pk).sla_breached
+    assert not Ticket.objects.get(pk=other.pk).sla_breached
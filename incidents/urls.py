@@ -4,7 +4,7 @@ from .views import (
     IncidentListView, IncidentDetailView,
     assign_ticket, start_work, pause_work, complete_work, client_response,
     IncidentViewSet, api_assign_ticket, api_start_work, api_pause_work,
-    api_complete_work, api_client_response
+    api_complete_work, api_client_response, api_metrics_rollups
 )
 
 router = DefaultRouter()
@@ -26,6 +26,7 @@ urlpatterns = [
     path('api/ticket/<int:ticket_id>/pause/', api_pause_work, name='api_pause_work'),
     path('api/ticket/<int:ticket_id>/complete/', api_complete_work, name='api_complete_work'),
     path('api/<int:incident_id>/client-response/', api_client_response, name='api_client_response'),
+    path('api/metrics/rollups/', api_metrics_rollups, name='api_metrics_rollups'),
 
     # DRF router-based endpoints (e.g. /api/incidents/)
     path('', include(router.urls)),
@@ -3,13 +3,25 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.utils import timezone
-from .models import Incident, Ticket, Analysis, IncidentStatus, TicketStatus
-from threat_intelligence.models import Playbook
-from rest_framework import viewsets
-from rest_framework.decorators import api_view, permission_classes
+from .models import Incident, Ticket, Analysis, MetricsRollup, IncidentStatus, TicketStatus
+from threat_intelligence.catalog import playbook_for
+from users.models import Analyst
+from rest_framework import viewsets, status as http_status
+from rest_framework.decorators import action, api_view, permission_classes
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from .serializers import IncidentSerializer
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer
+from .serializers import IncidentSerializer, IncidentCompactSerializer
+from .renderers import FastJSONRenderer
+from .pagination import IncidentCursorPagination
+from .bulk import ingest_incidents, BULK_INGEST_MAX_ITEMS
+from .jobs import enqueue
+from .rollups import summarize_rollups, ROLLUP_GROUP_FIELDS
+from common.enums import MTTxMetric
+from datetime import date
 from django.shortcuts import get_object_or_404
 
 class IncidentListView(LoginRequiredMixin, ListView):
@@ -37,7 +49,11 @@ class IncidentDetailView(LoginRequiredMixin, DetailView):
     template_name = 'incidents/incident_detail.html'
     context_object_name = 'incident'
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('ticket')
+
     def get_context_data(self, **kwargs):
+        # Read-only: the SLA is computed from deadline_timestamp, nothing is saved on a GET.
         context = super().get_context_data(**kwargs)
         context['ticket'] = self.object.ticket
         context['analyses'] = self.object.analyses.all()
@@ -84,18 +100,20 @@ def complete_work(request, ticket_id):
         classification = request.POST.get('classification')
         notes = request.POST.get('notes', '')
         ticket.incident.incident_type = classification
-        analysis = ticket.incident.add_analysis(request.user.analyst, notes)
-        ticket.complete_work()
-        if classification in ['true_positive_legitimate', 'true_positive_phishing']:
-            try:
-                playbook = Playbook.objects.get(incident_type=classification)
-                ticket.incident.start_playbook(playbook, ticket, analysis)
-            except Playbook.DoesNotExist:
-                messages.error(request, "No playbook found for this incident type.")
-            message = f"Incident classified as {classification}. Recommended action: {request.POST.get('action', 'Review')}"
-            ticket.incident.notify_client(message)
-        else:
-            ticket.incident.close()
+        # Playbook and client email run on the job workers, queued with the completion itself
+        with transaction.atomic():
+            analysis = ticket.incident.add_analysis(request.user.analyst, notes)
+            ticket.complete_work()
+            if classification in ['true_positive_legitimate', 'true_positive_phishing']:
+                playbook = playbook_for(classification)
+                if playbook is None:
+                    messages.error(request, "No playbook found for this incident type.")
+                else:
+                    enqueue('incidents.start_playbook', playbook_id=playbook.playbook_id, analysis_id=analysis.pk)
+                message = f"Incident classified as {classification}. Recommended action: {request.POST.get('action', 'Review')}"
+                enqueue('incidents.notify_client', incident_id=ticket.incident.id, message=message)
+            else:
+                ticket.incident.close()
         messages.success(request, "Ticket completed.")
     else:
         messages.error(request, "Cannot complete this ticket.")
@@ -115,9 +133,69 @@ class IncidentViewSet(viewsets.ModelViewSet):
     queryset = Incident.objects.all()
     serializer_class = IncidentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IncidentCursorPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    nested_fields = {'ticket', 'analyses'}
+
+    def get_requested_fields(self):
+        """Fields picked with ?fields= and ?expand=, or None for the full representation.
+
+        ``fields`` selects top-level fields; ``expand`` adds the nested
+        ``ticket``/``analyses`` objects to that selection.
+        """
+        if hasattr(self, '_requested_fields'):
+            return self._requested_fields
+        params = self.request.query_params
+        fields = [name for name in params.get('fields', '').split(',') if name]
+        expand = [name for name in params.get('expand', '').split(',') if name]
+        unknown_expand = set(expand) - self.nested_fields
+        if unknown_expand:
+            raise ValidationError({'expand': [f"Unknown nested field(s): {', '.join(sorted(unknown_expand))}."]})
+        allowed = set(IncidentSerializer.Meta.fields) | set(IncidentCompactSerializer._declared_fields)
+        unknown_fields = set(fields) - allowed
+        if unknown_fields:
+            raise ValidationError({'fields': [f"Unknown field(s): {', '.join(sorted(unknown_fields))}."]})
+        self._requested_fields = list(dict.fromkeys(fields + expand)) if fields else None
+        return self._requested_fields
+
+    def use_compact_representation(self):
+        fields = self.get_requested_fields()
+        return (
+            self.action == 'list' and fields is not None
+            and set(fields) <= set(IncidentCompactSerializer._declared_fields)
+        )
+
+    def get_serializer_class(self):
+        if self.use_compact_representation():
+            return IncidentCompactSerializer
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method in SAFE_METHODS:
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if self.use_compact_representation():
+            # Plain dicts straight from the database; the cursor needs its ordering columns.
+            names, expressions = IncidentCompactSerializer.values_arguments(fields)
+            names = list(dict.fromkeys(names + ['creation_timestamp', 'id']))
+            queryset = queryset.values(*names, **expressions)
+        else:
+            # Fetch everything IncidentSerializer nests up front: 1 query for incidents + tickets,
+            # 1 for ticket analysts and 1 for analyses with their analyst/user, whatever the page size.
+            nested = self.nested_fields if fields is None else self.nested_fields.intersection(fields)
+            queryset = queryset.select_related('ticket')
+            if 'ticket' in nested:
+                queryset = queryset.prefetch_related(
+                    Prefetch('ticket__assigned_analysts', queryset=Analyst.objects.only('pk'))
+                )
+            if 'analyses' in nested:
+                queryset = queryset.prefetch_related(
+                    Prefetch('analyses', queryset=Analysis.objects.select_related('analyst__user'))
+                )
         status = self.request.query_params.get('status')
         severity = self.request.query_params.get('severity')
         analyst = self.request.query_params.get('analyst')
@@ -126,8 +204,26 @@ class IncidentViewSet(viewsets.ModelViewSet):
         if severity:
             queryset = queryset.filter(severity=severity)
         if analyst:
+            # Usernames are unique, so this join yields at most one row per incident.
             queryset = queryset.filter(ticket__assigned_analysts__user__username=analyst)
-        return queryset.distinct()
+        return queryset
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        items = request.data.get('incidents') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of incidents.'}, status=http_status.HTTP_400_BAD_REQUEST)
+        if len(items) > BULK_INGEST_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {BULK_INGEST_MAX_ITEMS} incidents per request.'},
+                status=http_status.HTTP_400_BAD_REQUEST
+            )
+        results = ingest_incidents(items)
+        created = sum(1 for result in results if 'id' in result)
+        return Response(
+            {'created': created, 'failed': len(results) - created, 'results': results},
+            status=http_status.HTTP_201_CREATED if created else http_status.HTTP_400_BAD_REQUEST
+        )
 
 # API endpoints for ticket actions
 @api_view(['POST'])
@@ -171,19 +267,18 @@ def api_complete_work(request, ticket_id):
         classification = request.data.get('classification')
         notes = request.data.get('notes', '')
         ticket.incident.incident_type = classification
-        analysis = ticket.incident.add_analysis(request.user.analyst, notes)
-        ticket.complete_work()
-        if classification in ['true_positive_legitimate', 'true_positive_phishing']:
-            try:
-                from threat_intelligence.models import Playbook
-                playbook = Playbook.objects.get(incident_type=classification)
-                ticket.incident.start_playbook(playbook, ticket, analysis)
-            except Playbook.DoesNotExist:
-                return Response({'error': 'No playbook found for this incident type.'}, status=400)
-            message = f"Incident classified as {classification}. Recommended action: Review"
-            ticket.incident.notify_client(message)
-        else:
-            ticket.incident.close()
+        with transaction.atomic():
+            analysis = ticket.incident.add_analysis(request.user.analyst, notes)
+            ticket.complete_work()
+            if classification in ['true_positive_legitimate', 'true_positive_phishing']:
+                playbook = playbook_for(classification)
+                if playbook is None:
+                    return Response({'error': 'No playbook found for this incident type.'}, status=400)
+                enqueue('incidents.start_playbook', playbook_id=playbook.playbook_id, analysis_id=analysis.pk)
+                message = f"Incident classified as {classification}. Recommended action: Review"
+                enqueue('incidents.notify_client', incident_id=ticket.incident.id, message=message)
+            else:
+                ticket.incident.close()
         return Response({'status': 'Ticket completed.'})
     return Response({'error': 'Cannot complete this ticket.'}, status=400)
 
@@ -194,4 +289,32 @@ def api_client_response(request, incident_id):
     ticket = incident.ticket
     ticket.set_client_response()
     incident.update_status()
-    return Response({'status': 'Client response recorded.'})
\ No newline at end of file
+    return Response({'status': 'Client response recorded.'})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_metrics_rollups(request):
+    # Served from MetricsRollup only: cost grows with the number of buckets, not tickets.
+    params = request.query_params
+    rollups = MetricsRollup.objects.all()
+    try:
+        if params.get('since'):
+            rollups = rollups.filter(day__gte=date.fromisoformat(params['since']))
+        if params.get('until'):
+            rollups = rollups.filter(day__lte=date.fromisoformat(params['until']))
+    except ValueError:
+        return Response({'error': 'since/until must be YYYY-MM-DD dates.'}, status=400)
+    if params.get('metric'):
+        if params['metric'] not in MTTxMetric.values:
+            return Response({'error': f"metric must be one of {', '.join(MTTxMetric.values)}."}, status=400)
+        rollups = rollups.filter(metric=params['metric'])
+    if params.get('client'):
+        if not params['client'].isdigit():
+            return Response({'error': 'client must be a client id.'}, status=400)
+        rollups = rollups.filter(client_id=params['client'])
+    if params.get('severity'):
+        rollups = rollups.filter(severity=params['severity'])
+    group_by = [field for field in params.get('group_by', ','.join(ROLLUP_GROUP_FIELDS)).split(',') if field]
+    if set(group_by) - set(ROLLUP_GROUP_FIELDS):
+        return Response({'error': f"group_by accepts {', '.join(ROLLUP_GROUP_FIELDS)}."}, status=400)
+    return Response({'results': summarize_rollups(rollups, group_by=group_by)})
\ No newline at end of file
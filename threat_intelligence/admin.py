@@ -1,6 +1,6 @@
 # threat_intelligence/admin.py
 from django.contrib import admin
-from .models import IOC, Playbook, PlaybookExecution, PlaybookStepExecution
+from .models import IOC, ArchivedIOC, Playbook, PlaybookExecution, PlaybookStepExecution
 
 @admin.register(IOC)
 class IOCAdmin(admin.ModelAdmin):
@@ -9,6 +9,18 @@ class IOCAdmin(admin.ModelAdmin):
     search_fields = ('value',)
     readonly_fields = ('created_at', 'updated_at')  
 
+@admin.register(ArchivedIOC)
+class ArchivedIOCAdmin(admin.ModelAdmin):
+    list_display = ('id', 'type', 'value', 'source', 'confidence_score', 'last_seen_at', 'archived_at')
+    list_filter = ('type', 'source')
+    search_fields = ('value',)
+    actions = ['restore']
+
+    @admin.action(description="Move back to the IOC table")
+    def restore(self, request, queryset):
+        for archived in queryset:
+            archived.restore()
+
 @admin.register(Playbook)
 class PlaybookAdmin(admin.ModelAdmin):
     list_display = ('playbook_id', 'name', 'incident_type', 'created_at')
@@ -0,0 +1,101 @@
+"""Confidence decay of IOCs and archival of the expired ones.
+
+``confidence_score`` halves every half-life since ``last_seen_at``, starting
+from ``base_confidence`` (the score the indicator had when it was last
+reported or sighted). Half-lives depend on the indicator type and are
+scaled per source. ``decay_confidence`` recomputes the scores with one
+UPDATE per primary key range, touching only rows whose score goes down.
+
+IOCs whose decayed score falls below ``IOC_EXPIRY_CONFIDENCE`` and that are
+neither blocked nor linked to an incident that is still open are moved to
+``ArchivedIOC`` by ``archive_expired_iocs``, one short transaction per
+batch. The hot IOC table, its indexes, and everything that matches or
+correlates against it (IOCMatcher, the snapshot, incident correlation)
+therefore only see live indicators.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Exists, F, FloatField, IntegerField, Max, Min, OuterRef, Value, When
+from django.db.models.functions import Cast, Extract, Power, Round
+from django.utils import timezone
+from common.enums import IncidentStatus, IOCSourceChoices, IOCTypeChoices
+from incidents.models import IncidentIOC
+from .models import IOC, ArchivedIOC
+
+DAY = 24 * 3600
+IOC_HALF_LIVES = getattr(settings, 'IOC_HALF_LIVES', {
+    IOCTypeChoices.IP: 30 * DAY,
+    IOCTypeChoices.URL: 60 * DAY,
+    IOCTypeChoices.DOMAIN: 90 * DAY,
+    IOCTypeChoices.EMAIL: 180 * DAY,
+    IOCTypeChoices.SUBJECT: 60 * DAY,
+    IOCTypeChoices.HASH: 365 * DAY,
+    IOCTypeChoices.OTHER: 90 * DAY,
+})
+# Indicators our own analysts raised age slower than third-party feed entries
+IOC_SOURCE_HALF_LIFE_FACTORS = getattr(settings, 'IOC_SOURCE_HALF_LIFE_FACTORS', {
+    IOCSourceChoices.INTERNAL: 2.0,
+    IOCSourceChoices.EXTERNAL: 1.0,
+})
+IOC_EXPIRY_CONFIDENCE = getattr(settings, 'IOC_EXPIRY_CONFIDENCE', 10)
+AGING_BATCH_SIZE = 10000
+
+
+def decayed_confidence(now):
+    """Expression for ``base_confidence * 0.5 ** (age / half-life)``, rounded."""
+    half_life = Case(
+        *[When(type=ioc_type, then=Value(float(seconds))) for ioc_type, seconds in IOC_HALF_LIVES.items()],
+        default=Value(float(90 * DAY)), output_field=FloatField()
+    ) * Case(
+        *[When(source=source, then=Value(float(factor))) for source, factor in IOC_SOURCE_HALF_LIFE_FACTORS.items()],
+        default=Value(1.0), output_field=FloatField()
+    )
+    age = Value(now.timestamp()) - Cast(Extract('last_seen_at', 'epoch'), FloatField())
+    return Cast(Round(F('base_confidence') * Power(Value(0.5), age / half_life)), IntegerField())
+
+
+def decay_confidence(now=None, batch_size=AGING_BATCH_SIZE):
+    """Lower every IOC's confidence to its decayed value; returns the number of rows updated."""
+    now = now or timezone.now()
+    bounds = IOC.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    decayed = decayed_confidence(now)
+    updated = 0
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        updated += IOC.objects.filter(
+            pk__gte=start, pk__lt=start + batch_size, confidence_score__gt=decayed
+        ).update(confidence_score=decayed)
+    return updated
+
+
+def expired_iocs():
+    open_links = IncidentIOC.objects.filter(ioc=OuterRef('pk')).exclude(incident__status=IncidentStatus.CLOSED)
+    return IOC.objects.filter(
+        confidence_score__lt=IOC_EXPIRY_CONFIDENCE, is_blocked=False
+    ).exclude(Exists(open_links))
+
+
+def archive_expired_iocs(batch_size=AGING_BATCH_SIZE):
+    """Move expired IOCs to ArchivedIOC, ``batch_size`` per transaction; returns the number archived."""
+    archived = 0
+    while True:
+        with transaction.atomic():
+            batch = list(expired_iocs().order_by('pk').select_for_update(skip_locked=True)[:batch_size])
+            if not batch:
+                return archived
+            incident_ids = {}
+            for ioc_id, incident_id in IncidentIOC.objects.filter(ioc__in=batch).values_list('ioc', 'incident'):
+                incident_ids.setdefault(ioc_id, []).append(incident_id)
+            ArchivedIOC.objects.bulk_create([
+                ArchivedIOC(
+                    original_id=ioc.pk, type=ioc.type, value=ioc.value, lookup_key=ioc.lookup_key,
+                    description=ioc.description, source=ioc.source, confidence_score=ioc.confidence_score,
+                    base_confidence=ioc.base_confidence, is_blocked=ioc.is_blocked, created_at=ioc.created_at,
+                    last_seen_at=ioc.last_seen_at, incident_ids=incident_ids.get(ioc.pk, []),
+                )
+                for ioc in batch
+            ])
+            IncidentIOC.objects.filter(ioc__in=batch).delete()
+            IOC.objects.filter(pk__in=[ioc.pk for ioc in batch]).delete()
+        archived += len(batch)
@@ -0,0 +1,159 @@
+"""Playbook and step timing analytics.
+
+``execution_timings`` and ``step_timings`` group finished executions by time
+window (the day, week or month they finished in) and compute counts,
+failures, totals, means and ``percentile_cont`` percentiles in a single
+aggregate query each; no per-execution rows reach Python.
+``rebuild_timing_rollups`` materializes their results for every window in
+``PlaybookTimingRollup`` (run by ``manage.py rebuild_playbook_timings``),
+which is all ``summarize_timings`` and the analytics endpoint read.
+"""
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Aggregate, Avg, Count, DateField, F, FloatField, Func, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from common.enums import PlaybookStatus, TimingWindow
+from .catalog import get_catalog
+from .models import PlaybookExecution, PlaybookStepExecution, PlaybookTimingRollup
+
+TIMING_QUANTILES = (0.5, 0.9, 0.99)
+FINISHED_STATUSES = [PlaybookStatus.COMPLETED, PlaybookStatus.FAILED]
+
+
+class Seconds(Func):
+    """A duration expression in (float) seconds."""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)::double precision'
+    output_field = FloatField()
+
+
+class PercentileCont(Aggregate):
+    """``percentile_cont(fraction) WITHIN GROUP (ORDER BY expression)``."""
+    function = 'percentile_cont'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+def _duration_aggregates(seconds):
+    completed = Q(status=PlaybookStatus.COMPLETED)
+    aggregates = {
+        'executions': Count('id'),
+        'failed': Count('id', filter=Q(status=PlaybookStatus.FAILED)),
+        'total_seconds': Sum(seconds, filter=completed, default=0.0),
+        'mean_seconds': Avg(seconds, filter=completed),
+    }
+    for q in TIMING_QUANTILES:
+        aggregates[f'p{round(q * 100)}_seconds'] = PercentileCont(seconds, q, filter=completed)
+    return aggregates
+
+
+def execution_timings(window, executions=None):
+    """Per window bucket and playbook: ``executions``, ``failed``, duration stats and ``paused_seconds``."""
+    executions = (executions if executions is not None else PlaybookExecution.objects.all()).filter(
+        status__in=FINISHED_STATUSES, completion_time__isnull=False, start_time__isnull=False
+    ).with_execution_time()
+    return executions.annotate(
+        bucket=Trunc('completion_time', window, output_field=DateField())
+    ).values('bucket', 'playbook_id').annotate(
+        **_duration_aggregates(Seconds(F('execution_time'))),
+        paused_seconds=Sum(Seconds(F('total_paused_time')), filter=Q(status=PlaybookStatus.COMPLETED), default=0.0),
+    ).order_by('bucket', 'playbook_id')
+
+
+def step_timings(window, step_executions=None):
+    """Per window bucket, playbook and step: ``executions``, ``failed`` and duration stats."""
+    step_executions = (step_executions if step_executions is not None else PlaybookStepExecution.objects.all()).filter(
+        status__in=FINISHED_STATUSES, completion_time__isnull=False, start_time__isnull=False
+    )
+    return step_executions.annotate(
+        bucket=Trunc('completion_time', window, output_field=DateField()),
+        playbook_id=F('step__playbook_id'),
+    ).values('bucket', 'playbook_id', 'step_id').annotate(
+        **_duration_aggregates(Seconds(F('completion_time') - F('start_time'))),
+    ).order_by('bucket', 'playbook_id', 'step_id')
+
+
+def rebuild_timing_rollups(since=None):
+    """Recompute the rollups of every window for executions finished on or after ``since`` (a date).
+
+    Buckets are rebuilt whole, from the start of the week or month ``since``
+    falls in. Returns the number of rollup rows written.
+    """
+    rows = []
+    with transaction.atomic():
+        for window in TimingWindow.values:
+            executions = PlaybookExecution.objects.all()
+            step_executions = PlaybookStepExecution.objects.all()
+            rollups = PlaybookTimingRollup.objects.filter(window=window)
+            if since:
+                start = _bucket_start(since, window)
+                start_time = timezone.make_aware(datetime.combine(start, datetime.min.time()))
+                executions = executions.filter(completion_time__gte=start_time)
+                step_executions = step_executions.filter(completion_time__gte=start_time)
+                rollups = rollups.filter(bucket__gte=start)
+            rollups.delete()
+            rows += [PlaybookTimingRollup(window=window, **row) for row in execution_timings(window, executions)]
+            rows += [PlaybookTimingRollup(window=window, **row) for row in step_timings(window, step_executions)]
+        PlaybookTimingRollup.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+def _bucket_start(day, window):
+    if window == TimingWindow.WEEK:
+        return day - timedelta(days=day.weekday())
+    if window == TimingWindow.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def _timing_stats(rollup):
+    return {
+        'executions': rollup.executions,
+        'failed': rollup.failed,
+        'failure_rate': rollup.failed / rollup.executions if rollup.executions else None,
+        'total_seconds': rollup.total_seconds,
+        'mean_seconds': rollup.mean_seconds,
+        **{f'p{round(q * 100)}_seconds': getattr(rollup, f'p{round(q * 100)}_seconds') for q in TIMING_QUANTILES},
+    }
+
+
+def summarize_timings(rollups):
+    """One entry per bucket and playbook, with its steps nested and ordered by the time they took in total."""
+    catalog = get_catalog()
+    results = {}
+    for rollup in rollups.order_by('bucket', 'playbook_id', 'step_id'):
+        playbook = catalog.by_id.get(rollup.playbook_id)
+        summary = results.get((rollup.bucket, rollup.playbook_id))
+        if summary is None:
+            # Steps can finish in an earlier bucket than their execution
+            summary = results[(rollup.bucket, rollup.playbook_id)] = {
+                'bucket': rollup.bucket,
+                'playbook': rollup.playbook_id,
+                'playbook_name': playbook.name if playbook else None,
+                **_timing_stats(PlaybookTimingRollup()),
+                'paused_seconds': 0.0,
+                'pause_share': None,
+                'steps': [],
+            }
+        if rollup.step_id is None:
+            elapsed = rollup.total_seconds + rollup.paused_seconds
+            summary.update(_timing_stats(rollup))
+            summary['paused_seconds'] = rollup.paused_seconds
+            summary['pause_share'] = rollup.paused_seconds / elapsed if elapsed else None
+            continue
+        step = next((step for step in playbook.steps if step.id == rollup.step_id), None) if playbook else None
+        summary['steps'].append({
+            'step': rollup.step_id,
+            'step_number': step.step_number if step else None,
+            'description': step.description if step else None,
+            **_timing_stats(rollup),
+        })
+    for summary in results.values():
+        step_total = sum(step['total_seconds'] for step in summary['steps'])
+        for step in summary['steps']:
+            step['share_of_step_time'] = step['total_seconds'] / step_total if step_total else None
+        summary['steps'].sort(key=lambda step: step['total_seconds'], reverse=True)
+    return list(results.values())
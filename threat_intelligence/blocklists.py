@@ -0,0 +1,212 @@
+"""Pre-rendered blocklist exports of the ``is_blocked`` IOCs, for firewalls and proxies.
+
+Every IOC type has a plain text, CSV and JSON artifact in
+``BLOCKLIST_EXPORT_DIR``, plus a ``manifest.json`` with the version each
+type was exported at and a digest of its content. Versions are
+``BlocklistChange`` ids: saving or deleting a blocked IOC records a change,
+and once the transaction commits ``schedule_export`` regenerates that type's
+artifacts on a background thread: once per transaction and type, and an
+export still waiting for the thread absorbs later requests. Files are written next to the current ones
+and swapped in with ``os.replace``, under a lock file so concurrent exports
+never go backwards.
+
+Ids are handed out in insert order, not commit order: a change can commit
+after a higher id was already exported. So the post-commit export always
+regenerates (only the ``export_blocklists`` command skips types whose
+version did not move), ETags include the content digest, and deltas also
+replay the changes recorded up to ``BLOCKLIST_DELTA_OVERLAP`` before the
+client's version.
+
+Serving a poll reads the manifest (cached until its mtime changes) and
+streams a file, or answers 304 when the ETag still matches; neither
+touches the database. ``since=<version>`` deltas are computed from the
+change log, down to ``oldest_version`` (the log is pruned past it).
+"""
+import csv
+import fcntl
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from common.enums import IOCTypeChoices
+from .models import IOC, BlocklistChange
+
+BLOCKLIST_EXPORT_DIR = getattr(settings, 'BLOCKLIST_EXPORT_DIR', settings.BASE_DIR / 'blocklists')
+BLOCKLIST_FORMATS = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+MANIFEST_NAME = 'manifest.json'
+# Longest a transaction recording blocklist changes is expected to stay open
+BLOCKLIST_DELTA_OVERLAP = getattr(settings, 'BLOCKLIST_DELTA_OVERLAP', timezone.timedelta(minutes=5))
+
+
+def artifact_path(ioc_type, file_format):
+    return os.path.join(BLOCKLIST_EXPORT_DIR, f"{ioc_type}.{file_format}")
+
+
+def etag(ioc_type, file_format, exported):
+    return f'"{ioc_type}-{file_format}-{exported["version"]}-{exported.get("digest", "")}"'
+
+
+_manifest_cache = (None, None, {})  # (path, mtime_ns, manifest)
+
+
+def read_manifest():
+    """``{type: {'version', 'digest', 'oldest_version', 'count', 'generated_at'}}`` of the exported artifacts."""
+    global _manifest_cache
+    path = os.path.join(BLOCKLIST_EXPORT_DIR, MANIFEST_NAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached_path, cached_mtime, manifest = _manifest_cache
+    if (cached_path, cached_mtime) != (path, mtime):
+        with open(path) as handle:
+            manifest = json.load(handle)
+        _manifest_cache = (path, mtime, manifest)
+    return manifest
+
+
+def _write_atomically(path, content):
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, 'w', newline='') as handle:
+        handle.write(content)
+    os.replace(temporary, path)
+
+
+def _render(rows):
+    text = ''.join(f"{value}\n" for value, _, _ in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['value', 'confidence_score', 'last_seen_at'])
+    writer.writerows((value, confidence, last_seen.isoformat()) for value, confidence, last_seen in rows)
+    entries = [
+        {'value': value, 'confidence_score': confidence, 'last_seen_at': last_seen.isoformat()}
+        for value, confidence, last_seen in rows
+    ]
+    return {'txt': text, 'csv': buffer.getvalue(), 'json': json.dumps(entries)}
+
+
+def export_blocklist(ioc_type, force=False):
+    """Regenerate ``ioc_type``'s artifacts if its version moved since the last export, or always with ``force``.
+
+    Returns the exported version, or None when the artifacts were already current.
+    """
+    os.makedirs(BLOCKLIST_EXPORT_DIR, exist_ok=True)
+    with open(os.path.join(BLOCKLIST_EXPORT_DIR, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = dict(read_manifest())
+        current = manifest.get(ioc_type)
+        # The version is read before the rows: a change committed in between is already in
+        # the files, and its own (forced) export regenerates them again.
+        changes = BlocklistChange.objects.filter(type=ioc_type).aggregate(version=Max('id'), oldest=Min('id'))
+        version = changes['version'] or 0
+        if current and current['version'] >= version and not force:
+            return None
+        rows = list(IOC.objects.filter(type=ioc_type, is_blocked=True).order_by('value').values_list(
+            'value', 'confidence_score', 'last_seen_at'
+        ))
+        rendered = _render(rows)
+        for file_format, content in rendered.items():
+            _write_atomically(artifact_path(ioc_type, file_format), content)
+        manifest[ioc_type] = {
+            'version': version,
+            'digest': hashlib.sha256(rendered['csv'].encode()).hexdigest()[:16],
+            'oldest_version': (current or {}).get('oldest_version', (changes['oldest'] or 1) - 1),
+            'count': len(rows),
+            'generated_at': timezone.now().isoformat(),
+        }
+        _write_atomically(os.path.join(BLOCKLIST_EXPORT_DIR, MANIFEST_NAME), json.dumps(manifest))
+    return version
+
+
+def export_blocklists(force=False):
+    """Export every IOC type; returns ``{type: version}`` for the types regenerated."""
+    exported = {}
+    for ioc_type in IOCTypeChoices.values:
+        version = export_blocklist(ioc_type, force=force)
+        if version is not None:
+            exported[ioc_type] = version
+    return exported
+
+
+def prune_changes(before):
+    """Drop change log entries older than ``before``; deltas from before the cut get a 410."""
+    os.makedirs(BLOCKLIST_EXPORT_DIR, exist_ok=True)
+    deleted = {}
+    for ioc_type in IOCTypeChoices.values:
+        old = BlocklistChange.objects.filter(type=ioc_type, changed_at__lt=before)
+        cut = old.aggregate(last=Max('id'))['last']
+        if cut is None:
+            continue
+        deleted[ioc_type] = old.delete()[0]
+        with open(os.path.join(BLOCKLIST_EXPORT_DIR, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            manifest = dict(read_manifest())
+            if ioc_type in manifest:
+                manifest[ioc_type] = {**manifest[ioc_type], 'oldest_version': cut}
+                _write_atomically(os.path.join(BLOCKLIST_EXPORT_DIR, MANIFEST_NAME), json.dumps(manifest))
+    return deleted
+
+
+def delta(ioc_type, since, version):
+    """Values added to and removed from the blocklist between versions ``since`` and ``version``.
+
+    Changes recorded within ``BLOCKLIST_DELTA_OVERLAP`` before ``since`` are
+    included again, in case they committed after it was exported; applying a
+    value twice is harmless.
+    """
+    changes = BlocklistChange.objects.filter(type=ioc_type, id__lte=version)
+    seen_at = changes.filter(id__lte=since).aggregate(last=Max('changed_at'))['last']
+    overlap = Q(id__gt=since)
+    if seen_at is not None:
+        overlap |= Q(changed_at__gte=seen_at - BLOCKLIST_DELTA_OVERLAP)
+    latest = {}
+    # Changes of one value are serialized by the IOC row lock, so their ids are in commit order
+    for value, blocked in changes.filter(overlap).order_by('id').values_list('value', 'blocked'):
+        latest[value] = blocked
+    return {
+        'version': version,
+        'added': sorted(value for value, blocked in latest.items() if blocked),
+        'removed': sorted(value for value, blocked in latest.items() if not blocked),
+    }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _export_in_background(ioc_type):
+    close_old_connections()
+    try:
+        export_blocklist(ioc_type, force=True)
+    finally:
+        close_old_connections()
+
+
+_pending_exports = {}
+
+
+def schedule_export(ioc_type):
+    """Regenerate ``ioc_type``'s artifacts on the process-wide export thread.
+
+    An export of the type that is queued but not started yet covers this
+    request too: it reads the rows after the caller's commit.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='blocklist-export')
+        pending = _pending_exports.get(ioc_type)
+        if pending is not None and not pending.running() and not pending.done():
+            return pending
+        future = _pending_exports[ioc_type] = _executor.submit(_export_in_background, ioc_type)
+    return future
@@ -0,0 +1,139 @@
+"""Process-local cache of the playbook catalog.
+
+Playbooks change maybe weekly but are looked up on every ticket completion
+and every engine run. ``get_catalog()`` keeps every playbook with its
+ordered steps and their dependencies in memory, keyed by ``incident_type``
+and by id, so those lookups cost no queries.
+
+Saving or deleting a Playbook or PlaybookStep, or changing step
+dependencies, records a ``PlaybookCatalogChange``; the latest change id and
+the number of changes are the catalog version. Each process re-reads the
+version at most every ``PLAYBOOK_CATALOG_CHECK_INTERVAL`` seconds and
+reloads when it moved, so edits reach every worker within that interval
+(and the editing process right away). Ids come from a sequence and are
+never reused, so a rolled back edit also forces a reload instead of leaving
+its steps cached; the count catches an edit that commits after a later one.
+Changes older than ``PLAYBOOK_CATALOG_CHANGE_RETENTION`` are pruned on the
+next edit.
+
+Starting an execution reads the version right away (``get_catalog(max_age=0)``)
+so its step executions match the steps that exist.
+"""
+import threading
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from .models import Playbook, PlaybookCatalogChange, PlaybookStep
+
+PLAYBOOK_CATALOG_CHECK_INTERVAL = getattr(settings, 'PLAYBOOK_CATALOG_CHECK_INTERVAL', 5)
+PLAYBOOK_CATALOG_CHANGE_RETENTION = getattr(settings, 'PLAYBOOK_CATALOG_CHANGE_RETENTION', timezone.timedelta(days=1))
+
+CatalogStep = namedtuple('CatalogStep', [
+    'id', 'step_number', 'description', 'is_automated', 'automation_script', 'timeout_seconds', 'depends_on',
+])
+# ``steps`` are in step_number order
+CatalogPlaybook = namedtuple('CatalogPlaybook', ['playbook_id', 'name', 'incident_type', 'steps'])
+
+
+class PlaybookCatalog:
+    def __init__(self, version, playbooks):
+        self.version = version
+        self.by_id = {playbook.playbook_id: playbook for playbook in playbooks}
+        self.by_incident_type = {}
+        # Several playbooks for one incident type: the oldest one wins
+        for playbook in sorted(playbooks, key=lambda playbook: playbook.playbook_id, reverse=True):
+            self.by_incident_type[playbook.incident_type] = playbook
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def dependencies(self, playbook_id):
+        """``{step id: set of step ids it depends on}``, in step_number order."""
+        return {step.id: set(step.depends_on) for step in self.by_id[playbook_id].steps}
+
+
+def current_version():
+    """``(latest change id, number of changes)``."""
+    changes = PlaybookCatalogChange.objects.aggregate(latest=Max('id'), count=Count('id'))
+    return changes['latest'] or 0, changes['count']
+
+
+def load_catalog():
+    """Read the whole catalog in three queries."""
+    version = current_version()
+    depends_on = {}
+    for step_id, other in PlaybookStep.depends_on.through.objects.values_list('from_playbookstep_id', 'to_playbookstep_id'):
+        depends_on.setdefault(step_id, []).append(other)
+    steps = {}
+    for step_id, playbook_id, number, description, is_automated, script, timeout in PlaybookStep.objects.order_by(
+        'playbook_id', 'step_number', 'id'
+    ).values_list(
+        'id', 'playbook_id', 'step_number', 'description', 'is_automated', 'automation_script', 'timeout_seconds'
+    ):
+        steps.setdefault(playbook_id, []).append(CatalogStep(
+            step_id, number, description, is_automated, script, timeout, tuple(sorted(depends_on.get(step_id, ())))
+        ))
+    playbooks = [
+        CatalogPlaybook(playbook_id, name, incident_type, tuple(steps.get(playbook_id, ())))
+        for playbook_id, name, incident_type in Playbook.objects.values_list('playbook_id', 'name', 'incident_type')
+    ]
+    return PlaybookCatalog(version, playbooks)
+
+
+_catalog = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_catalog(max_age=PLAYBOOK_CATALOG_CHECK_INTERVAL):
+    """This process's catalog, reloaded when the version moved; checked at most every ``max_age`` seconds."""
+    global _catalog, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _catalog is not None and now - _checked_at < max_age:
+            _stats['hits'] += 1
+            return _catalog
+        version = current_version()
+        _checked_at = now
+        if _catalog is not None and _catalog.version == version:
+            _stats['hits'] += 1
+            return _catalog
+        _stats['misses'] += 1
+        _catalog = load_catalog()
+        return _catalog
+
+
+def _lookup(table, key):
+    found = getattr(get_catalog(), table).get(key)
+    if found is None:
+        # Possibly created in another process since the last check: look at the version once more
+        found = getattr(get_catalog(max_age=0), table).get(key)
+    return found
+
+
+def playbook_for(incident_type):
+    """The CatalogPlaybook run for ``incident_type``, or None."""
+    return _lookup('by_incident_type', incident_type)
+
+
+def get_playbook(playbook_id):
+    """The CatalogPlaybook with ``playbook_id``, or None."""
+    return _lookup('by_id', playbook_id)
+
+
+def catalog_changed():
+    """Bump the catalog version; this process sees the change on its next lookup."""
+    global _checked_at
+    PlaybookCatalogChange.objects.filter(changed_at__lt=timezone.now() - PLAYBOOK_CATALOG_CHANGE_RETENTION).delete()
+    PlaybookCatalogChange.objects.create()
+    with _lock:
+        _checked_at = 0.0
+
+
+def catalog_stats():
+    """Hit/miss counters of this process's catalog cache (a miss is a reload)."""
+    with _lock:
+        return {**_stats, 'version': _catalog.version if _catalog is not None else None}
@@ -0,0 +1,198 @@
+"""Enrichment of IOCs through external threat intelligence providers.
+
+Providers are plain classes (``IOC_ENRICHMENT_PROVIDERS`` in settings, dotted
+paths) with a ``lookup(ioc_type, value, timeout)`` method, which must
+honour ``timeout`` (pass it to the HTTP client): a run stops waiting for
+lookups past its deadline, but a lookup that hangs keeps its pool thread.
+``enrich_iocs`` runs every (indicator, provider) lookup that is not already
+cached on a thread pool, paced by each provider's ``rate_limit`` and bounded
+by its ``timeout``:
+
+* work is deduplicated on ``IOC.lookup_key``, so IOCs sharing a canonical
+  value are looked up once per provider;
+* results land in the ``IOCEnrichment`` cache table, valid for the
+  provider's ``ttl``, with one upsert per run;
+* malicious verdicts raise the matching IOCs' confidence in one UPDATE.
+
+Database access stays on the calling thread; only provider calls run on
+the pool. ``enrich_in_background`` hands the whole thing to a process-wide
+executor so request handlers never wait for a provider.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import IOC, IOCEnrichment
+
+logger = logging.getLogger(__name__)
+
+IOC_ENRICHMENT_PROVIDERS = getattr(settings, 'IOC_ENRICHMENT_PROVIDERS', [
+    'threat_intelligence.enrichment.StubProvider',
+])
+ENRICHMENT_MAX_WORKERS = 8
+
+EnrichmentResult = namedtuple('EnrichmentResult', ['malicious', 'score', 'data'])
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+class EnrichmentProvider:
+    name = None
+    ioc_types = None  # None means every type
+    rate_limit = None  # calls per second, None for no limit
+    timeout = 10  # seconds
+    ttl = timezone.timedelta(hours=24)
+
+    def __init__(self):
+        self.limiter = RateLimiter(self.rate_limit)
+
+    def supports(self, ioc_type):
+        return self.ioc_types is None or ioc_type in self.ioc_types
+
+    def lookup(self, ioc_type, value, timeout):
+        """Return an EnrichmentResult; raise on failure so nothing is cached. Must give up after ``timeout`` seconds."""
+        raise NotImplementedError
+
+
+class StubProvider(EnrichmentProvider):
+    """Offline provider with deterministic verdicts, for development and tests.
+
+    An indicator is malicious when the first byte of the SHA-256 of its value
+    is below 64 (about a quarter of them). ``delay`` simulates network latency.
+    """
+    name = 'stub'
+    delay = 0.0
+
+    def lookup(self, ioc_type, value, timeout):
+        if self.delay:
+            time.sleep(min(self.delay, timeout))
+        digest = hashlib.sha256(value.encode()).digest()
+        malicious = digest[0] < 64
+        return EnrichmentResult(malicious, 90 if malicious else 0, {'digest': digest.hex()[:16]})
+
+
+def get_providers():
+    return [import_string(path)() for path in IOC_ENRICHMENT_PROVIDERS]
+
+
+def _call(provider, ioc_type, value):
+    provider.limiter.wait()
+    started = time.monotonic()
+    result = provider.lookup(ioc_type, value, provider.timeout)
+    if time.monotonic() - started > provider.timeout:
+        raise TimeoutError(f"{provider.name} took longer than {provider.timeout}s")
+    return result
+
+
+def enrich_iocs(iocs, providers=None, max_workers=ENRICHMENT_MAX_WORKERS):
+    """Look ``iocs`` up with every provider that has no fresh cached result for them.
+
+    Returns the number of provider lookups performed.
+    """
+    providers = get_providers() if providers is None else providers
+    indicators = {ioc.lookup_key: (ioc.type, ioc.value) for ioc in iocs}
+    if not indicators or not providers:
+        return 0
+    now = timezone.now()
+    cached = set(IOCEnrichment.objects.filter(
+        lookup_key__in=indicators, provider__in=[provider.name for provider in providers], expires_at__gt=now
+    ).values_list('lookup_key', 'provider'))
+    jobs = [
+        (key, provider)
+        for key, (ioc_type, _) in indicators.items()
+        for provider in providers
+        if provider.supports(ioc_type) and (key, provider.name) not in cached
+    ]
+    if not jobs:
+        return 0
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(jobs)))
+    try:
+        futures = {executor.submit(_call, provider, *indicators[key]): (key, provider) for key, provider in jobs}
+        # Generous overall bound: every job waiting its turn plus its own timeout
+        deadline = max(
+            provider.timeout + (provider.limiter.interval * len(jobs)) for provider in providers
+        )
+        done, _ = wait(futures, timeout=deadline)
+    finally:
+        # Don't wait for lookups still hanging past the deadline, drop the ones not started
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    fetched_at = timezone.now()
+    rows, scores = [], {}
+    for future in done:
+        key, provider = futures[future]
+        try:
+            result = future.result()
+        except Exception as exc:
+            logger.warning(f"Enrichment of {indicators[key][1]} by {provider.name} failed: {exc}")
+            continue
+        rows.append(IOCEnrichment(
+            lookup_key=key, provider=provider.name, malicious=result.malicious, score=result.score,
+            data=result.data or {}, fetched_at=fetched_at, expires_at=fetched_at + provider.ttl,
+        ))
+        if result.malicious and result.score:
+            scores[key] = max(scores.get(key, 0), result.score)
+    IOCEnrichment.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['lookup_key', 'provider'],
+        update_fields=['malicious', 'score', 'data', 'fetched_at', 'expires_at'],
+    )
+    if scores:
+        score = Case(
+            *[When(lookup_key=key, then=Value(value)) for key, value in scores.items()],
+            output_field=IntegerField()
+        )
+        IOC.objects.filter(lookup_key__in=scores).update(
+            confidence_score=Greatest('confidence_score', score), base_confidence=Greatest('base_confidence', score)
+        )
+    return len(rows)
+
+
+def purge_expired_enrichments(now=None):
+    return IOCEnrichment.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _enrich_ids(ioc_ids):
+    close_old_connections()
+    try:
+        enrich_iocs(IOC.objects.filter(pk__in=ioc_ids))
+    except Exception:
+        logger.exception("Background IOC enrichment failed")
+    finally:
+        close_old_connections()
+
+
+def enrich_in_background(ioc_ids):
+    """Queue enrichment of ``ioc_ids`` on the process-wide executor and return immediately."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ioc-enrichment')
+    return _executor.submit(_enrich_ids, list(ioc_ids))
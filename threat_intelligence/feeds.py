@@ -0,0 +1,269 @@
+"""Streaming import of threat feeds into the IOC table.
+
+Feeds are read record by record (CSV, JSON lines or a STIX 2 bundle), each
+indicator is normalised and the records are upserted ``batch_size`` at a
+time with ``INSERT ... ON CONFLICT (lookup_key) DO UPDATE``, so memory use
+is bounded by the batch whatever the size of the file. Progress is saved in
+an ``IOCFeedImport`` row after every batch, which is what ``resume`` uses to
+skip the records an interrupted run already stored.
+
+Uploads through the API are saved under ``FEED_UPLOAD_DIR`` by
+``queue_import`` and imported by a ``threat_intelligence.import_feed`` job
+(see ``incidents.jobs``); a retried job carries on from the saved progress.
+"""
+import codecs
+import csv
+import hashlib
+import itertools
+import json
+import os
+import re
+import time
+import uuid
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from common.enums import FeedFormat, ImportStatus, IOCSourceChoices
+from .models import IOC, IOCFeedImport
+from .normalization import normalize_ioc
+
+FEED_UPLOAD_DIR = getattr(settings, 'FEED_UPLOAD_DIR', settings.BASE_DIR / 'feed_uploads')
+IMPORT_BATCH_SIZE = 5000
+READ_CHUNK_SIZE = 1 << 20
+FINGERPRINT_BLOCK_SIZE = 1 << 16
+# Columns written on conflict (a re-reported IOC restarts its decay); description and is_blocked keep their stored values
+UPSERT_UPDATE_FIELDS = ['confidence_score', 'base_confidence', 'last_seen_at', 'source', 'updated_at']
+
+# STIX patterns such as [ipv4-addr:value = '1.2.3.4'] or [file:hashes.'SHA-256' = '...']
+STIX_COMPARISON = re.compile(r"([a-z0-9-]+):([\w.'-]+)\s*=\s*'((?:[^'\\]|\\.)*)'")
+STIX_OBJECT_TYPES = {
+    'ipv4-addr': 'ip', 'ipv6-addr': 'ip', 'domain-name': 'domain', 'url': 'url',
+    'email-addr': 'email', 'file': 'hash',
+}
+
+
+def _record(ioc_type, value, description=None, confidence=None):
+    return {'type': ioc_type, 'value': value, 'description': description, 'confidence': confidence}
+
+
+def _decoded_lines(stream):
+    return codecs.iterdecode(stream, 'utf-8-sig')
+
+
+def read_csv(stream):
+    """Records from a CSV feed with a header row containing at least ``type`` and ``value``."""
+    for row in csv.DictReader(_decoded_lines(stream)):
+        yield _record(row.get('type'), row.get('value'), row.get('description'), row.get('confidence'))
+
+
+def read_jsonl(stream):
+    """Records from one JSON object per line (``type``, ``value`` and optionally ``description``/``confidence``)."""
+    for line in _decoded_lines(stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield _record(item.get('type'), item.get('value'), item.get('description'), item.get('confidence'))
+
+
+def _stix_records(obj):
+    if obj.get('type') == 'indicator':
+        for object_type, path, value in STIX_COMPARISON.findall(obj.get('pattern', '')):
+            if object_type == 'email-message' and path == 'subject':
+                ioc_type = 'subject'
+            elif object_type == 'file' and path.startswith('hashes'):
+                ioc_type = 'hash'
+            else:
+                ioc_type = STIX_OBJECT_TYPES.get(object_type)
+            yield _record(ioc_type, value.replace("\\'", "'"), obj.get('description'), obj.get('confidence'))
+    elif obj.get('type') in STIX_OBJECT_TYPES and obj.get('value'):
+        yield _record(STIX_OBJECT_TYPES[obj['type']], obj['value'])
+
+
+class _JSONStream:
+    """Minimal pull parser over a text stream: decodes one JSON value at a time."""
+    WHITESPACE = ' \t\r\n'
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+
+    def _fill(self):
+        chunk = self.stream.read(READ_CHUNK_SIZE)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return bool(chunk)
+
+    def peek(self, skip=WHITESPACE):
+        """Next character that is not in ``skip`` (not consumed), or '' at the end of the stream."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in skip:
+                self.position += 1
+            if self.position < len(self.buffer) or not self._fill():
+                return self.buffer[self.position:self.position + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Malformed STIX bundle: expected {char!r}")
+        self.position += 1
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, self.position = self.decoder.raw_decode(self.buffer, self.position)
+                return value
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+
+
+def read_stix(stream):
+    """Records from a STIX 2 bundle, streaming its ``objects`` array one object at a time."""
+    bundle = _JSONStream(codecs.getreader('utf-8-sig')(stream))
+    bundle.expect('{')
+    # Walk the bundle's top-level members; everything but the objects array is small and skipped.
+    while bundle.peek(_JSONStream.WHITESPACE + ',') != '}':
+        key = bundle.decode()
+        bundle.expect(':')
+        if key != 'objects':
+            bundle.decode()
+            continue
+        bundle.expect('[')
+        while bundle.peek(_JSONStream.WHITESPACE + ',') != ']':
+            obj = bundle.decode()
+            if isinstance(obj, dict):
+                yield from _stix_records(obj)
+            else:
+                yield None
+        return
+
+
+READERS = {
+    FeedFormat.CSV: read_csv,
+    FeedFormat.JSONL: read_jsonl,
+    FeedFormat.STIX: read_stix,
+}
+
+
+def file_fingerprint(stream):
+    """Cheap identity of a feed file: its size and first block, so resume never mixes two files."""
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(0)
+    digest = hashlib.sha256(str(size).encode())
+    digest.update(stream.read(FINGERPRINT_BLOCK_SIZE))
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _confidence(value):
+    try:
+        return min(max(int(float(value)), 0), 100)
+    except (TypeError, ValueError):
+        return IOC._meta.get_field('confidence_score').default
+
+
+def upsert_iocs(records, source):
+    """Upsert a batch of normalised records in one statement; returns the number of rows written."""
+    if not records:
+        return 0
+    now = timezone.now()
+    return len(IOC.objects.bulk_create(
+        [
+            IOC(
+                type=ioc_type, value=value, description=record['description'] or None,
+                source=source, confidence_score=_confidence(record['confidence']),
+                created_at=now, updated_at=now, last_seen_at=now,
+            )
+            for (ioc_type, value), record in records.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['lookup_key'],
+        update_fields=UPSERT_UPDATE_FIELDS,
+    ))
+
+
+def queue_import(upload, file_format, source=IOCSourceChoices.EXTERNAL):
+    """Save an uploaded feed under ``FEED_UPLOAD_DIR`` and queue its import; returns the queued IOCFeedImport."""
+    os.makedirs(FEED_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(FEED_UPLOAD_DIR, f"{uuid.uuid4().hex}-{os.path.basename(upload.name)}")
+    with open(path, 'wb') as handle:
+        for chunk in upload.chunks():
+            handle.write(chunk)
+    with open(path, 'rb') as stream:
+        fingerprint = file_fingerprint(stream)
+    with transaction.atomic():
+        job = IOCFeedImport.objects.create(
+            path=path, fingerprint=fingerprint, file_format=file_format, source=source, status=ImportStatus.QUEUED,
+        )
+        job.run_in_background()
+    return job
+
+
+def import_feed(stream, file_format, path, source=IOCSourceChoices.EXTERNAL, resume=False,
+                batch_size=IMPORT_BATCH_SIZE, progress=None, job=None):
+    """Import the feed in binary ``stream``, recording progress in an IOCFeedImport.
+
+    With ``resume``, the latest unfinished import of the same file carries on
+    after the records it already stored; a given ``job`` carries on from its
+    own progress. ``progress`` is called with the job after every batch.
+    Returns the job.
+    """
+    fingerprint = file_fingerprint(stream)
+    if job is None and resume:
+        job = IOCFeedImport.objects.filter(
+            path=path, fingerprint=fingerprint, file_format=file_format
+        ).exclude(status=ImportStatus.COMPLETED).order_by('-started_at').first()
+    if job is None:
+        job = IOCFeedImport.objects.create(path=path, fingerprint=fingerprint, file_format=file_format, source=source)
+    job.status = ImportStatus.RUNNING
+    job.error = ''
+    job.save()
+
+    position = job.rows_read
+    rejected = pending = 0
+    batch = {}
+    started = time.monotonic()
+    elapsed_before = job.elapsed
+
+    def flush():
+        nonlocal rejected, pending
+        upserted = upsert_iocs(batch, job.source)
+        job.rows_read = position
+        job.rows_upserted += upserted
+        job.rows_rejected += rejected
+        job.elapsed = elapsed_before + timezone.timedelta(seconds=time.monotonic() - started)
+        job.save()
+        batch.clear()
+        rejected = pending = 0
+        if progress:
+            progress(job)
+
+    try:
+        # Records before the checkpoint are parsed but not written again.
+        for record in itertools.islice(READERS[file_format](stream), job.rows_read, None):
+            position += 1
+            pending += 1
+            normalized = normalize_ioc(record['type'], record['value']) if record else None
+            if normalized is None:
+                rejected += 1
+            else:
+                batch[normalized] = record
+            if pending >= batch_size:
+                flush()
+        flush()
+    except Exception as exc:
+        job.status = ImportStatus.FAILED
+        job.error = str(exc)
+        job.save()
+        raise
+    job.status = ImportStatus.COMPLETED
+    job.save()
+    return job
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from threat_intelligence.aging import archive_expired_iocs, decay_confidence, AGING_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Decay IOC confidence scores and move expired IOCs to the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=AGING_BATCH_SIZE)
+        parser.add_argument('--no-archive', action='store_true', help="Only decay confidence scores.")
+
+    def handle(self, *args, **options):
+        decayed = decay_confidence(batch_size=options['batch_size'])
+        self.stdout.write(f"Decayed the confidence of {decayed} IOCs.")
+        if not options['no_archive']:
+            archived = archive_expired_iocs(batch_size=options['batch_size'])
+            self.stdout.write(f"Archived {archived} expired IOCs.")
+        self.stdout.write(self.style.SUCCESS("IOC aging complete."))
@@ -0,0 +1,51 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from common.enums import IOCTypeChoices
+from threat_intelligence.matching import IOCMatcher
+
+
+class Command(BaseCommand):
+    help = "Measure IOCMatcher lookups/sec on synthetic indicators, or on the real IOC table with --from-db."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iocs', type=int, default=100000, help="Synthetic indicators per type.")
+        parser.add_argument('--lookups', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--from-db', action='store_true')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        matcher = IOCMatcher()
+        started = time.perf_counter()
+        if options['from_db']:
+            matcher.load()
+        else:
+            for i in range(options['iocs']):
+                matcher.add(5 * i, IOCTypeChoices.IP, f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+                matcher.add(5 * i + 1, IOCTypeChoices.DOMAIN, f"host{i}.evil.example")
+                matcher.add(5 * i + 2, IOCTypeChoices.URL, f"http://site{i}.example/path/{i}")
+                matcher.add(5 * i + 3, IOCTypeChoices.HASH, f"{i:064x}")
+                matcher.add(5 * i + 4, IOCTypeChoices.EMAIL, f"user{i}@evil.example")
+            matcher.add(-1, IOCTypeChoices.IP, "192.168.0.0/16")
+        self.stdout.write(f"Indexed {len(matcher)} IOCs in {time.perf_counter() - started:.2f}s")
+
+        n = options['iocs']
+        generators = [
+            lambda: (IOCTypeChoices.IP, f"{rng.choice(['10', '192'])}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"),
+            lambda: (IOCTypeChoices.DOMAIN, f"www.host{rng.randrange(2 * n)}.evil.example"),
+            lambda: (IOCTypeChoices.URL, f"http://site{rng.randrange(2 * n)}.example/path/{rng.randrange(n)}/x?q=1"),
+            lambda: (IOCTypeChoices.HASH, f"{rng.randrange(2 * n):064x}"),
+            lambda: (IOCTypeChoices.EMAIL, f"user{rng.randrange(2 * n)}@evil.example"),
+        ]
+        observables = [rng.choice(generators)() for _ in range(options['lookups'])]
+        batch_size = options['batch_size']
+        matched = 0
+        started = time.perf_counter()
+        for start in range(0, len(observables), batch_size):
+            matched += len(matcher.match(observables[start:start + batch_size]))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(observables)} lookups in {elapsed:.2f}s: {len(observables) / elapsed:,.0f} lookups/sec "
+            f"({matched} matched)"
+        ))
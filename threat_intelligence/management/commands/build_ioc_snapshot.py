@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from threat_intelligence.snapshot import build_snapshot, IOC_SNAPSHOT_PATH
+
+
+class Command(BaseCommand):
+    help = "Regenerate the memory-mapped IOC snapshot, carrying over unchanged records from the current one."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=str(IOC_SNAPSHOT_PATH))
+        parser.add_argument('--full', action='store_true', help="Rebuild from the whole IOC table.")
+
+    def handle(self, *args, **options):
+        snapshot = build_snapshot(options['path'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote snapshot version {snapshot.version} with {len(snapshot)} IOCs to {snapshot.path}."
+        ))
+        snapshot.close()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from threat_intelligence.enrichment import enrich_iocs, purge_expired_enrichments, ENRICHMENT_MAX_WORKERS
+from threat_intelligence.models import IOC, IOCEnrichment
+
+
+class Command(BaseCommand):
+    help = "Enrich IOCs without a fresh provider verdict and purge expired cache entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=ENRICHMENT_MAX_WORKERS)
+
+    def handle(self, *args, **options):
+        purged = purge_expired_enrichments()
+        fresh = IOCEnrichment.objects.filter(lookup_key=OuterRef('lookup_key'), expires_at__gt=timezone.now())
+        stale = IOC.objects.exclude(Exists(fresh)).order_by('pk')
+        looked_up = 0
+        last_pk = 0
+        while True:
+            batch = list(stale.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            looked_up += enrich_iocs(batch, max_workers=options['workers'])
+            last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(f"{looked_up} provider lookups done, {purged} expired verdicts purged."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from threat_intelligence.blocklists import export_blocklists, prune_changes
+
+
+class Command(BaseCommand):
+    help = "Regenerate the blocklist export files of the IOC types whose blocked indicators changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate every type.")
+        parser.add_argument('--prune-days', type=int, help="Also drop change log entries older than this.")
+
+    def handle(self, *args, **options):
+        if options['prune_days'] is not None:
+            pruned = prune_changes(timezone.now() - timezone.timedelta(days=options['prune_days']))
+            self.stdout.write(f"Pruned {sum(pruned.values())} blocklist changes.")
+        exported = export_blocklists(force=options['force'])
+        for ioc_type, version in exported.items():
+            self.stdout.write(f"Exported the {ioc_type} blocklist at version {version}.")
+        self.stdout.write(self.style.SUCCESS(f"{len(exported)} blocklists regenerated."))
@@ -0,0 +1,14 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from threat_intelligence.analytics import rebuild_timing_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the PlaybookTimingRollup rows from the playbook and step executions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        written = rebuild_timing_rollups(since=options['since'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} rollup row(s)."))
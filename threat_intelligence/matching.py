@@ -0,0 +1,188 @@
+"""In-memory matcher of raw event observables against the IOC table.
+
+One structure per indicator type, each answering a lookup in a handful of
+dict probes:
+
+* ``hash``/``email``/``subject``/``other``: hashed sets of the normalised value.
+* ``ip``: CIDR tables, one hash table of network addresses per prefix length
+  present, per address family. A lookup masks the address once per prefix
+  length, so single hosts and ranges (``10.0.0.0/8``) are both matched.
+* ``domain``: reversed-label trie, so ``evil.example`` also matches
+  ``mail.evil.example``.
+* ``url``: normalised-prefix index. A lookup probes every path-segment
+  prefix of the normalised observable URL.
+
+``load()`` builds everything from the database, ``refresh()`` then only
+re-reads IOCs whose ``updated_at`` moved. Deleted IOCs are only dropped by
+the next ``load()``.
+"""
+import ipaddress
+from django.utils import timezone
+from common.enums import IOCTypeChoices
+from .models import IOC
+from .normalization import normalize_ioc, normalize_url
+
+REFRESH_OVERLAP = timezone.timedelta(seconds=5)
+
+
+def _url_prefixes(url):
+    """The normalised URL, without its query, and cut at every path separator."""
+    yield url
+    query = url.find('?')
+    base = url if query == -1 else url[:query]
+    if query != -1:
+        yield base
+    root = url.find('/', url.find('://') + 3)
+    position = len(base)
+    while position > root:
+        position = base.rfind('/', root, position)
+        yield base[:position + 1]
+        if position > root:
+            yield base[:position]
+
+
+class IOCMatcher:
+    EXACT_TYPES = (IOCTypeChoices.HASH, IOCTypeChoices.EMAIL, IOCTypeChoices.SUBJECT, IOCTypeChoices.OTHER)
+
+    def __init__(self):
+        self._clear()
+
+    def _clear(self):
+        self.exact = {ioc_type: {} for ioc_type in self.EXACT_TYPES}
+        self.networks = {4: {}, 6: {}}  # version -> {prefixlen: {network int: {ids}}}
+        self.domains = {}
+        self.urls = {}
+        self._entries = {}
+        self.synced_at = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Index maintenance
+
+    def _key(self, ioc_type, value):
+        if ioc_type == IOCTypeChoices.IP:
+            try:
+                network = ipaddress.ip_network(value.strip(), strict=False)
+            except ValueError:
+                return None
+            return network.version, network.prefixlen, int(network.network_address)
+        if ioc_type == IOCTypeChoices.URL:
+            return normalize_url(value) or None
+        normalized = normalize_ioc(ioc_type, value)
+        if normalized is None:
+            return None
+        if ioc_type == IOCTypeChoices.DOMAIN:
+            return tuple(reversed(normalized[1].split('.')))
+        return normalized[1]
+
+    def _bucket(self, ioc_type, key, create):
+        if ioc_type == IOCTypeChoices.IP:
+            version, prefixlen, network = key
+            table = self.networks[version].setdefault(prefixlen, {}) if create else \
+                self.networks[version].get(prefixlen, {})
+            return table.setdefault(network, set()) if create else table.get(network)
+        if ioc_type == IOCTypeChoices.DOMAIN:
+            node = self.domains
+            for label in key:
+                node = node.setdefault(label, {}) if create else node.get(label)
+                if node is None:
+                    return None
+            return node.setdefault('', set()) if create else node.get('')
+        index = self.urls if ioc_type == IOCTypeChoices.URL else self.exact[ioc_type]
+        return index.setdefault(key, set()) if create else index.get(key)
+
+    def add(self, ioc_id, ioc_type, value):
+        self.remove(ioc_id)
+        key = self._key(ioc_type, value)
+        if key is None:
+            return
+        self._bucket(ioc_type, key, create=True).add(ioc_id)
+        self._entries[ioc_id] = (ioc_type, key)
+
+    def remove(self, ioc_id):
+        entry = self._entries.pop(ioc_id, None)
+        if entry is not None:
+            bucket = self._bucket(*entry, create=False)
+            if bucket is not None:
+                bucket.discard(ioc_id)
+
+    def load(self, queryset=None):
+        self._clear()
+        self.synced_at = timezone.now()
+        queryset = IOC.objects.all() if queryset is None else queryset
+        for ioc_id, ioc_type, value in queryset.values_list('id', 'type', 'value').iterator(chunk_size=10000):
+            self.add(ioc_id, ioc_type, value)
+        return self
+
+    def refresh(self):
+        """Apply IOCs created or changed since the last sync."""
+        if self.synced_at is None:
+            return self.load()
+        synced_at, self.synced_at = self.synced_at, timezone.now()
+        changed = IOC.objects.filter(updated_at__gte=synced_at - REFRESH_OVERLAP)
+        for ioc_id, ioc_type, value in changed.values_list('id', 'type', 'value'):
+            self.add(ioc_id, ioc_type, value)
+        return self
+
+    # Lookups
+
+    def _match_ip(self, value):
+        try:
+            address = ipaddress.ip_address(value.strip())
+        except ValueError:
+            return set()
+        number = int(address)
+        bits = address.max_prefixlen
+        matches = set()
+        for prefixlen, table in self.networks[address.version].items():
+            ids = table.get(number >> (bits - prefixlen) << (bits - prefixlen))
+            if ids:
+                matches |= ids
+        return matches
+
+    def _match_domain(self, value):
+        normalized = normalize_ioc(IOCTypeChoices.DOMAIN, value)
+        if normalized is None:
+            return set()
+        matches = set()
+        node = self.domains
+        for label in reversed(normalized[1].split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            matches |= node.get('', set())
+        return matches
+
+    def _match_url(self, value):
+        url = normalize_url(value)
+        if not url:
+            return set()
+        matches = set()
+        for prefix in _url_prefixes(url):
+            matches |= self.urls.get(prefix, set())
+        return matches
+
+    def match_one(self, ioc_type, value):
+        """IOC ids matching a single observable."""
+        if ioc_type == IOCTypeChoices.IP:
+            return self._match_ip(value)
+        if ioc_type == IOCTypeChoices.DOMAIN:
+            return self._match_domain(value)
+        if ioc_type == IOCTypeChoices.URL:
+            return self._match_url(value)
+        index = self.exact.get(ioc_type)
+        normalized = normalize_ioc(ioc_type, value) if index is not None else None
+        return set(index.get(normalized[1], ())) if normalized else set()
+
+    def match(self, observables):
+        """Match a batch of ``(type, value)`` observables.
+
+        Returns ``{position in the batch: set of IOC ids}`` for the observables that matched.
+        """
+        results = {}
+        for position, (ioc_type, value) in enumerate(observables):
+            ids = self.match_one(ioc_type, value)
+            if ids:
+                results[position] = ids
+        return results
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:23
+
+import common.tracking
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IOCFeedImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500)),
+                ('fingerprint', models.CharField(help_text='Hash of the file size and first block', max_length=64)),
+                ('file_format', models.CharField(choices=[('csv', 'CSV'), ('jsonl', 'JSON lines'), ('stix', 'STIX 2 bundle')], max_length=10)),
+                ('source', models.CharField(choices=[('internal', 'Internal'), ('external', 'External')], default='external', max_length=20)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('rows_read', models.PositiveBigIntegerField(default=0)),
+                ('rows_upserted', models.PositiveBigIntegerField(default=0)),
+                ('rows_rejected', models.PositiveBigIntegerField(default=0)),
+                ('elapsed', models.DurationField(default=datetime.timedelta(0))),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['path', 'fingerprint', 'status'], name='threat_inte_path_aa32f0_idx')],
+            },
+            bases=(common.tracking.FieldTrackerMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,140 @@
+import hashlib
+import ipaddress
+from collections import defaultdict
+from urllib.parse import urlsplit, urlunsplit
+from django.db import migrations, models
+
+# Frozen copy of threat_intelligence.normalization as of this migration, so later
+# changes to the normalization rules don't change what it computes.
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+DEFANGED = (('[.]', '.'), ('(.)', '.'), ('[dot]', '.'), ('[:]', ':'), ('[@]', '@'), ('[at]', '@'))
+TYPE_ALIASES = {
+    'ip': 'ip', 'ipv4': 'ip', 'ipv6': 'ip', 'ipv4-addr': 'ip', 'ipv6-addr': 'ip', 'ip-src': 'ip', 'ip-dst': 'ip',
+    'domain': 'domain', 'domain-name': 'domain', 'hostname': 'domain',
+    'url': 'url', 'uri': 'url',
+    'hash': 'hash', 'file': 'hash', 'md5': 'hash', 'sha1': 'hash', 'sha256': 'hash', 'sha-1': 'hash', 'sha-256': 'hash',
+    'email': 'email', 'email-addr': 'email', 'email-src': 'email', 'email-dst': 'email',
+    'subject': 'subject', 'email-subject': 'subject',
+    'other': 'other',
+}
+
+
+def refang(value):
+    for defanged, plain in DEFANGED:
+        value = value.replace(defanged, plain)
+    return value
+
+
+def normalize_domain(value):
+    domain = refang(value.strip()).lower().rstrip('.')
+    try:
+        return domain.encode('idna').decode('ascii') if domain else ''
+    except UnicodeError:
+        return domain
+
+
+def normalize_ip(value):
+    try:
+        network = ipaddress.ip_network(refang(value.strip()), strict=False)
+    except ValueError:
+        return None
+    return str(network.network_address) if network.num_addresses == 1 else str(network)
+
+
+def normalize_url(value):
+    value = refang(value.strip())
+    if value.lower().startswith('hxxp'):
+        value = 'http' + value[4:]
+    if '://' not in value:
+        value = 'http://' + value
+    try:
+        parts = urlsplit(value)
+        host = normalize_domain(parts.hostname or '')
+        port = parts.port
+    except ValueError:
+        return ''
+    if not host:
+        return ''
+    scheme = parts.scheme.lower()
+    netloc = host if port is None or port == DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def normalize_email(value):
+    local, _, domain = refang(value.strip()).rpartition('@')
+    return f"{local.lower()}@{normalize_domain(domain)}" if local else value.strip().lower()
+
+
+def canonical_value(ioc_type, value):
+    value = (value or '').strip()
+    if ioc_type == 'ip':
+        return normalize_ip(value)
+    if ioc_type == 'domain':
+        return normalize_domain(value) or None
+    if ioc_type == 'url':
+        return normalize_url(value) or None
+    if ioc_type == 'email':
+        return normalize_email(value) or None
+    if ioc_type == 'hash':
+        return value.lower() or None
+    return value or None
+
+
+def ioc_lookup_key(ioc_type, value):
+    ioc_type = TYPE_ALIASES.get((ioc_type or '').strip().lower()) or (ioc_type or '')
+    value = canonical_value(ioc_type, value) or (value or '').strip()
+    return hashlib.sha256(f"{ioc_type}\0{value}".encode()).hexdigest()
+
+
+def merge_duplicate_iocs(apps, schema_editor):
+    """Key every IOC and fold rows with the same canonical form into the oldest one."""
+    IOC = apps.get_model('threat_intelligence', 'IOC')
+    IncidentIOC = apps.get_model('incidents', 'IncidentIOC')
+    by_key = defaultdict(list)
+    for ioc in IOC.objects.order_by('pk').iterator(chunk_size=2000):
+        ioc.lookup_key = ioc_lookup_key(ioc.type, ioc.value)
+        by_key[ioc.lookup_key].append(ioc)
+
+    survivors = []
+    for survivor, *duplicates in by_key.values():
+        survivors.append(survivor)
+        if not duplicates:
+            continue
+        duplicate_ids = [duplicate.pk for duplicate in duplicates]
+        survivor.confidence_score = max(ioc.confidence_score for ioc in [survivor, *duplicates])
+        survivor.is_blocked = any(ioc.is_blocked for ioc in [survivor, *duplicates])
+        survivor.description = survivor.description or next(
+            (duplicate.description for duplicate in duplicates if duplicate.description), None
+        )
+        linked = IncidentIOC.objects.filter(ioc=survivor).values('incident')
+        IncidentIOC.objects.filter(ioc_id__in=duplicate_ids, incident__in=linked).delete()
+        # One link per incident, then move the remaining links over to the survivor
+        seen = set()
+        for link in IncidentIOC.objects.filter(ioc_id__in=duplicate_ids).order_by('pk'):
+            if link.incident_id in seen:
+                link.delete()
+            else:
+                seen.add(link.incident_id)
+        IncidentIOC.objects.filter(ioc_id__in=duplicate_ids).update(ioc=survivor)
+        IOC.objects.filter(pk__in=duplicate_ids).delete()
+
+    IOC.objects.bulk_update(
+        survivors, ['lookup_key', 'confidence_score', 'is_blocked', 'description'], batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0002_iocfeedimport'),
+        ('incidents', '0003_incidentioc_ioc_incident_iocs_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ioc',
+            name='lookup_key',
+            field=models.CharField(editable=False, help_text='SHA-256 of the type and canonical value', max_length=64, null=True),
+        ),
+        migrations.RunPython(merge_duplicate_iocs, migrations.RunPython.noop),
+    ]
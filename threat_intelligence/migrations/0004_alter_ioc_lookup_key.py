@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0003_ioc_lookup_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ioc',
+            name='lookup_key',
+            field=models.CharField(editable=False, help_text='SHA-256 of the type and canonical value', max_length=64, unique=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ioc',
+            unique_together=set(),
+        ),
+    ]
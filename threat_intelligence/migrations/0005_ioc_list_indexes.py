@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:31
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0004_alter_ioc_lookup_key'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='ioc',
+            index=models.Index(fields=['created_at', 'id'], name='ioc_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ioc',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('value', models.TextField())), name='gin_trgm_ops'), name='ioc_value_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ioc',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='ioc_description_trgm_idx'),
+        ),
+    ]
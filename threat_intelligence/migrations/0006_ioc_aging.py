@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:35
+
+import common.tracking
+import django.contrib.postgres.fields
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_decay_from_current_scores(apps, schema_editor):
+    IOC = apps.get_model('threat_intelligence', 'IOC')
+    IOC.objects.update(base_confidence=F('confidence_score'), last_seen_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0005_ioc_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedIOC',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.IntegerField()),
+                ('type', models.CharField(choices=[('ip', 'IP Address'), ('email', 'Email Address'), ('domain', 'Domain'), ('url', 'URL'), ('hash', 'File Hash'), ('subject', 'Email Subject'), ('other', 'Other')], max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('lookup_key', models.CharField(db_index=True, max_length=64)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('source', models.CharField(choices=[('internal', 'Internal'), ('external', 'External')], max_length=20)),
+                ('confidence_score', models.IntegerField()),
+                ('base_confidence', models.IntegerField()),
+                ('is_blocked', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('last_seen_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('incident_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+            ],
+            bases=(common.tracking.FieldTrackerMixin, models.Model),
+        ),
+        migrations.AddField(
+            model_name='ioc',
+            name='base_confidence',
+            field=models.IntegerField(default=50, help_text='Confidence when last seen, before decay'),
+        ),
+        migrations.AddField(
+            model_name='ioc',
+            name='last_seen_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(start_decay_from_current_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:37
+
+import common.tracking
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0006_ioc_aging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IOCEnrichment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lookup_key', models.CharField(max_length=64)),
+                ('provider', models.CharField(max_length=50)),
+                ('malicious', models.BooleanField(default=False)),
+                ('score', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('fetched_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'unique_together': {('lookup_key', 'provider')},
+            },
+            bases=(common.tracking.FieldTrackerMixin, models.Model),
+        ),
+    ]
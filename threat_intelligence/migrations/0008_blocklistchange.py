@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:39
+
+import common.tracking
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0007_iocenrichment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlocklistChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('ip', 'IP Address'), ('email', 'Email Address'), ('domain', 'Domain'), ('url', 'URL'), ('hash', 'File Hash'), ('subject', 'Email Subject'), ('other', 'Other')], max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('blocked', models.BooleanField()),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['type', 'id'], name='threat_inte_type_170617_idx')],
+            },
+            bases=(common.tracking.FieldTrackerMixin, models.Model),
+        ),
+    ]
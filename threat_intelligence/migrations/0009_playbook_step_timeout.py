@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0008_blocklistchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playbookstep',
+            name='timeout_seconds',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='playbookexecution',
+            name='status',
+            field=models.CharField(choices=[('not_started', 'Not Started'), ('in_progress', 'In Progress'), ('paused', 'Paused'), ('completed', 'Completed'), ('failed', 'Failed')], default='not_started', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='playbookstepexecution',
+            name='status',
+            field=models.CharField(choices=[('not_started', 'Not Started'), ('in_progress', 'In Progress'), ('paused', 'Paused'), ('completed', 'Completed'), ('failed', 'Failed')], default='not_started', max_length=20),
+        ),
+    ]
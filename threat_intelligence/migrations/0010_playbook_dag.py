@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+def chain_existing_steps(apps, schema_editor):
+    # Existing playbooks ran in step_number order; keep that by making each step depend on the previous one
+    PlaybookStep = apps.get_model('threat_intelligence', 'PlaybookStep')
+    Dependency = PlaybookStep.depends_on.through
+    edges = []
+    previous = {}
+    for step_id, playbook_id in PlaybookStep.objects.order_by('playbook_id', 'step_number', 'id').values_list('id', 'playbook_id'):
+        if playbook_id in previous:
+            edges.append(Dependency(from_playbookstep_id=step_id, to_playbookstep_id=previous[playbook_id]))
+        previous[playbook_id] = step_id
+    Dependency.objects.bulk_create(edges)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0009_playbook_step_timeout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playbookexecution',
+            name='critical_path_duration',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='playbookstep',
+            name='depends_on',
+            field=models.ManyToManyField(blank=True, related_name='dependents', to='threat_intelligence.playbookstep'),
+        ),
+        migrations.RunPython(chain_existing_steps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:50
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_duplicate_active_executions(apps, schema_editor):
+    # Only the latest active execution per incident and playbook is kept running
+    PlaybookExecution = apps.get_model('threat_intelligence', 'PlaybookExecution')
+    seen = set()
+    duplicates = []
+    for execution_id, incident_id, playbook_id in PlaybookExecution.objects.filter(
+        status__in=['in_progress', 'paused']
+    ).order_by('-id').values_list('id', 'incident_id', 'playbook_id'):
+        if (incident_id, playbook_id) in seen:
+            duplicates.append(execution_id)
+        seen.add((incident_id, playbook_id))
+    PlaybookExecution.objects.filter(id__in=duplicates).update(status='failed', completion_time=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('incidents', '0009_job'),
+        ('threat_intelligence', '0010_playbook_dag'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_executions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='playbookexecution',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['in_progress', 'paused'])), fields=('incident', 'playbook'), name='one_active_execution_per_playbook'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0011_one_active_playbook_execution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaybookCatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='playbook',
+            name='incident_type',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('incidents', '0009_job'),
+        ('threat_intelligence', '0012_playbook_catalog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaybookTimingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('bucket', models.DateField()),
+                ('executions', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('mean_seconds', models.FloatField(null=True)),
+                ('p50_seconds', models.FloatField(null=True)),
+                ('p90_seconds', models.FloatField(null=True)),
+                ('p99_seconds', models.FloatField(null=True)),
+                ('paused_seconds', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='playbookexecution',
+            index=models.Index(fields=['completion_time'], name='playbook_exec_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playbookstepexecution',
+            index=models.Index(fields=['completion_time'], name='playbook_step_completed_idx'),
+        ),
+        migrations.AddField(
+            model_name='playbooktimingrollup',
+            name='playbook',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timing_rollups', to='threat_intelligence.playbook'),
+        ),
+        migrations.AddField(
+            model_name='playbooktimingrollup',
+            name='step',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='timing_rollups', to='threat_intelligence.playbookstep'),
+        ),
+        migrations.AddIndex(
+            model_name='playbooktimingrollup',
+            index=models.Index(fields=['window', 'bucket'], name='playbook_timing_window_idx'),
+        ),
+    ]
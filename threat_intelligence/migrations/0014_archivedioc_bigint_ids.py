@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:11
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0013_playbook_timing_rollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedioc',
+            name='incident_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AlterField(
+            model_name='archivedioc',
+            name='original_id',
+            field=models.BigIntegerField(),
+        ),
+    ]
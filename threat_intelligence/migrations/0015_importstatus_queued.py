@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threat_intelligence', '0014_archivedioc_bigint_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='iocfeedimport',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20),
+        ),
+    ]
@@ -1,46 +1,222 @@
 # threat_intelligence/models.py
-from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Case, ExpressionWrapper, F, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Now, Upper
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
-from common.enums import PlaybookStatus, IOCTypeChoices, IOCSourceChoices
+from common.enums import PlaybookStatus, IOCTypeChoices, IOCSourceChoices, FeedFormat, ImportStatus, TimingWindow
+from common.tracking import FieldTrackerMixin
+from .normalization import ioc_lookup_key
 
-class IOC(models.Model):
+class IOCQuerySet(models.QuerySet):
+    def matching(self, ioc_type, value):
+        """IOCs stored under the canonical form of ``value``, through the unique lookup key."""
+        return self.filter(lookup_key=ioc_lookup_key(ioc_type, value))
+
+    def search(self, text):
+        """Case-insensitive substring match on value or description, served by the trigram indexes."""
+        return self.filter(Q(value__icontains=text) | Q(description__icontains=text))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so key the rows here
+        objs = list(objs)
+        for ioc in objs:
+            ioc.lookup_key = ioc_lookup_key(ioc.type, ioc.value)
+            ioc.base_confidence = ioc.confidence_score
+        return super().bulk_create(objs, *args, **kwargs)
+
+class IOC(FieldTrackerMixin, models.Model):
     type = models.CharField(max_length=20, choices=IOCTypeChoices.choices)
     value = models.CharField(max_length=255)
+    lookup_key = models.CharField(max_length=64, unique=True, editable=False,
+                                  help_text="SHA-256 of the type and canonical value")
     description = models.TextField(blank=True, null=True)
     source = models.CharField(max_length=20, choices=IOCSourceChoices.choices, default=IOCSourceChoices.INTERNAL)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     confidence_score = models.IntegerField(default=50)
+    base_confidence = models.IntegerField(default=50, help_text="Confidence when last seen, before decay")
+    last_seen_at = models.DateTimeField(default=timezone.now, db_index=True)
     is_blocked = models.BooleanField(default=False)
 
+    objects = IOCQuerySet.as_manager()
+
     class Meta:
-        unique_together = ['type', 'value']
-        indexes = [models.Index(fields=['type', 'value']), models.Index(fields=['value'])]
+        indexes = [
+            models.Index(fields=['type', 'value']),
+            models.Index(fields=['value']),
+            models.Index(fields=['created_at', 'id'], name='ioc_created_id_idx'),
+            # icontains compiles to UPPER(column) LIKE UPPER('%...%') (value is cast to text); index those expressions
+            GinIndex(OpClass(Upper(Cast('value', models.TextField())), name='gin_trgm_ops'), name='ioc_value_trgm_idx'),
+            GinIndex(OpClass(Upper('description'), name='gin_trgm_ops'), name='ioc_description_trgm_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.lookup_key = ioc_lookup_key(self.type, self.value)
+        update_fields = kwargs.get('update_fields')
+        confidence_set = 'confidence_score' in (self.get_dirty_fields() if update_fields is None else update_fields)
+        if confidence_set:
+            # A score set by hand or by a feed restarts decay from that value
+            self.base_confidence = self.confidence_score
+            self.last_seen_at = timezone.now()
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {'type', 'value'} & update_fields:
+                update_fields.add('lookup_key')
+            if confidence_set:
+                update_fields.update(['base_confidence', 'last_seen_at'])
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+    def sighted(self):
+        """Record that the indicator was seen again: confidence back to its base and decay restarted."""
+        self.last_seen_at = timezone.now()
+        self.confidence_score = self.base_confidence
+        IOC.objects.filter(pk=self.pk).update(last_seen_at=self.last_seen_at, confidence_score=self.base_confidence)
+        self._snapshot_loaded_values(['last_seen_at', 'confidence_score'])
 
     def check_against_threat_intel(self):
-        # Placeholder for external API integration (e.g., VirusTotal)
-        return False
+        """Whether a fresh cached provider verdict flags this indicator as malicious.
+
+        Never calls a provider itself: without any fresh verdict, enrichment
+        is queued in the background and False is returned for now.
+        """
+        verdicts = list(IOCEnrichment.objects.filter(
+            lookup_key=self.lookup_key, expires_at__gt=timezone.now()
+        ).values_list('malicious', flat=True))
+        if not verdicts:
+            from .enrichment import enrich_in_background  # Lazy import to avoid circular import
+            transaction.on_commit(lambda: enrich_in_background([self.pk]))
+        return any(verdicts)
 
     def __str__(self):
         return f"{self.type}: {self.value}"
 
-class Playbook(models.Model):
+class ArchivedIOC(FieldTrackerMixin, models.Model):
+    """An expired IOC moved out of the hot IOC table, with the incidents it was linked to."""
+    original_id = models.BigIntegerField()
+    type = models.CharField(max_length=20, choices=IOCTypeChoices.choices)
+    value = models.CharField(max_length=255)
+    lookup_key = models.CharField(max_length=64, db_index=True)
+    description = models.TextField(blank=True, null=True)
+    source = models.CharField(max_length=20, choices=IOCSourceChoices.choices)
+    confidence_score = models.IntegerField()
+    base_confidence = models.IntegerField()
+    is_blocked = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    last_seen_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    incident_ids = ArrayField(models.BigIntegerField(), default=list, blank=True)
+
+    def restore(self):
+        """Move the indicator back to the hot table, relinked to its incidents that still exist."""
+        from incidents.models import Incident, IncidentIOC  # Lazy import to avoid circular import
+        with transaction.atomic():
+            ioc, _ = IOC.objects.get_or_create(lookup_key=self.lookup_key, defaults={
+                'type': self.type, 'value': self.value, 'description': self.description,
+                'source': self.source, 'confidence_score': self.base_confidence, 'is_blocked': self.is_blocked,
+            })
+            incident_ids = Incident.objects.filter(pk__in=self.incident_ids).values_list('pk', flat=True)
+            IncidentIOC.objects.bulk_create(
+                [IncidentIOC(incident_id=incident_id, ioc=ioc) for incident_id in incident_ids],
+                ignore_conflicts=True
+            )
+            self.delete()
+        return ioc
+
+    def __str__(self):
+        return f"{self.type}: {self.value} (archived)"
+
+class IOCEnrichment(FieldTrackerMixin, models.Model):
+    """Cached result of one provider's lookup of an indicator, shared by every IOC with the same lookup key."""
+    lookup_key = models.CharField(max_length=64)
+    provider = models.CharField(max_length=50)
+    malicious = models.BooleanField(default=False)
+    score = models.PositiveSmallIntegerField(null=True, blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    fetched_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ['lookup_key', 'provider']
+
+    def __str__(self):
+        return f"{self.provider} verdict for {self.lookup_key[:12]}"
+
+class BlocklistChange(FieldTrackerMixin, models.Model):
+    """An indicator entering or leaving the blocklist. Ids double as blocklist versions (in insert, not commit, order)."""
+    type = models.CharField(max_length=20, choices=IOCTypeChoices.choices)
+    value = models.CharField(max_length=255)
+    blocked = models.BooleanField()
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['type', 'id'])]
+
+    def __str__(self):
+        return f"{'Block' if self.blocked else 'Unblock'} {self.type}: {self.value}"
+
+class IOCFeedImport(FieldTrackerMixin, models.Model):
+    """Progress of one feed file import; lets an interrupted import resume where it stopped."""
+    path = models.CharField(max_length=500)
+    fingerprint = models.CharField(max_length=64, help_text="Hash of the file size and first block")
+    file_format = models.CharField(max_length=10, choices=FeedFormat.choices)
+    source = models.CharField(max_length=20, choices=IOCSourceChoices.choices, default=IOCSourceChoices.EXTERNAL)
+    status = models.CharField(max_length=20, choices=ImportStatus.choices, default=ImportStatus.RUNNING)
+    rows_read = models.PositiveBigIntegerField(default=0)
+    rows_upserted = models.PositiveBigIntegerField(default=0)
+    rows_rejected = models.PositiveBigIntegerField(default=0)
+    elapsed = models.DurationField(default=timezone.timedelta(0))
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['path', 'fingerprint', 'status'])]
+
+    @property
+    def rows_per_second(self):
+        seconds = self.elapsed.total_seconds()
+        return self.rows_read / seconds if seconds else 0.0
+
+    def run_in_background(self):
+        """Queue the import of the saved file, picked up by the job workers once the transaction commits."""
+        from incidents.jobs import enqueue  # Lazy import to avoid circular import
+        enqueue('threat_intelligence.import_feed', import_id=self.pk)
+
+    def __str__(self):
+        return f"Import of {self.path} ({self.status})"
+
+class Playbook(FieldTrackerMixin, models.Model):
     playbook_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
-    incident_type = models.CharField(max_length=100)
+    incident_type = models.CharField(max_length=100, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
-class PlaybookStep(models.Model):
+class PlaybookCatalogChange(models.Model):
+    """A playbook, step or step dependency edit. The latest id and the count are the catalog version (see ``catalog``)."""
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+class PlaybookStep(FieldTrackerMixin, models.Model):
     playbook = models.ForeignKey(Playbook, on_delete=models.CASCADE, related_name='steps')
     step_number = models.PositiveIntegerField()
     description = models.TextField()
     is_automated = models.BooleanField(default=False)
     automation_script = models.TextField(blank=True, null=True)
+    # Wall-clock limit for the automation script; PLAYBOOK_STEP_TIMEOUT when unset
+    timeout_seconds = models.PositiveIntegerField(null=True, blank=True)
+    # Steps that must complete before this one starts; steps without any start right away.
+    # A new step depends on the previous step_number, clear it to run the step in parallel.
+    depends_on = models.ManyToManyField('self', symmetrical=False, related_name='dependents', blank=True)
 
     class Meta:
         ordering = ['step_number']
@@ -48,7 +224,56 @@ class PlaybookStep(models.Model):
     def __str__(self):
         return f"{self.playbook.name} - Step {self.step_number}"
 
-class PlaybookExecution(models.Model):
+# Allowed status changes of playbook and step executions: {target status: statuses it can be reached from}.
+# Steps are never paused.
+PLAYBOOK_TRANSITIONS = {
+    PlaybookStatus.IN_PROGRESS: {PlaybookStatus.NOT_STARTED, PlaybookStatus.PAUSED},
+    PlaybookStatus.PAUSED: {PlaybookStatus.IN_PROGRESS},
+    PlaybookStatus.COMPLETED: {PlaybookStatus.IN_PROGRESS},
+    PlaybookStatus.FAILED: {PlaybookStatus.NOT_STARTED, PlaybookStatus.IN_PROGRESS, PlaybookStatus.PAUSED},
+}
+ACTIVE_PLAYBOOK_STATUSES = [PlaybookStatus.IN_PROGRESS, PlaybookStatus.PAUSED]
+
+class PlaybookTransitionMixin:
+    def transition(self, status, sources=None, **changes):
+        """Move to ``status`` with a single UPDATE ... WHERE status IN (allowed sources).
+
+        ``sources`` narrows the statuses allowed by PLAYBOOK_TRANSITIONS.
+        ``changes`` are written in the same UPDATE; expressions among them
+        are evaluated by the database and read back. Returns False, leaving
+        the instance untouched, when the row's current status does not allow
+        the change, e.g. a concurrent pause already won.
+        """
+        allowed = PLAYBOOK_TRANSITIONS.get(status, set())
+        if sources is not None:
+            allowed = allowed & set(sources)
+        if not allowed:
+            raise ValueError(f"No transition to {status} from {sources}")
+        updated = type(self).objects.filter(pk=self.pk, status__in=allowed).update(status=status, **changes)
+        if not updated:
+            return False
+        computed = [field for field, value in changes.items() if hasattr(value, 'resolve_expression')]
+        for field, value in changes.items():
+            if field not in computed:
+                setattr(self, field, value)
+        self.status = status
+        if computed:
+            self.refresh_from_db(fields=computed)
+        return True
+
+class PlaybookExecutionQuerySet(models.QuerySet):
+    def with_execution_time(self):
+        """Annotate ``execution_time``, the database-side equivalent of ``get_execution_time()``."""
+        return self.annotate(execution_time=Case(
+            When(start_time__isnull=True, then=Value(timezone.timedelta(0))),
+            default=Greatest(
+                Coalesce('completion_time', Now()) - F('start_time') - F('total_paused_time'),
+                Value(timezone.timedelta(0)),
+            ),
+            output_field=models.DurationField(),
+        ))
+
+class PlaybookExecution(PlaybookTransitionMixin, FieldTrackerMixin, models.Model):
     playbook = models.ForeignKey(Playbook, on_delete=models.CASCADE, related_name='executions')
     incident = models.ForeignKey('incidents.Incident', on_delete=models.CASCADE, related_name='playbook_executions')  
     ticket = models.ForeignKey('incidents.Ticket', on_delete=models.CASCADE, related_name='playbook_executions')  
@@ -58,34 +283,54 @@ class PlaybookExecution(models.Model):
     pause_time = models.DateTimeField(null=True, blank=True)
     total_paused_time = models.DurationField(default=timezone.timedelta(0))
     completion_time = models.DateTimeField(null=True, blank=True)
+    # Longest chain of dependent step durations, set on completion
+    critical_path_duration = models.DurationField(null=True, blank=True)
     notes = models.TextField(blank=True)
 
+    objects = PlaybookExecutionQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Starting a playbook that is already running for the incident fails on insert
+            models.UniqueConstraint(
+                fields=['incident', 'playbook'], condition=Q(status__in=ACTIVE_PLAYBOOK_STATUSES),
+                name='one_active_execution_per_playbook',
+            ),
+        ]
+        indexes = [models.Index(fields=['completion_time'], name='playbook_exec_completed_idx')]
+
     def execute(self):
-        if self.status == PlaybookStatus.NOT_STARTED:
-            self.start_time = timezone.now()
-        elif self.status == PlaybookStatus.PAUSED:
-            pass
-        self.status = PlaybookStatus.IN_PROGRESS
-        self.save()
+        if self.transition(PlaybookStatus.IN_PROGRESS, sources=[PlaybookStatus.NOT_STARTED], start_time=timezone.now()):
+            self.run_in_background()
+            return True
+        return self.resume()
+
+    def run_in_background(self):
+        """Queue a run of the playbook engine, picked up by the job workers once the transaction commits."""
+        from incidents.jobs import enqueue  # Lazy import to avoid circular import
+        enqueue('threat_intelligence.run_playbook', execution_id=self.pk)
 
     def pause(self):
-        if self.status == PlaybookStatus.IN_PROGRESS:
-            self.status = PlaybookStatus.PAUSED
-            self.pause_time = timezone.now()
-            self.save()
+        return self.transition(PlaybookStatus.PAUSED, pause_time=timezone.now())
 
     def resume(self):
-        if self.status == PlaybookStatus.PAUSED and self.pause_time:
-            paused_duration = timezone.now() - self.pause_time
-            self.total_paused_time += paused_duration
-            self.status = PlaybookStatus.IN_PROGRESS
-            self.pause_time = None
-            self.save()
-
-    def complete(self):
-        self.status = PlaybookStatus.COMPLETED
-        self.completion_time = timezone.now()
-        self.save()
+        resumed = self.transition(
+            PlaybookStatus.IN_PROGRESS, sources=[PlaybookStatus.PAUSED],
+            total_paused_time=ExpressionWrapper(
+                F('total_paused_time') + (Value(timezone.now()) - Coalesce('pause_time', Value(timezone.now()))),
+                output_field=models.DurationField(),
+            ),
+            pause_time=None,
+        )
+        if resumed:
+            self.run_in_background()
+        return resumed
+
+    def complete(self, **changes):
+        return self.transition(PlaybookStatus.COMPLETED, completion_time=timezone.now(), **changes)
+
+    def fail(self, **changes):
+        return self.transition(PlaybookStatus.FAILED, completion_time=timezone.now(), **changes)
 
     def get_execution_time(self):
         if not self.start_time:
@@ -97,7 +342,7 @@ class PlaybookExecution(models.Model):
     def __str__(self):
         return f"Execution of {self.playbook.name} for Incident {self.incident.id}"
 
-class PlaybookStepExecution(models.Model):
+class PlaybookStepExecution(PlaybookTransitionMixin, FieldTrackerMixin, models.Model):
     playbook_execution = models.ForeignKey(PlaybookExecution, on_delete=models.CASCADE, related_name='step_executions')
     step = models.ForeignKey(PlaybookStep, on_delete=models.CASCADE, related_name='executions')
     status = models.CharField(max_length=20, choices=PlaybookStatus.choices, default=PlaybookStatus.NOT_STARTED)
@@ -107,20 +352,136 @@ class PlaybookStepExecution(models.Model):
 
     class Meta:
         ordering = ['step__step_number']
+        indexes = [models.Index(fields=['completion_time'], name='playbook_step_completed_idx')]
 
     def execute(self):
-        self.status = PlaybookStatus.IN_PROGRESS
-        self.start_time = timezone.now()
-        self.save()
-        if self.step.is_automated:
-            # Implement automation logic here
-            pass
-
-    def complete(self, result=''):
-        self.status = PlaybookStatus.COMPLETED
-        self.completion_time = timezone.now()
-        self.result = result
-        self.save()
+        """Claim the step for running; False when another runner already started it."""
+        return self.transition(PlaybookStatus.IN_PROGRESS, sources=[PlaybookStatus.NOT_STARTED], start_time=timezone.now())
+
+    def complete(self, result='', advance=True):
+        """Record the step's result; with ``advance`` queue an engine run for the steps waiting on it.
+
+        The engine passes ``advance=False`` for the steps it ran itself, as it
+        starts their dependents directly.
+        """
+        completed = self.transition(PlaybookStatus.COMPLETED, completion_time=timezone.now(), result=result)
+        if completed and advance:
+            from incidents.jobs import enqueue  # Lazy import to avoid circular import
+            enqueue('threat_intelligence.run_playbook', execution_id=self.playbook_execution_id)
+        return completed
+
+    def fail(self, result=''):
+        return self.transition(PlaybookStatus.FAILED, completion_time=timezone.now(), result=result)
 
     def __str__(self):
-        return f"Step {self.step.step_number} of {self.playbook_execution}"
\ No newline at end of file
+        return f"Step {self.step.step_number} of {self.playbook_execution}"
+
+class PlaybookTimingRollup(models.Model):
+    """Timing statistics of the playbook (``step`` is null) or step executions finished in one time window.
+
+    Materialized by ``analytics.rebuild_timing_rollups`` (``manage.py
+    rebuild_playbook_timings``). Durations are active time in seconds: an
+    execution's excludes its pauses, summed in ``paused_seconds``. Totals,
+    means, percentiles and pause time cover completed executions only;
+    failed ones count towards ``executions`` and ``failed``.
+    """
+    window = models.CharField(max_length=5, choices=TimingWindow.choices)
+    bucket = models.DateField()
+    playbook = models.ForeignKey(Playbook, on_delete=models.CASCADE, related_name='timing_rollups')
+    step = models.ForeignKey(PlaybookStep, on_delete=models.CASCADE, null=True, blank=True, related_name='timing_rollups')
+    executions = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    mean_seconds = models.FloatField(null=True)
+    p50_seconds = models.FloatField(null=True)
+    p90_seconds = models.FloatField(null=True)
+    p99_seconds = models.FloatField(null=True)
+    paused_seconds = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['window', 'bucket'], name='playbook_timing_window_idx')]
+
+    def __str__(self):
+        return f"{self.window} timings of {self.playbook_id}/{self.step_id or '*'} from {self.bucket}"
+
+class _ScheduleExport:
+    """on_commit callback exporting one IOC type's blocklist, registered once per transaction."""
+
+    def __init__(self, ioc_type):
+        self.ioc_type = ioc_type
+
+    def __call__(self):
+        from .blocklists import schedule_export  # Lazy import, the exporter depends on these models
+        schedule_export(self.ioc_type)
+
+def _blocklist_changed(ioc_types):
+    connection = transaction.get_connection()
+    # Callbacks of rolled back savepoints are dropped from run_on_commit, so a type is registered again then
+    registered = {
+        callback.ioc_type for _, callback, *_ in connection.run_on_commit if isinstance(callback, _ScheduleExport)
+    }
+    for ioc_type in set(ioc_types) - registered:
+        transaction.on_commit(_ScheduleExport(ioc_type))
+
+@receiver(post_save, sender=IOC)
+def record_blocklist_change(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'is_blocked', 'type', 'value'} & set(update_fields):
+        return
+    was_blocked = not created and instance.get_loaded_value('is_blocked', False)
+    old = (instance.get_loaded_value('type'), instance.get_loaded_value('value'))
+    new = (instance.type, instance.value)
+    changes = []
+    if was_blocked and (not instance.is_blocked or old != new):
+        changes.append(BlocklistChange(type=old[0], value=old[1], blocked=False))
+    if instance.is_blocked and (not was_blocked or old != new):
+        changes.append(BlocklistChange(type=new[0], value=new[1], blocked=True))
+    if changes:
+        BlocklistChange.objects.bulk_create(changes)
+        _blocklist_changed(change.type for change in changes)
+
+@receiver(post_delete, sender=IOC)
+def record_blocklist_removal(sender, instance, **kwargs):
+    if instance.is_blocked:
+        BlocklistChange.objects.create(type=instance.type, value=instance.value, blocked=False)
+        _blocklist_changed([instance.type])
+
+@receiver(m2m_changed, sender=PlaybookStep.depends_on.through)
+def check_step_dependencies(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'pre_add' or not pk_set:
+        return
+    from .playbook_engine import step_dependencies, topological_order  # Lazy import, the engine depends on these models
+    others = PlaybookStep.objects.filter(pk__in=pk_set)
+    if others.exclude(playbook_id=instance.playbook_id).exists():
+        raise ValidationError("Playbook steps can only depend on steps of the same playbook")
+    dependencies = step_dependencies(instance.playbook_id)
+    for other in pk_set:
+        step, depends_on = (other, instance.pk) if reverse else (instance.pk, other)
+        dependencies[step].add(depends_on)
+    try:
+        topological_order(dependencies)
+    except ValueError as error:
+        raise ValidationError(str(error)) from error
+
+@receiver(post_save, sender=PlaybookStep)
+def depend_on_previous_step(sender, instance, created, raw=False, **kwargs):
+    # Steps run in step_number order unless their dependencies are changed
+    if not created or raw:
+        return
+    previous = PlaybookStep.objects.filter(
+        playbook_id=instance.playbook_id, step_number__lt=instance.step_number
+    ).order_by('-step_number', '-id').first()
+    if previous is not None:
+        instance.depends_on.add(previous)
+
+@receiver(post_save, sender=Playbook)
+@receiver(post_delete, sender=Playbook)
+@receiver(post_save, sender=PlaybookStep)
+@receiver(post_delete, sender=PlaybookStep)
+def bump_playbook_catalog_version(sender, **kwargs):
+    from .catalog import catalog_changed  # Lazy import, the catalog depends on these models
+    catalog_changed()
+
+@receiver(m2m_changed, sender=PlaybookStep.depends_on.through)
+def bump_playbook_catalog_version_on_dependencies(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_playbook_catalog_version(sender)
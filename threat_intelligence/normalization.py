@@ -0,0 +1,120 @@
+"""Canonical form of indicators, and the lookup key IOCs are stored and found by.
+
+Two spellings of the same indicator (``Example.COM``/``example.com.``,
+``hxxp://evil[.]example``/``http://evil.example/``, upper/lower case hashes)
+canonicalise to the same value, and ``ioc_lookup_key`` hashes the type and
+canonical value into the fixed-length ``IOC.lookup_key`` that is uniquely
+indexed.
+"""
+import hashlib
+import ipaddress
+from urllib.parse import urlsplit, urlunsplit
+from common.enums import IOCTypeChoices
+
+IOC_VALUE_MAX_LENGTH = 255
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# Defanged notations analysts and feeds use to keep indicators unclickable
+DEFANGED = (('[.]', '.'), ('(.)', '.'), ('[dot]', '.'), ('[:]', ':'), ('[@]', '@'), ('[at]', '@'))
+
+# Indicator type names used by common feeds (MISP, STIX, vendor CSVs) mapped to IOCTypeChoices
+TYPE_ALIASES = {
+    'ip': IOCTypeChoices.IP, 'ipv4': IOCTypeChoices.IP, 'ipv6': IOCTypeChoices.IP,
+    'ipv4-addr': IOCTypeChoices.IP, 'ipv6-addr': IOCTypeChoices.IP,
+    'ip-src': IOCTypeChoices.IP, 'ip-dst': IOCTypeChoices.IP,
+    'domain': IOCTypeChoices.DOMAIN, 'domain-name': IOCTypeChoices.DOMAIN, 'hostname': IOCTypeChoices.DOMAIN,
+    'url': IOCTypeChoices.URL, 'uri': IOCTypeChoices.URL,
+    'hash': IOCTypeChoices.HASH, 'file': IOCTypeChoices.HASH,
+    'md5': IOCTypeChoices.HASH, 'sha1': IOCTypeChoices.HASH, 'sha256': IOCTypeChoices.HASH,
+    'sha-1': IOCTypeChoices.HASH, 'sha-256': IOCTypeChoices.HASH,
+    'email': IOCTypeChoices.EMAIL, 'email-addr': IOCTypeChoices.EMAIL,
+    'email-src': IOCTypeChoices.EMAIL, 'email-dst': IOCTypeChoices.EMAIL,
+    'subject': IOCTypeChoices.SUBJECT, 'email-subject': IOCTypeChoices.SUBJECT,
+    'other': IOCTypeChoices.OTHER,
+}
+
+
+def normalize_ioc_type(ioc_type):
+    return TYPE_ALIASES.get((ioc_type or '').strip().lower())
+
+
+def refang(value):
+    for defanged, plain in DEFANGED:
+        value = value.replace(defanged, plain)
+    return value
+
+
+def normalize_domain(value):
+    """Lower-case ASCII (IDNA) form without the trailing dot; '' if empty."""
+    domain = refang(value.strip()).lower().rstrip('.')
+    try:
+        return domain.encode('idna').decode('ascii') if domain else ''
+    except UnicodeError:
+        return domain
+
+
+def normalize_ip(value):
+    """Compressed address, or network in CIDR notation; None if not an IP."""
+    try:
+        network = ipaddress.ip_network(refang(value.strip()), strict=False)
+    except ValueError:
+        return None
+    return str(network.network_address) if network.num_addresses == 1 else str(network)
+
+
+def normalize_url(value):
+    """Lower-cased scheme and IDNA host, no default port, credentials or fragment; '' if unparsable."""
+    value = refang(value.strip())
+    if value.lower().startswith('hxxp'):
+        value = 'http' + value[4:]
+    if '://' not in value:
+        value = 'http://' + value
+    try:
+        parts = urlsplit(value)
+        host = normalize_domain(parts.hostname or '')
+        port = parts.port
+    except ValueError:
+        return ''
+    if not host:
+        return ''
+    scheme = parts.scheme.lower()
+    netloc = host if port is None or port == DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def normalize_email(value):
+    local, _, domain = refang(value.strip()).rpartition('@')
+    return f"{local.lower()}@{normalize_domain(domain)}" if local else value.strip().lower()
+
+
+def canonical_value(ioc_type, value):
+    """Canonical form of ``value`` for an IOCTypeChoices type, or None if it is not a valid indicator."""
+    value = (value or '').strip()
+    if ioc_type == IOCTypeChoices.IP:
+        return normalize_ip(value)
+    if ioc_type == IOCTypeChoices.DOMAIN:
+        return normalize_domain(value) or None
+    if ioc_type == IOCTypeChoices.URL:
+        return normalize_url(value) or None
+    if ioc_type == IOCTypeChoices.EMAIL:
+        return normalize_email(value) or None
+    if ioc_type == IOCTypeChoices.HASH:
+        return value.lower() or None
+    return value or None
+
+
+def normalize_ioc(ioc_type, value):
+    """Return the (type, value) pair an indicator is stored under, or None if it is unusable."""
+    ioc_type = normalize_ioc_type(ioc_type)
+    if not ioc_type:
+        return None
+    value = canonical_value(ioc_type, value)
+    if not value or len(value) > IOC_VALUE_MAX_LENGTH:
+        return None
+    return ioc_type, value
+
+
+def ioc_lookup_key(ioc_type, value):
+    """SHA-256 hex digest of the type and canonical value; invalid values are keyed as typed."""
+    ioc_type = normalize_ioc_type(ioc_type) or (ioc_type or '')
+    value = canonical_value(ioc_type, value) or (value or '').strip()
+    return hashlib.sha256(f"{ioc_type}\0{value}".encode()).hexdigest()
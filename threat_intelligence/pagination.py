@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IOCCursorPagination(CursorPagination):
+    """Keyset pagination over (created_at, id), newest first.
+
+    Pages are read backwards along the ``ioc_created_id_idx`` index, so deep
+    pages through a large feed cost the same as the first one.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
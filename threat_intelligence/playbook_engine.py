@@ -0,0 +1,265 @@
+"""Runs playbook executions off the request thread.
+
+Starting or resuming an execution, or completing a manual step, queues a
+``threat_intelligence.run_playbook`` job (see ``incidents.jobs``) that calls
+``run_execution`` on a job worker.
+
+An automated step's ``automation_script`` is Python source, run in a child
+interpreter (isolated mode) with the step's context available as the
+``context`` global, and at most ``PLAYBOOK_MAX_WORKERS`` scripts run at
+once per worker process. Before running the script the child sets its own
+CPU-time and address-space limits with ``resource.setrlimit``; the parent
+kills the child's process group once the step's wall-clock timeout
+(``PlaybookStep.timeout_seconds`` or ``PLAYBOOK_STEP_TIMEOUT``) passes.
+Combined stdout/stderr becomes the step's ``result``.
+
+Steps form a DAG through ``PlaybookStep.depends_on``: every step whose
+dependencies have completed is started, so independent branches run in
+parallel and a dependent starts as soon as its last input finishes. A manual
+step waits for an analyst to complete it, pausing stops new steps from
+starting, and a failed or timed-out script fails the step and the
+execution. Steps are claimed with a conditional UPDATE, so two runners never
+run the same script, and only once a script slot is free, so a step's
+``start_time`` is when its script started. An automated step still in
+progress ``PLAYBOOK_ABANDONED_STEP_GRACE`` past its timeout lost its runner
+(the script is killed at the timeout): the next run puts it back to not
+started and runs it again. A completed execution records its critical-path
+duration, the longest chain of dependent step durations. Step definitions
+come from the cached ``catalog``, not from the database; an execution whose
+step executions no longer match its playbook's steps is failed.
+"""
+import json
+import math
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.utils import timezone
+from common.enums import PlaybookStatus
+from .catalog import get_catalog, get_playbook
+from .models import PlaybookExecution, PlaybookStep
+
+PLAYBOOK_MAX_WORKERS = getattr(settings, 'PLAYBOOK_MAX_WORKERS', 4)
+PLAYBOOK_STEP_TIMEOUT = getattr(settings, 'PLAYBOOK_STEP_TIMEOUT', 60)
+PLAYBOOK_STEP_MEMORY_LIMIT = getattr(settings, 'PLAYBOOK_STEP_MEMORY_LIMIT', 256 * 1024 * 1024)
+PLAYBOOK_RESULT_MAX_CHARS = getattr(settings, 'PLAYBOOK_RESULT_MAX_CHARS', 64 * 1024)
+PLAYBOOK_ABANDONED_STEP_GRACE = getattr(settings, 'PLAYBOOK_ABANDONED_STEP_GRACE', timezone.timedelta(seconds=60))
+
+# Bounds the scripts running at once across every execution of this process
+_script_slots = threading.BoundedSemaphore(PLAYBOOK_MAX_WORKERS)
+
+# Runs in the child: apply the limits, then run the script with its context.
+_BOOTSTRAP = """
+import json, resource, sys
+cpu_seconds, memory_limit = int(sys.argv[1]), int(sys.argv[2])
+resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+if memory_limit:
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+payload = json.load(sys.stdin)
+exec(compile(payload['script'], '<automation_script>', 'exec'), {'__name__': '__main__', 'context': payload['context']})
+"""
+
+StepOutcome = namedtuple('StepOutcome', ['ok', 'output', 'duration'])
+
+
+def _truncate(output):
+    if len(output) <= PLAYBOOK_RESULT_MAX_CHARS:
+        return output
+    return output[:PLAYBOOK_RESULT_MAX_CHARS] + "\n[output truncated]"
+
+
+def run_script(script, context, timeout=None, memory_limit=None):
+    """Run ``script`` in a resource-limited child interpreter; returns a ``StepOutcome``."""
+    timeout = timeout or PLAYBOOK_STEP_TIMEOUT
+    memory_limit = PLAYBOOK_STEP_MEMORY_LIMIT if memory_limit is None else memory_limit
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-I', '-c', _BOOTSTRAP, str(math.ceil(timeout)), str(memory_limit)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        text=True, start_new_session=True,
+    )
+    try:
+        output, _ = process.communicate(json.dumps({'script': script, 'context': context}), timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        output, _ = process.communicate()
+        return StepOutcome(False, _truncate(f"{output}\nTimed out after {timeout}s"), time.perf_counter() - started)
+    duration = time.perf_counter() - started
+    if process.returncode != 0:
+        return StepOutcome(False, _truncate(f"{output}\nExited with status {process.returncode}"), duration)
+    return StepOutcome(True, _truncate(output), duration)
+
+
+def step_context(execution, iocs):
+    return {
+        'execution': execution.pk,
+        'incident': execution.incident_id,
+        'ticket': execution.ticket_id,
+        'playbook': execution.playbook_id,
+        'iocs': iocs,
+    }
+
+
+def step_dependencies(playbook_id):
+    """``{step id: set of step ids it depends on}`` for every step of a playbook."""
+    dependencies = {
+        step_id: set() for step_id in PlaybookStep.objects.filter(
+            playbook_id=playbook_id
+        ).order_by('step_number').values_list('id', flat=True)
+    }
+    for step_id, depends_on_id in PlaybookStep.depends_on.through.objects.filter(
+        from_playbookstep__playbook_id=playbook_id
+    ).values_list('from_playbookstep_id', 'to_playbookstep_id'):
+        dependencies[step_id].add(depends_on_id)
+    return dependencies
+
+
+def topological_order(dependencies):
+    """Step ids with every step after its dependencies, otherwise in ``dependencies`` order.
+
+    Raises ValueError on a cycle.
+    """
+    remaining = {step_id: set(depends_on) for step_id, depends_on in dependencies.items()}
+    order = []
+    ready = [step_id for step_id, depends_on in remaining.items() if not depends_on]
+    while ready:
+        step_id = ready.pop(0)
+        order.append(step_id)
+        del remaining[step_id]
+        for other, depends_on in remaining.items():
+            if step_id in depends_on:
+                depends_on.discard(step_id)
+                if not depends_on:
+                    ready.append(other)
+    if remaining:
+        raise ValueError(f"Playbook steps {sorted(remaining)} have circular dependencies")
+    return order
+
+
+def critical_path_duration(step_executions, dependencies):
+    """Longest chain of dependent step durations, i.e. the execution time with unlimited parallelism."""
+    by_step = {step_execution.step_id: step_execution for step_execution in step_executions}
+    finished = {}
+    for step_id in topological_order(dependencies):
+        step_execution = by_step.get(step_id)
+        duration = timezone.timedelta(0)
+        if step_execution and step_execution.start_time and step_execution.completion_time:
+            duration = step_execution.completion_time - step_execution.start_time
+        finished[step_id] = duration + max((finished[other] for other in dependencies[step_id]), default=timezone.timedelta(0))
+    return max(finished.values(), default=timezone.timedelta(0))
+
+
+def _run_step(runner, step, context):
+    # The slot was taken by run_execution before claiming the step
+    try:
+        return runner(step.automation_script or '', {**context, 'step': step.step_number}, timeout=step.timeout_seconds)
+    finally:
+        _script_slots.release()
+
+
+def release_abandoned_steps(execution, steps, now=None):
+    """Put automated steps whose runner died mid-script back to not started; returns how many."""
+    now = now or timezone.now()
+    released = 0
+    for step_id in execution.step_executions.filter(status=PlaybookStatus.IN_PROGRESS).values_list('step_id', flat=True):
+        step = steps.get(step_id)
+        if step is None or not step.is_automated:
+            continue  # Manual steps stay in progress until an analyst completes them
+        timeout = timezone.timedelta(seconds=step.timeout_seconds or PLAYBOOK_STEP_TIMEOUT)
+        released += execution.step_executions.filter(
+            step_id=step_id, status=PlaybookStatus.IN_PROGRESS, start_time__lt=now - timeout - PLAYBOOK_ABANDONED_STEP_GRACE,
+        ).update(status=PlaybookStatus.NOT_STARTED, start_time=None)
+    return released
+
+
+def run_execution(execution_id, runner=run_script):
+    """Run every step whose dependencies are complete, branches in parallel; returns the execution's status.
+
+    Dependents are started as soon as their last dependency finishes. Runs
+    stop at steps waiting for an analyst, after a pause, or at the first
+    failure (running branches are let finish).
+    """
+    execution = PlaybookExecution.objects.get(pk=execution_id)
+    if execution.status != PlaybookStatus.IN_PROGRESS:
+        return execution.status
+    step_executions = {
+        step_execution.step_id: step_execution for step_execution in execution.step_executions.order_by()
+    }
+    playbook = get_playbook(execution.playbook_id)
+    if playbook is None or {step.id for step in playbook.steps} != set(step_executions):
+        # Possibly edited since this process last checked: look at the version once more
+        playbook = get_catalog(max_age=0).by_id.get(execution.playbook_id)
+    if playbook is None or {step.id for step in playbook.steps} != set(step_executions):
+        execution.fail(notes=f"{execution.notes}\nThe playbook's steps changed since this execution started".strip())
+        return execution.status
+    steps = {step.id: step for step in playbook.steps}
+    dependencies = {step_id: set(step.depends_on) for step_id, step in steps.items()}
+    try:
+        order = topological_order(dependencies)
+    except ValueError as error:
+        execution.fail(notes=f"{execution.notes}\n{error}".strip())
+        return execution.status
+    if release_abandoned_steps(execution, steps):
+        step_executions = {
+            step_execution.step_id: step_execution for step_execution in execution.step_executions.order_by()
+        }
+    context = None
+    running = {}
+    failed = stopped = False
+    with ThreadPoolExecutor(max_workers=PLAYBOOK_MAX_WORKERS, thread_name_prefix='playbook-step') as branches:
+        while True:
+            # Other runners and analysts move steps along too, so statuses are re-read every round
+            statuses = dict(execution.step_executions.values_list('step_id', 'status'))
+            if PlaybookStatus.FAILED in statuses.values():
+                failed = True
+            if not failed and not stopped:
+                for step_id in order:
+                    step_execution = step_executions.get(step_id)
+                    if step_execution is None or statuses.get(step_id) != PlaybookStatus.NOT_STARTED:
+                        continue
+                    if any(statuses.get(other) != PlaybookStatus.COMPLETED for other in dependencies[step_id]):
+                        continue
+                    automated = steps[step_id].is_automated
+                    if automated:
+                        _script_slots.acquire()
+                    # Manual steps are claimed and left to the analyst; lost claims belong to another runner
+                    if not step_execution.execute():
+                        if automated:
+                            _script_slots.release()
+                        continue
+                    if not automated:
+                        continue
+                    if context is None:
+                        iocs = [
+                            {'type': ioc_type, 'value': value}
+                            for ioc_type, value in execution.incident.iocs.values_list('type', 'value')
+                        ]
+                        context = step_context(execution, iocs)
+                    running[branches.submit(_run_step, runner, steps[step_id], context)] = step_execution
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step_execution = running.pop(future)
+                outcome = future.result()
+                if outcome.ok:
+                    step_execution.complete(outcome.output, advance=False)
+                else:
+                    step_execution.fail(outcome.output)
+                    failed = True
+            execution.refresh_from_db(fields=['status'])
+            stopped = execution.status != PlaybookStatus.IN_PROGRESS
+
+    if failed:
+        execution.fail()
+    elif not stopped and all(
+        status == PlaybookStatus.COMPLETED for status in execution.step_executions.values_list('status', flat=True)
+    ):
+        execution.complete(critical_path_duration=critical_path_duration(execution.step_executions.all(), dependencies))
+    return execution.status
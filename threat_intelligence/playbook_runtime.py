@@ -0,0 +1,53 @@
+"""Starting playbook executions.
+
+``start_playbook`` creates an execution that is already in progress,
+together with all of its step executions, in the same few queries whatever
+the playbook's size: the execution INSERT, one bulk INSERT of the step
+executions (the steps come from the ``catalog``, checked against the current
+version) and the engine job.
+A partial unique constraint allows a single active (in progress or paused)
+execution per incident and playbook, so a concurrent second start fails on
+insert instead of racing an ``exists()`` check.
+
+Every later status change goes through ``PlaybookTransitionMixin.transition``,
+which checks ``PLAYBOOK_TRANSITIONS`` in the UPDATE itself.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from common.enums import PlaybookStatus
+from .catalog import get_catalog
+from .models import PlaybookExecution, PlaybookStepExecution
+
+ACTIVE_EXECUTION_CONSTRAINT = 'one_active_execution_per_playbook'
+
+
+class PlaybookAlreadyRunning(ValueError):
+    pass
+
+
+def start_playbook(incident, playbook, ticket, analysis):
+    """Create an in-progress execution of ``playbook`` with all its steps and queue its first engine run.
+
+    Raises PlaybookAlreadyRunning when the playbook is in progress or paused for the incident.
+    """
+    if ticket.incident_id != incident.pk:
+        raise ValueError("Ticket does not belong to this incident")
+    try:
+        with transaction.atomic():
+            execution = PlaybookExecution.objects.create(
+                playbook=playbook, incident=incident, ticket=ticket, analysis=analysis,
+                status=PlaybookStatus.IN_PROGRESS, start_time=timezone.now(),
+            )
+            # A step deleted within the check interval would fail the insert at commit
+            catalog_entry = get_catalog(max_age=0).by_id.get(playbook.pk)
+            PlaybookStepExecution.objects.bulk_create(
+                PlaybookStepExecution(playbook_execution=execution, step_id=step.id)
+                for step in (catalog_entry.steps if catalog_entry else ())
+            )
+            execution.run_in_background()
+    except IntegrityError as error:
+        diagnostics = getattr(error.__cause__, 'diag', None)
+        if getattr(diagnostics, 'constraint_name', None) == ACTIVE_EXECUTION_CONSTRAINT:
+            raise PlaybookAlreadyRunning(f"{playbook} is already running for incident {incident.pk}") from error
+        raise
+    return execution
@@ -0,0 +1,11 @@
+from rest_framework import serializers
+from .models import IOC
+
+
+class IOCSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = IOC
+        fields = [
+            'id', 'type', 'value', 'description', 'source', 'confidence_score', 'is_blocked',
+            'created_at', 'updated_at',
+        ]
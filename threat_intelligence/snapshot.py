@@ -0,0 +1,280 @@
+"""Memory-mapped IOC snapshot shared by every worker process.
+
+``build_snapshot()`` writes the IOC table to a single file; workers open it
+with ``mmap`` so the pages are shared through the OS page cache instead of
+each process holding its own copy of the index. Layout (little endian):
+
+    header   magic, version, built_at, record count, Bloom hash count,
+             metadata length, Bloom filter length, records offset
+    metadata JSON: IP prefix lengths present, per address family
+    records  ``count`` fixed-width entries sorted by key:
+             16-byte BLAKE2b digest of ``type\\0normalised key`` + int64 IOC id
+    bloom    Bloom filter over the record digests
+
+A lookup tests the Bloom filter first, so most misses never touch the
+records, and binary searches the records otherwise. IPs are stored as
+their network (``10.0.0.0/8``) and probed once per prefix length present,
+domains are probed for every parent domain and URLs for every path prefix,
+which gives the same answers as ``IOCMatcher`` for every type.
+
+A new snapshot is written next to the current one and moved over it with
+``os.replace``; processes holding the old file keep reading it until
+``current_snapshot()`` notices the swap.
+"""
+import hashlib
+import heapq
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from common.enums import IOCTypeChoices
+from .matching import REFRESH_OVERLAP, _url_prefixes
+from .models import IOC
+from .normalization import normalize_ioc, normalize_url
+
+IOC_SNAPSHOT_PATH = getattr(settings, 'IOC_SNAPSHOT_PATH', settings.BASE_DIR / 'ioc_snapshot.bin')
+# How often current_snapshot() checks whether the file was swapped
+SNAPSHOT_CHECK_INTERVAL = 5
+
+MAGIC = b'IOCSNAP1'
+HEADER = struct.Struct('<8sQqQIIQQ')
+DIGEST_SIZE = 16
+RECORD = struct.Struct(f'<{DIGEST_SIZE}sq')
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+
+
+def _digest(ioc_type, key):
+    return hashlib.blake2b(f"{ioc_type}\0{key}".encode(), digest_size=DIGEST_SIZE).digest()
+
+
+def _bloom_positions(digest, bits):
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(BLOOM_HASHES)]
+
+
+def snapshot_key(ioc_type, value):
+    """Stored key of an IOC, or None when the value cannot be indexed."""
+    if ioc_type == IOCTypeChoices.IP:
+        try:
+            return str(ipaddress.ip_network(value.strip(), strict=False))
+        except ValueError:
+            return None
+    if ioc_type == IOCTypeChoices.URL:
+        return normalize_url(value) or None
+    normalized = normalize_ioc(ioc_type, value)
+    return normalized[1] if normalized else None
+
+
+class IOCSnapshot:
+    """Read-only view of a snapshot file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, 'rb') as handle:
+            self.stat = os.fstat(handle.fileno())
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, built_at, self.count, hashes, meta_length, bloom_length, self._records_at = \
+            HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or hashes != BLOOM_HASHES:
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not an IOC snapshot")
+        self.built_at = datetime.fromtimestamp(built_at / 1e6, tz=dt_timezone.utc)
+        meta = json.loads(self._mmap[HEADER.size:HEADER.size + meta_length])
+        self.prefix_lengths = {int(version): lengths for version, lengths in meta['prefix_lengths'].items()}
+        self._bloom_at = self._records_at + self.count * RECORD.size
+        self._bloom_bits = bloom_length * 8
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mmap.close()
+
+    def records(self):
+        """Every ``(digest, ioc_id)`` in key order."""
+        for offset in range(self._records_at, self._bloom_at, RECORD.size):
+            yield RECORD.unpack_from(self._mmap, offset)
+
+    def _might_contain(self, digest):
+        buffer, start = self._mmap, self._bloom_at
+        return all(buffer[start + (bit >> 3)] & (1 << (bit & 7)) for bit in _bloom_positions(digest, self._bloom_bits))
+
+    def lookup(self, ioc_type, key):
+        """Ids of the IOCs stored under exactly ``key``."""
+        digest = _digest(ioc_type, key)
+        if not self._might_contain(digest):
+            return set()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = self._records_at + middle * RECORD.size
+            if self._mmap[offset:offset + DIGEST_SIZE] < digest:
+                low = middle + 1
+            else:
+                high = middle
+        ids = set()
+        for offset in range(self._records_at + low * RECORD.size, self._bloom_at, RECORD.size):
+            found, ioc_id = RECORD.unpack_from(self._mmap, offset)
+            if found != digest:
+                break
+            ids.add(ioc_id)
+        return ids
+
+    def match_one(self, ioc_type, value):
+        """IOC ids matching a single observable, with the same semantics as ``IOCMatcher.match_one``."""
+        if ioc_type == IOCTypeChoices.IP:
+            try:
+                address = ipaddress.ip_address(value.strip())
+            except ValueError:
+                return set()
+            keys = [
+                str(ipaddress.ip_network((address, prefixlen), strict=False))
+                for prefixlen in self.prefix_lengths.get(address.version, ())
+            ]
+        elif ioc_type == IOCTypeChoices.DOMAIN:
+            normalized = normalize_ioc(ioc_type, value)
+            labels = normalized[1].split('.') if normalized else []
+            keys = ['.'.join(labels[position:]) for position in range(len(labels))]
+        elif ioc_type == IOCTypeChoices.URL:
+            url = normalize_url(value)
+            keys = list(_url_prefixes(url)) if url else []
+        else:
+            key = snapshot_key(ioc_type, value)
+            keys = [key] if key else []
+        matches = set()
+        for key in keys:
+            matches |= self.lookup(ioc_type, key)
+        return matches
+
+    def match(self, observables):
+        """``{position in the batch: set of IOC ids}`` for the ``(type, value)`` observables that matched."""
+        results = {}
+        for position, (ioc_type, value) in enumerate(observables):
+            ids = self.match_one(ioc_type, value)
+            if ids:
+                results[position] = ids
+        return results
+
+
+def _entries(rows, prefix_lengths):
+    entries = []
+    for ioc_id, ioc_type, value in rows:
+        key = snapshot_key(ioc_type, value)
+        if key is None:
+            continue
+        if ioc_type == IOCTypeChoices.IP:
+            network = ipaddress.ip_network(key)
+            prefix_lengths.setdefault(network.version, set()).add(network.prefixlen)
+        entries.append((_digest(ioc_type, key), ioc_id))
+    entries.sort()
+    return entries
+
+
+def build_snapshot(path=None, full=False):
+    """Write a new snapshot of the IOC table to ``path`` and swap it in atomically.
+
+    Unless ``full`` is set, records of the current snapshot are carried over
+    and only IOCs changed since it was built are read from the database
+    (deleted IOCs are dropped by comparing against the table's ids).
+    Returns the new ``IOCSnapshot``.
+    """
+    path = str(path or IOC_SNAPSHOT_PATH)
+    previous = None
+    if not full and os.path.exists(path):
+        try:
+            previous = IOCSnapshot(path)
+        except ValueError:
+            previous = None
+
+    built_at = timezone.now()
+    prefix_lengths = {}
+    if previous is None:
+        version = 1
+        entries = _entries(IOC.objects.values_list('id', 'type', 'value').iterator(chunk_size=10000), prefix_lengths)
+        kept, capacity = iter(()), len(entries)
+    else:
+        version = previous.version + 1
+        for ip_version, lengths in previous.prefix_lengths.items():
+            prefix_lengths[ip_version] = set(lengths)
+        changed = list(IOC.objects.filter(
+            updated_at__gte=previous.built_at - REFRESH_OVERLAP
+        ).values_list('id', 'type', 'value'))
+        entries = _entries(changed, prefix_lengths)
+        changed_ids = {ioc_id for ioc_id, _, _ in changed}
+        live_ids = set(IOC.objects.values_list('id', flat=True))
+        kept = (
+            (digest, ioc_id) for digest, ioc_id in previous.records()
+            if ioc_id in live_ids and ioc_id not in changed_ids
+        )
+        capacity = previous.count + len(entries)
+
+    bloom = bytearray(max(capacity * BLOOM_BITS_PER_KEY // 8, 8))
+    bloom_bits = len(bloom) * 8
+    meta = json.dumps({
+        'prefix_lengths': {str(ip_version): sorted(lengths) for ip_version, lengths in prefix_lengths.items()}
+    }).encode()
+    records_at = HEADER.size + len(meta)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{version}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, 'wb') as handle:
+            handle.write(bytes(HEADER.size))
+            handle.write(meta)
+            count = 0
+            for digest, ioc_id in heapq.merge(kept, entries):
+                handle.write(RECORD.pack(digest, ioc_id))
+                for bit in _bloom_positions(digest, bloom_bits):
+                    bloom[bit >> 3] |= 1 << (bit & 7)
+                count += 1
+            handle.write(bloom)
+            handle.seek(0)
+            handle.write(HEADER.pack(
+                MAGIC, version, int(built_at.timestamp() * 1e6), count, BLOOM_HASHES,
+                len(meta), len(bloom), records_at
+            ))
+            handle.flush()
+            os.fsync(handle.fileno())
+        if previous is not None:
+            previous.close()
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return IOCSnapshot(path)
+
+
+_current = None
+_checked_at = 0.0
+
+
+def current_snapshot(path=None, max_age=SNAPSHOT_CHECK_INTERVAL):
+    """This process's open snapshot, reopened when a newer file was swapped in.
+
+    The file is only checked again once ``max_age`` seconds have passed.
+    Returns None until a snapshot has been built.
+    """
+    global _current, _checked_at
+    path = str(path or IOC_SNAPSHOT_PATH)
+    now = time.monotonic()
+    if _current is not None and _current.path == path and now - _checked_at < max_age:
+        return _current
+    _checked_at = now
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return _current if _current is not None and _current.path == path else None
+    if _current is None or _current.path != path or \
+            (stat.st_ino, stat.st_mtime_ns) != (_current.stat.st_ino, _current.stat.st_mtime_ns):
+        # The previous mapping stays valid for readers still holding it and goes away with them.
+        _current = IOCSnapshot(path)
+    return _current
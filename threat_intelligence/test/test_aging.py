@@ -0,0 +1,59 @@
+import pytest
+from django.utils import timezone
+from clients.models import Client
+from common.enums import IncidentStatus, IOCSourceChoices, IOCTypeChoices
+from incidents.models import Incident, IncidentIOC
+from threat_intelligence.aging import archive_expired_iocs, decay_confidence
+from threat_intelligence.models import IOC, ArchivedIOC
+
+
+def _ioc(value, days_ago, confidence=80, **fields):
+    ioc = IOC.objects.create(type=IOCTypeChoices.IP, value=value, confidence_score=confidence, **fields)
+    IOC.objects.filter(pk=ioc.pk).update(last_seen_at=timezone.now() - timezone.timedelta(days=days_ago))
+    return ioc
+
+
+@pytest.mark.django_db
+def test_confidence_decays_by_type_and_source_half_life():
+    external = _ioc("192.0.2.1", 30, source=IOCSourceChoices.EXTERNAL)
+    internal = _ioc("192.0.2.2", 30, source=IOCSourceChoices.INTERNAL)
+    fresh = _ioc("192.0.2.3", 0)
+    assert decay_confidence(batch_size=2) == 2
+    assert decay_confidence() == 0
+    external.refresh_from_db()
+    internal.refresh_from_db()
+    fresh.refresh_from_db()
+    assert (external.confidence_score, internal.confidence_score, fresh.confidence_score) == (40, 57, 80)
+    assert external.base_confidence == 80
+
+    incident = Incident.objects.create(client=Client.objects.create(name="Test Client", contact_email="test@client.com"))
+    assert incident.add_ioc('ip', '192.0.2.1') == external
+    external.refresh_from_db()
+    assert external.confidence_score == 80 and decay_confidence() == 0
+
+
+@pytest.mark.django_db
+def test_expired_iocs_are_archived_unless_still_needed():
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    open_incident = Incident.objects.create(client=client)
+    closed_incident = Incident.objects.create(client=client, status=IncidentStatus.CLOSED)
+    unlinked = _ioc("198.51.100.1", 365)
+    on_closed = _ioc("198.51.100.2", 365)
+    on_open = _ioc("198.51.100.3", 365)
+    blocked = _ioc("198.51.100.4", 365, is_blocked=True)
+    live = _ioc("198.51.100.5", 1)
+    IncidentIOC.objects.bulk_create([
+        IncidentIOC(incident=closed_incident, ioc=on_closed), IncidentIOC(incident=open_incident, ioc=on_open),
+    ])
+
+    decay_confidence()
+    assert archive_expired_iocs(batch_size=1) == 2
+    assert set(IOC.objects.values_list('pk', flat=True)) == {on_open.pk, blocked.pk, live.pk}
+    archived = ArchivedIOC.objects.get(original_id=on_closed.pk)
+    assert archived.incident_ids == [closed_incident.pk] and archived.base_confidence == 80
+
+    restored = archived.restore()
+    assert restored.value == "198.51.100.2" and restored.confidence_score == 80
+    assert list(closed_incident.iocs.all()) == [restored]
+    assert ArchivedIOC.objects.filter(original_id=unlinked.pk).exists()
+    assert not ArchivedIOC.objects.filter(original_id=on_closed.pk).exists()
@@ -0,0 +1,70 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from clients.models import Client
+from common.enums import IOCTypeChoices, SeverityChoices
+from incidents.models import Incident, IncidentIOC
+from threat_intelligence.models import IOC
+from users.models import CustomUser
+
+
+@pytest.fixture
+def api_client():
+    api_client = APIClient()
+    api_client.force_authenticate(CustomUser.objects.create_user(username="analyst", password="testpass123", email="a@ey.com"))
+    return api_client
+
+
+@pytest.mark.django_db
+def test_batch_attach_resolves_creates_links_and_rescores_once(api_client):
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    known = [IOC.objects.create(type=IOCTypeChoices.DOMAIN, value=f"evil{i}.example") for i in range(2)]
+    earlier = Incident.objects.create(client=client)
+    IncidentIOC.objects.bulk_create([IncidentIOC(incident=earlier, ioc=ioc) for ioc in known])
+    incident = Incident.objects.create(client=client, severity=SeverityChoices.LOW)
+
+    response = api_client.post(f'/threat-intel/api/incidents/{incident.pk}/iocs/', {'iocs': [
+        {'type': 'domain', 'value': 'EVIL0.example.'},
+        {'type': 'domain', 'value': 'evil1.example'},
+        {'type': 'ip', 'value': '198.51.100.9'},
+        {'type': 'ip', 'value': 'not an ip'},
+        {'type': 'domain', 'value': 'evil0.example'},
+    ]}, format='json')
+
+    assert response.status_code == 201
+    results = response.data['results']
+    assert [result.get('id') for result in results] == [known[0].pk, known[1].pk, results[2]['id'], None, known[0].pk]
+    assert [result.get('created') for result in results] == [False, False, True, None, False]
+    assert 'error' in results[3]
+    assert incident.iocs.count() == 3
+    assert response.data['severity'] == SeverityChoices.MEDIUM
+    incident.refresh_from_db()
+    assert incident.severity == SeverityChoices.MEDIUM
+
+
+@pytest.mark.django_db
+def test_batch_attach_query_count_does_not_grow_with_the_batch():
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    counts = []
+    for size in (5, 50):
+        IOC.objects.bulk_create([IOC(type=IOCTypeChoices.HASH, value=f"{size:04x}{i:060x}") for i in range(size)])
+        incident = Incident.objects.create(client=client)
+        indicators = [('hash', f"{size:04x}{i:060x}") for i in range(size * 2)]
+        with CaptureQueriesContext(connection) as queries:
+            incident.add_iocs(indicators)
+        counts.append(len(queries))
+        assert incident.iocs.count() == size * 2
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+def test_batch_attach_rejects_malformed_payloads(api_client):
+    incident = Incident.objects.create(client=Client.objects.create(name="Test Client", contact_email="test@client.com"))
+    url = f'/threat-intel/api/incidents/{incident.pk}/iocs/'
+    assert api_client.post(url, {'iocs': []}, format='json').status_code == 400
+    assert api_client.post(url, {'iocs': ['1.2.3.4']}, format='json').status_code == 400
+    assert api_client.post(url, {'iocs': [{'type': 'ip', 'value': 123}]}, format='json').status_code == 400
+    assert api_client.post(url, [{'type': 'ip', 'value': '1.2.3.4'}], format='json').status_code == 400
+    assert api_client.post(url, {'iocs': [{'type': 'ip', 'value': '1.2.3.4'}], 'source': 'x'}, format='json').status_code == 400
+    assert api_client.post('/threat-intel/api/incidents/0/iocs/', {'iocs': []}, format='json').status_code == 404
@@ -0,0 +1,125 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+from common.enums import IOCTypeChoices
+from threat_intelligence import blocklists
+from threat_intelligence.models import IOC, BlocklistChange
+from users.models import CustomUser
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blocklists, 'BLOCKLIST_EXPORT_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def api_client():
+    api_client = APIClient()
+    api_client.force_authenticate(CustomUser.objects.create_user(username="firewall", password="testpass123", email="fw@ey.com"))
+    return api_client
+
+
+def _content(response):
+    return b''.join(response.streaming_content).decode()
+
+
+@pytest.mark.django_db
+def test_blocked_iocs_are_exported_only_when_they_change(export_dir):
+    IOC.objects.create(type=IOCTypeChoices.IP, value="192.0.2.2", is_blocked=True)
+    IOC.objects.create(type=IOCTypeChoices.IP, value="192.0.2.1", is_blocked=True, confidence_score=90)
+    IOC.objects.create(type=IOCTypeChoices.IP, value="192.0.2.3")
+    IOC.objects.create(type=IOCTypeChoices.DOMAIN, value="evil.example", is_blocked=True)
+
+    version = blocklists.export_blocklist('ip')
+    assert version == BlocklistChange.objects.filter(type='ip').latest('id').id
+    assert (export_dir / 'ip.txt').read_text() == "192.0.2.1\n192.0.2.2\n"
+    assert (export_dir / 'ip.csv').read_text().splitlines()[1].startswith("192.0.2.1,90,")
+    assert blocklists.export_blocklist('ip') is None
+    exported = blocklists.export_blocklists()
+    assert 'ip' not in exported and exported['domain'] == BlocklistChange.objects.get(type='domain').id
+    assert blocklists.export_blocklists() == {}
+
+
+@pytest.mark.django_db
+def test_blocklist_api_serves_files_etags_and_deltas(export_dir, api_client, django_assert_num_queries):
+    first = IOC.objects.create(type=IOCTypeChoices.IP, value="192.0.2.1", is_blocked=True)
+    later = IOC.objects.create(type=IOCTypeChoices.IP, value="192.0.2.2")
+    response = api_client.get('/threat-intel/api/blocklists/ip.txt')
+    assert response.status_code == 200 and _content(response) == "192.0.2.1\n"
+    version = int(response['X-Blocklist-Version'])
+
+    with django_assert_num_queries(0):
+        response = api_client.get('/threat-intel/api/blocklists/ip.txt', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+
+    first.is_blocked = False
+    first.save()
+    later.is_blocked = True
+    later.save()
+    blocklists.export_blocklist('ip')
+    response = api_client.get(f'/threat-intel/api/blocklists/ip.json?since={version}')
+    assert response.data == {
+        'version': BlocklistChange.objects.latest('id').id, 'added': ["192.0.2.2"], 'removed': ["192.0.2.1"],
+    }
+    response = api_client.get('/threat-intel/api/blocklists/ip.json')
+    assert response['Content-Type'] == 'application/json' and '"192.0.2.2"' in _content(response)
+
+    assert api_client.get('/threat-intel/api/blocklists/ip.json?since=x').status_code == 400
+    assert api_client.get('/threat-intel/api/blocklists/mac.txt').status_code == 404
+    blocklists.prune_changes(timezone.now() + timezone.timedelta(seconds=1))
+    assert api_client.get(f'/threat-intel/api/blocklists/ip.json?since={version}').status_code == 410
+
+
+@pytest.mark.django_db
+def test_deleting_or_editing_a_blocked_ioc_records_changes():
+    ioc = IOC.objects.create(type=IOCTypeChoices.DOMAIN, value="old.example", is_blocked=True)
+    ioc.value = "new.example"
+    ioc.save()
+    ioc.delete()
+    assert list(BlocklistChange.objects.order_by('id').values_list('value', 'blocked')) == [
+        ("old.example", True), ("old.example", False), ("new.example", True), ("new.example", False),
+    ]
+
+
+@pytest.mark.django_db
+def test_changes_committed_out_of_id_order_are_still_exported(export_dir, api_client):
+    # A transaction that got its change id first but commits after the export below
+    in_flight = BlocklistChange.objects.create(type=IOCTypeChoices.IP, value="192.0.2.9", blocked=True).id
+    BlocklistChange.objects.filter(id=in_flight).delete()
+    IOC.objects.create(type=IOCTypeChoices.IP, value="192.0.2.1", is_blocked=True)
+    version = blocklists.export_blocklist('ip')
+    tag = api_client.get('/threat-intel/api/blocklists/ip.txt')['ETag']
+
+    IOC.objects.bulk_create([IOC(type=IOCTypeChoices.IP, value="192.0.2.9", is_blocked=True)])
+    BlocklistChange.objects.create(id=in_flight, type=IOCTypeChoices.IP, value="192.0.2.9", blocked=True)
+    assert blocklists.export_blocklist('ip') is None
+    # The post-commit export does not trust the unchanged version
+    assert blocklists.export_blocklist('ip', force=True) == version
+    response = api_client.get('/threat-intel/api/blocklists/ip.txt', HTTP_IF_NONE_MATCH=tag)
+    assert response.status_code == 200 and _content(response) == "192.0.2.1\n192.0.2.9\n"
+    assert api_client.get(f'/threat-intel/api/blocklists/ip.json?since={version}').data['added'] == [
+        "192.0.2.1", "192.0.2.9",
+    ]
+
+
+@pytest.mark.django_db
+def test_exports_are_coalesced_per_transaction_and_while_queued(monkeypatch, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks() as callbacks:
+        for i in range(5):
+            IOC.objects.create(type=IOCTypeChoices.IP, value=f"192.0.2.{i}", is_blocked=True)
+        IOC.objects.create(type=IOCTypeChoices.DOMAIN, value="evil.example", is_blocked=True)
+    assert sorted(callback.ioc_type for callback in callbacks) == ['domain', 'ip']
+
+    release, exported = threading.Event(), []
+    monkeypatch.setattr(blocklists, '_executor', ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(blocklists, '_pending_exports', {})
+    monkeypatch.setattr(blocklists, '_export_in_background', lambda ioc_type: (release.wait(5), exported.append(ioc_type)))
+    running = blocklists.schedule_export('domain')
+    queued = [blocklists.schedule_export('ip') for _ in range(3)]
+    release.set()
+    running.result(), queued[0].result()
+    assert queued[0] is queued[1] is queued[2]
+    assert exported == ['domain', 'ip']
@@ -0,0 +1,122 @@
+import threading
+import time
+import pytest
+from django.test import Client as HttpClient
+from django.utils import timezone
+from clients.models import Client
+from common.enums import IOCTypeChoices
+from incidents.models import Incident
+from threat_intelligence.enrichment import EnrichmentResult, StubProvider, enrich_iocs
+from threat_intelligence.models import IOC, IOCEnrichment
+from users.models import CustomUser
+
+
+class CountingProvider(StubProvider):
+    name = 'counting'
+
+    def __init__(self, delay=0.0, verdict=None):
+        super().__init__()
+        self.delay = delay
+        self.verdict = verdict
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def lookup(self, ioc_type, value, timeout):
+        with self._lock:
+            self.calls.append(value)
+        result = super().lookup(ioc_type, value, timeout)
+        return self.verdict or result
+
+
+class RateLimitedProvider(CountingProvider):
+    name = 'rate_limited'
+    rate_limit = 50
+
+
+class FailingProvider(CountingProvider):
+    name = 'failing'
+
+    def lookup(self, ioc_type, value, timeout):
+        raise ConnectionError("provider down")
+
+
+class HangingProvider(CountingProvider):
+    name = 'hanging'
+    timeout = 0.2
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def lookup(self, ioc_type, value, timeout):
+        self.release.wait(30)  # Ignores its timeout
+        return super().lookup(ioc_type, value, timeout)
+
+
+def _iocs(count):
+    return [IOC.objects.create(type=IOCTypeChoices.DOMAIN, value=f"host{i}.example") for i in range(count)]
+
+
+@pytest.mark.django_db
+def test_enrichment_is_cached_deduplicated_and_written_back():
+    first, second = _iocs(2)
+    provider = CountingProvider(verdict=EnrichmentResult(True, 95, {'family': 'test'}))
+    assert enrich_iocs([first, second, first], providers=[provider]) == 2
+    assert sorted(provider.calls) == ["host0.example", "host1.example"]
+    assert enrich_iocs([first, second], providers=[provider]) == 0
+    first.refresh_from_db()
+    assert (first.confidence_score, first.base_confidence) == (95, 95)
+    assert first.check_against_threat_intel() is True
+
+    IOCEnrichment.objects.filter(lookup_key=first.lookup_key).update(expires_at=timezone.now())
+    assert enrich_iocs([first, second], providers=[provider]) == 1
+
+
+@pytest.mark.django_db
+def test_lookups_run_concurrently_within_rate_limits():
+    iocs = _iocs(12)
+    slow = CountingProvider(delay=0.1)
+    started = time.monotonic()
+    assert enrich_iocs(iocs, providers=[slow], max_workers=6) == 12
+    assert time.monotonic() - started < 0.6
+
+    limited = RateLimitedProvider()
+    started = time.monotonic()
+    enrich_iocs(iocs[:10], providers=[limited], max_workers=10)
+    assert time.monotonic() - started >= 9 / limited.rate_limit
+
+
+@pytest.mark.django_db
+def test_failed_lookups_are_not_cached():
+    ioc, = _iocs(1)
+    assert enrich_iocs([ioc], providers=[FailingProvider()]) == 0
+    assert not IOCEnrichment.objects.exists()
+
+
+@pytest.mark.django_db
+def test_a_hanging_provider_does_not_block_the_run():
+    ioc, = _iocs(1)
+    hanging, fast = HangingProvider(), CountingProvider()
+    fast.timeout = hanging.timeout
+    started = time.monotonic()
+    try:
+        assert enrich_iocs([ioc], providers=[hanging, fast]) == 1
+        assert time.monotonic() - started < 2
+    finally:
+        hanging.release.set()
+    assert list(IOCEnrichment.objects.values_list('provider', flat=True)) == ['counting']
+
+
+@pytest.mark.django_db
+def test_adding_an_ioc_queues_enrichment_after_the_response(django_capture_on_commit_callbacks):
+    incident = Incident.objects.create(client=Client.objects.create(name="Test Client", contact_email="test@client.com"))
+    http = HttpClient()
+    http.force_login(CustomUser.objects.create_user(username="viewer", password="testpass123", email="viewer@ey.com"))
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = http.post(
+            f'/threat-intel/incidents/{incident.pk}/add-ioc/', {'type': 'domain', 'value': 'new.example'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+    assert response.json()['success'] is True
+    assert len(callbacks) == 1
+    assert not IOCEnrichment.objects.exists()
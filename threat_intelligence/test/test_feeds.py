@@ -0,0 +1,95 @@
+import io
+import json
+import pytest
+from rest_framework.test import APIClient
+from django.core.files.uploadedfile import SimpleUploadedFile
+from incidents.jobs import claim_jobs, run_job
+from threat_intelligence import feeds
+from threat_intelligence.feeds import import_feed, read_stix
+from threat_intelligence.models import IOC, IOCFeedImport
+from users.models import CustomUser
+from common.enums import FeedFormat, ImportStatus, IOCTypeChoices
+
+CSV_FEED = b"""type,value,description,confidence
+ipv4,198.51.100.7,scanner,80
+domain-name,Evil.Example.,c2,90
+sha256,ABCDEF0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0123456789,,
+,missing-type,,
+domain,evil.example,duplicate in the same file,95
+"""
+
+
+@pytest.mark.django_db
+def test_csv_import_normalizes_and_upserts():
+    IOC.objects.create(type=IOCTypeChoices.IP, value="198.51.100.7", confidence_score=10, description="kept")
+    job = import_feed(io.BytesIO(CSV_FEED), FeedFormat.CSV, 'feed.csv', batch_size=2)
+    assert job.status == ImportStatus.COMPLETED
+    assert (job.rows_read, job.rows_rejected) == (5, 1)
+    ip = IOC.objects.get(type=IOCTypeChoices.IP, value="198.51.100.7")
+    assert ip.confidence_score == 80 and ip.description == "kept" and ip.source == 'external'
+    assert IOC.objects.get(type=IOCTypeChoices.DOMAIN, value="evil.example").confidence_score == 95
+    assert IOC.objects.filter(type=IOCTypeChoices.HASH, value__startswith="abcdef").exists()
+    assert IOC.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_interrupted_jsonl_import_resumes_after_checkpoint():
+    lines = [json.dumps({'type': 'ip', 'value': f'203.0.113.{i}'}) for i in range(10)]
+    lines.insert(7, 'not json')
+    feed = ("\n".join(lines) + "\n").encode()
+
+    def interrupt(job):
+        if job.rows_read >= 4:
+            raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        import_feed(io.BytesIO(feed), FeedFormat.JSONL, 'feed.jsonl', batch_size=4, progress=interrupt)
+    assert IOC.objects.count() == 4
+
+    job = import_feed(io.BytesIO(feed), FeedFormat.JSONL, 'feed.jsonl', batch_size=4, resume=True)
+    assert IOCFeedImport.objects.count() == 1
+    assert (job.rows_read, job.rows_upserted, job.rows_rejected) == (11, 10, 1)
+    assert IOC.objects.count() == 10
+
+
+def test_stix_reader_streams_bundle_objects(monkeypatch):
+    monkeypatch.setattr('threat_intelligence.feeds.READ_CHUNK_SIZE', 7)
+    bundle = {
+        'type': 'bundle', 'id': 'bundle--1', 'meta': {'objects': ['not', 'these']},
+        'objects': [
+            {'type': 'indicator', 'pattern': "[ipv4-addr:value = '192.0.2.1'] OR [domain-name:value = 'bad.example']",
+             'confidence': 70, 'description': 'from STIX'},
+            {'type': 'indicator', 'pattern': "[file:hashes.'SHA-256' = 'aa11']"},
+            {'type': 'indicator', 'pattern': "[email-message:subject = 'Invoice \\'due\\'']"},
+            {'type': 'url', 'value': 'http://bad.example/login'},
+            {'type': 'malware', 'name': 'ignored'},
+        ],
+    }
+    records = list(read_stix(io.BytesIO(json.dumps(bundle).encode())))
+    assert [(r['type'], r['value']) for r in records] == [
+        ('ip', '192.0.2.1'), ('domain', 'bad.example'), ('hash', 'aa11'),
+        ('subject', "Invoice 'due'"), ('url', 'http://bad.example/login'),
+    ]
+    assert records[0]['confidence'] == 70
+
+
+@pytest.mark.django_db
+def test_import_api_accepts_uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(feeds, 'FEED_UPLOAD_DIR', str(tmp_path))
+    api_client = APIClient()
+    api_client.force_authenticate(CustomUser.objects.create_user(username="analyst", password="testpass123", email="a@ey.com"))
+    upload = SimpleUploadedFile('feed.csv', CSV_FEED, content_type='text/csv')
+    response = api_client.post('/threat-intel/api/iocs/import/', {'file': upload, 'format': 'csv'}, format='multipart')
+    assert response.status_code == 202
+    status_url = f"/threat-intel/api/iocs/import/{response.data['import_id']}/"
+    assert api_client.get(status_url).data['status'] == ImportStatus.QUEUED
+    assert not IOC.objects.exists()
+
+    while jobs := claim_jobs('worker-a', limit=10):
+        for job in jobs:
+            run_job(job)
+    status = api_client.get(status_url).data
+    assert status['status'] == ImportStatus.COMPLETED
+    assert (status['rows_read'], status['rows_upserted'], status['rows_rejected']) == (5, 3, 1)
+    assert IOC.objects.count() == 3 and not list(tmp_path.iterdir())
+    assert api_client.get('/threat-intel/api/iocs/import/999999/').status_code == 404
+    assert api_client.post('/threat-intel/api/iocs/import/', {'format': 'xml'}, format='multipart').status_code == 400
@@ -0,0 +1,60 @@
+import pytest
+from django.test import Client as HttpClient
+from incidents.models import Incident, IncidentIOC
+from threat_intelligence.models import IOC
+from users.models import CustomUser
+from clients.models import Client
+from common.enums import IOCTypeChoices
+
+
+def _incident_with_iocs(client, iocs):
+    incident = Incident.objects.create(client=client)
+    IncidentIOC.objects.bulk_create([IncidentIOC(incident=incident, ioc=ioc) for ioc in iocs])
+    return incident
+
+
+@pytest.mark.django_db
+def test_correlation_score_and_shared_counts():
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    iocs = IOC.objects.bulk_create([IOC(type=IOCTypeChoices.IP, value=f"10.0.0.{i}") for i in range(4)])
+    incident = _incident_with_iocs(client, iocs)
+    other = _incident_with_iocs(client, iocs[:2])
+    third = _incident_with_iocs(client, iocs[1:2])
+
+    assert incident.check_iocs_against_db() == 50
+    assert incident.correlated_incidents() == [
+        {'incident': other.pk, 'shared_iocs': 2},
+        {'incident': third.pk, 'shared_iocs': 1},
+    ]
+    assert Incident.objects.create(client=client).check_iocs_against_db() == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ioc_count', [1, 20, 200])
+def test_correlation_query_count_is_flat(ioc_count, django_assert_num_queries):
+    # Benchmark: the number of queries must not grow with the number of IOCs on the incident.
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    iocs = IOC.objects.bulk_create([IOC(type=IOCTypeChoices.DOMAIN, value=f"evil{i}.example") for i in range(ioc_count)])
+    incident = _incident_with_iocs(client, iocs)
+    _incident_with_iocs(client, iocs[::2])
+    with django_assert_num_queries(1):
+        incident.check_iocs_against_db()
+    with django_assert_num_queries(1):
+        incident.correlated_incidents()
+
+
+@pytest.mark.django_db
+def test_check_ioc_matches_view_returns_correlations():
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    ioc = IOC.objects.create(type=IOCTypeChoices.HASH, value="d41d8cd98f00b204e9800998ecf8427e")
+    incident = _incident_with_iocs(client, [ioc])
+    other = _incident_with_iocs(client, [ioc])
+    http = HttpClient()
+    http.force_login(CustomUser.objects.create_user(username="viewer", password="testpass123", email="viewer@ey.com"))
+    response = http.get(
+        f'/threat-intel/incidents/{incident.pk}/check-ioc-matches/', HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+    )
+    assert response.json() == {
+        'match_score': 100.0,
+        'correlated_incidents': [{'incident': other.pk, 'shared_iocs': 1}],
+    }
@@ -0,0 +1,65 @@
+import pytest
+from django.db import connection
+from django.test import Client as HttpClient
+from rest_framework.test import APIClient
+from common.enums import IOCTypeChoices, IOCSourceChoices
+from threat_intelligence.models import IOC
+from users.models import CustomUser
+
+
+@pytest.fixture
+def api_client():
+    api_client = APIClient()
+    api_client.force_authenticate(CustomUser.objects.create_user(username="analyst", password="testpass123", email="a@ey.com"))
+    return api_client
+
+
+@pytest.mark.django_db
+def test_api_pages_through_iocs_newest_first(api_client):
+    iocs = [IOC.objects.create(type=IOCTypeChoices.IP, value=f"192.0.2.{i}") for i in range(5)]
+    seen = []
+    url = '/threat-intel/api/iocs/?page_size=2'
+    while url:
+        response = api_client.get(url)
+        assert response.status_code == 200
+        seen += [ioc['id'] for ioc in response.data['results']]
+        url = response.data['next']
+    assert seen == [ioc.id for ioc in reversed(iocs)]
+
+
+@pytest.mark.django_db
+def test_api_filters_and_searches(api_client):
+    phish = IOC.objects.create(type=IOCTypeChoices.DOMAIN, value="login-paypal.example", description="Phishing kit")
+    IOC.objects.create(type=IOCTypeChoices.DOMAIN, value="cdn.example", source=IOCSourceChoices.EXTERNAL, is_blocked=True)
+    IOC.objects.create(type=IOCTypeChoices.HASH, value="d41d8cd98f00b204e9800998ecf8427e", description="dropper")
+
+    def ids(query):
+        return [ioc['id'] for ioc in api_client.get(f'/threat-intel/api/iocs/?{query}').data['results']]
+
+    assert ids('q=PAYPAL') == ids('q=phishing') == [phish.id]
+    assert len(ids('type=domain')) == 2
+    assert len(ids('type=domain&is_blocked=false&source=internal')) == 1
+    assert api_client.get('/threat-intel/api/iocs/?type=bogus').status_code == 400
+
+
+@pytest.mark.django_db
+def test_search_can_use_the_trigram_index():
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        sql, params = IOC.objects.search("paypal").query.sql_with_params()
+        cursor.execute(f"EXPLAIN {sql}", params)
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+    assert 'ioc_value_trgm_idx' in plan and 'ioc_description_trgm_idx' in plan
+
+
+@pytest.mark.django_db
+def test_ioc_list_page_is_paginated():
+    for i in range(3):
+        IOC.objects.create(type=IOCTypeChoices.DOMAIN, value=f"evil{i}.example")
+    http = HttpClient()
+    http.force_login(CustomUser.objects.create_user(username="viewer", password="testpass123", email="viewer@ey.com"))
+    response = http.get('/threat-intel/iocs/?page_size=2')
+    assert response.status_code == 200
+    assert [ioc.value for ioc in response.context['iocs']] == ["evil2.example", "evil1.example"]
+    assert response.context['next_url']
+    assert http.get('/threat-intel/iocs/?cursor=not-a-cursor').status_code == 400
@@ -0,0 +1,44 @@
+import pytest
+from common.enums import IOCTypeChoices
+from threat_intelligence.matching import IOCMatcher
+from threat_intelligence.models import IOC
+
+
+@pytest.mark.django_db
+def test_matcher_covers_every_ioc_type():
+    iocs = {
+        'host': IOC.objects.create(type=IOCTypeChoices.IP, value="198.51.100.7"),
+        'range': IOC.objects.create(type=IOCTypeChoices.IP, value="10.0.0.0/8"),
+        'v6': IOC.objects.create(type=IOCTypeChoices.IP, value="2001:db8::/32"),
+        'domain': IOC.objects.create(type=IOCTypeChoices.DOMAIN, value="evil.example"),
+        'url': IOC.objects.create(type=IOCTypeChoices.URL, value="http://bad.example/login/"),
+        'hash': IOC.objects.create(type=IOCTypeChoices.HASH, value="d41d8cd98f00b204e9800998ecf8427e"),
+        'email': IOC.objects.create(type=IOCTypeChoices.EMAIL, value="ceo@phish.example"),
+        'subject': IOC.objects.create(type=IOCTypeChoices.SUBJECT, value="Urgent invoice"),
+    }
+    matcher = IOCMatcher().load()
+    observables = [
+        ('ip', '198.51.100.7'), ('ip', '10.20.30.40'), ('ip', '2001:db8::1'), ('ip', '192.0.2.1'),
+        ('domain', 'Mail.EVIL.example.'), ('domain', 'notevil.example'),
+        ('url', 'HXXP://bad.example:80/login/form?id=1'), ('url', 'http://bad.example/loginx'),
+        ('hash', 'D41D8CD98F00B204E9800998ECF8427E'), ('email', 'CEO@phish.example'),
+        ('subject', 'Urgent invoice'), ('ip', 'not an ip'),
+    ]
+    assert matcher.match(observables) == {
+        0: {iocs['host'].id}, 1: {iocs['range'].id}, 2: {iocs['v6'].id}, 4: {iocs['domain'].id},
+        6: {iocs['url'].id}, 8: {iocs['hash'].id}, 9: {iocs['email'].id}, 10: {iocs['subject'].id},
+    }
+
+
+@pytest.mark.django_db
+def test_matcher_refresh_picks_up_new_and_changed_iocs():
+    ioc = IOC.objects.create(type=IOCTypeChoices.DOMAIN, value="old.example")
+    matcher = IOCMatcher().load()
+    ioc.value = "new.example"
+    ioc.save()
+    added = IOC.objects.create(type=IOCTypeChoices.IP, value="192.0.2.10")
+    matcher.refresh()
+    assert matcher.match_one('domain', 'old.example') == set()
+    assert matcher.match_one('domain', 'new.example') == {ioc.id}
+    assert matcher.match_one('ip', '192.0.2.10') == {added.id}
+    assert len(matcher) == 2
@@ -0,0 +1,77 @@
+import importlib
+import pytest
+from django.apps import apps
+from django.test import Client as HttpClient
+from clients.models import Client
+from common.enums import IOCTypeChoices
+from incidents.models import Incident, IncidentIOC
+from threat_intelligence.models import IOC
+from threat_intelligence.normalization import ioc_lookup_key, normalize_ioc
+from users.models import CustomUser
+
+
+@pytest.mark.parametrize('ioc_type, raw, canonical', [
+    ('ip', ' 2001:DB8:0:0::1 ', '2001:db8::1'),
+    ('ip', '192.0.2.1/32', '192.0.2.1'),
+    ('ip', '10.1.2.3/8', '10.0.0.0/8'),
+    ('ip', '198.51.100[.]7', '198.51.100.7'),
+    ('domain', 'Example.COM.', 'example.com'),
+    ('domain', 'Bücher.example', 'xn--bcher-kva.example'),
+    ('url', 'hxxp://Evil[.]Example:80/Login?id=1#top', 'http://evil.example/Login?id=1'),
+    ('url', 'evil.example', 'http://evil.example/'),
+    ('hash', 'D41D8CD98F00B204E9800998ECF8427E', 'd41d8cd98f00b204e9800998ecf8427e'),
+    ('email', 'CEO@Phish[.]Example', 'ceo@phish.example'),
+])
+def test_indicators_are_canonicalized(ioc_type, raw, canonical):
+    assert normalize_ioc(ioc_type, raw) == (ioc_type, canonical)
+    assert ioc_lookup_key(ioc_type, raw) == ioc_lookup_key(ioc_type, canonical)
+
+
+def test_invalid_indicators_are_rejected():
+    assert normalize_ioc('ip', 'not-an-ip') is None
+    assert normalize_ioc('url', 'http://') is None
+    assert ioc_lookup_key('domain', 'example.com') != ioc_lookup_key('url', 'example.com')
+
+
+@pytest.mark.django_db
+def test_add_ioc_reuses_the_canonical_row():
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    incident = Incident.objects.create(client=client)
+    existing = IOC.objects.create(type=IOCTypeChoices.DOMAIN, value="example.com")
+    assert incident.add_ioc('domain', 'Example.COM.') == existing
+    assert IOC.objects.count() == 1
+    assert IOC.objects.matching('domain', 'EXAMPLE.com').get() == existing
+
+    http = HttpClient()
+    http.force_login(CustomUser.objects.create_user(username="viewer", password="testpass123", email="viewer@ey.com"))
+    response = http.post(f'/threat-intel/incidents/{incident.pk}/add-ioc/', {'type': 'domain', 'value': 'example.com.'})
+    assert response.json() == {'success': False, 'error': 'IOC already exists'}
+
+
+@pytest.mark.django_db
+def test_migration_merges_duplicate_iocs():
+    migration = importlib.import_module('threat_intelligence.migrations.0003_ioc_lookup_key')
+    client = Client.objects.create(name="Test Client", contact_email="test@client.com")
+    first, second, third = Incident.objects.bulk_create([Incident(client=client) for _ in range(3)])
+    # Rows as they could be stored before the lookup key existed
+    kept, upper, dotted = IOC.objects.bulk_create([
+        IOC(type=IOCTypeChoices.DOMAIN, value="evil.example", confidence_score=20),
+        IOC(type=IOCTypeChoices.DOMAIN, value="upper.example", confidence_score=90, is_blocked=True),
+        IOC(type=IOCTypeChoices.DOMAIN, value="dotted.example", description="c2"),
+    ])
+    IOC.objects.filter(pk=upper.pk).update(value="EVIL.example")
+    IOC.objects.filter(pk=dotted.pk).update(value="evil.example.")
+    IncidentIOC.objects.bulk_create([
+        IncidentIOC(incident=first, ioc=kept), IncidentIOC(incident=first, ioc=upper),
+        IncidentIOC(incident=second, ioc=upper), IncidentIOC(incident=second, ioc=dotted),
+        IncidentIOC(incident=third, ioc=dotted),
+    ])
+
+    migration.merge_duplicate_iocs(apps, None)
+
+    merged = IOC.objects.get()
+    assert merged.pk == kept.pk and merged.lookup_key == ioc_lookup_key('domain', 'evil.example')
+    assert (merged.confidence_score, merged.is_blocked, merged.description) == (90, True, "c2")
+    assert sorted(IncidentIOC.objects.values_list('incident', 'ioc')) == [
+        (first.pk, kept.pk), (second.pk, kept.pk), (third.pk, kept.pk),
+    ]
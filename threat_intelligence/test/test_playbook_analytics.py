@@ -0,0 +1,120 @@
+import pytest
+from datetime import datetime, timedelta
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client as HttpClient
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from clients.models import Client
+from common.enums import PlaybookStatus, TimingWindow
+from incidents.models import Incident, Analysis
+from threat_intelligence.analytics import execution_timings, rebuild_timing_rollups, summarize_timings
+from threat_intelligence.models import Playbook, PlaybookExecution, PlaybookStep, PlaybookStepExecution, PlaybookTimingRollup
+from users.models import CustomUser, Analyst
+
+DAY = timezone.make_aware(datetime(2025, 3, 4, 9, 0))
+
+
+@pytest.fixture
+def analysis():
+    incident = Incident.objects.create(client=Client.objects.create(name="Test Client", contact_email="test@client.com"))
+    analyst = Analyst.objects.create(user=CustomUser.objects.create(username="analyst1", email="analyst1@ey.com"))
+    return Analysis.objects.create(incident=incident, analyst=analyst, ticket=incident.ticket, notes="notes")
+
+
+@pytest.fixture
+def playbook():
+    playbook = Playbook.objects.create(name="Phishing", incident_type="phishing")
+    PlaybookStep.objects.create(playbook=playbook, step_number=1, description="Block sender")
+    PlaybookStep.objects.create(playbook=playbook, step_number=2, description="Reset mailbox")
+    return playbook
+
+
+def _executions(analysis, playbook, minutes, status=PlaybookStatus.COMPLETED, paused=0, step_minutes=(1, 1)):
+    """One finished execution per duration in ``minutes``, ``paused`` minutes of it paused."""
+    steps = list(playbook.steps.order_by('step_number'))
+    for duration in minutes:
+        execution = PlaybookExecution.objects.create(
+            playbook=playbook, incident=analysis.incident, ticket=analysis.ticket, analysis=analysis, status=status,
+            start_time=DAY, completion_time=DAY + timedelta(minutes=duration + paused),
+            total_paused_time=timedelta(minutes=paused),
+        )
+        PlaybookStepExecution.objects.bulk_create(
+            PlaybookStepExecution(
+                playbook_execution=execution, step=step, status=status,
+                start_time=DAY, completion_time=DAY + timedelta(minutes=step_duration),
+            )
+            for step, step_duration in zip(steps, step_minutes)
+        )
+
+
+@pytest.mark.django_db
+def test_percentiles_failures_and_pauses_are_computed_per_bucket(analysis, playbook):
+    _executions(analysis, playbook, [10, 20, 30, 40], paused=5, step_minutes=(1, 3))
+    _executions(analysis, playbook, [90], status=PlaybookStatus.FAILED)
+    # Still running: not part of any bucket
+    PlaybookExecution.objects.create(
+        playbook=playbook, incident=analysis.incident, ticket=analysis.ticket, analysis=analysis,
+        status=PlaybookStatus.PAUSED, start_time=DAY,
+    )
+
+    assert rebuild_timing_rollups() == 3 * len(TimingWindow.values)
+    [summary] = summarize_timings(PlaybookTimingRollup.objects.filter(window=TimingWindow.DAY))
+    assert summary['bucket'] == DAY.date() and summary['playbook_name'] == "Phishing"
+    assert summary['executions'] == 5 and summary['failed'] == 1 and summary['failure_rate'] == 0.2
+    # Only completed executions count towards durations, without their pauses
+    assert summary['total_seconds'] == 100 * 60
+    assert summary['mean_seconds'] == 25 * 60
+    assert summary['p50_seconds'] == 25 * 60
+    assert summary['p90_seconds'] == pytest.approx(37 * 60)
+    assert summary['paused_seconds'] == 4 * 5 * 60
+    assert summary['pause_share'] == pytest.approx(20 / 120)
+    # The slowest step comes first
+    assert [step['description'] for step in summary['steps']] == ["Reset mailbox", "Block sender"]
+    assert summary['steps'][0]['p50_seconds'] == 3 * 60
+    assert summary['steps'][0]['failure_rate'] == 0.2
+    assert summary['steps'][0]['share_of_step_time'] == pytest.approx(0.75)
+
+    [weekly] = summarize_timings(PlaybookTimingRollup.objects.filter(window=TimingWindow.WEEK))
+    assert weekly['bucket'] == DAY.date() - timedelta(days=DAY.weekday())
+    assert weekly['total_seconds'] == summary['total_seconds']
+
+
+@pytest.mark.django_db
+def test_timings_are_aggregated_in_the_database(analysis, playbook):
+    counts = []
+    for executions in (2, 30):
+        _executions(analysis, playbook, range(1, executions + 1))
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(execution_timings(TimingWindow.MONTH))
+        counts.append(len(queries))
+        assert len(rows) == 1
+    assert counts == [1, 1]
+
+
+@pytest.mark.django_db
+def test_rebuild_since_keeps_earlier_buckets(analysis, playbook):
+    _executions(analysis, playbook, [10])
+    call_command('rebuild_playbook_timings')
+    PlaybookExecution.objects.all().delete()
+
+    rebuild_timing_rollups(since=DAY.date() + timedelta(days=1))
+    assert PlaybookTimingRollup.objects.filter(window=TimingWindow.DAY, step__isnull=True).count() == 1
+    assert not PlaybookTimingRollup.objects.filter(window=TimingWindow.WEEK).exists()
+
+
+@pytest.mark.django_db
+def test_timings_endpoint(analysis, playbook):
+    _executions(analysis, playbook, [10, 20])
+    rebuild_timing_rollups()
+    http = HttpClient()
+    http.force_login(CustomUser.objects.create_user(username="viewer", password="testpass123", email="viewer@ey.com"))
+    url = '/threat-intel/api/playbooks/timings/'
+
+    body = http.get(url, {'window': 'month', 'playbook': playbook.pk}).json()
+    assert body['window'] == 'month'
+    assert [result['executions'] for result in body['results']] == [2]
+    assert http.get(url, {'since': DAY.date() + timedelta(days=1)}).json()['results'] == []
+    assert http.get(url, {'window': 'year'}).status_code == 400
+    assert http.get(url, {'until': 'yesterday'}).status_code == 400
+    assert http.get(url, {'playbook': 'phishing'}).status_code == 400
@@ -0,0 +1,73 @@
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from threat_intelligence.catalog import catalog_stats, get_catalog, get_playbook, playbook_for
+from threat_intelligence.models import Playbook, PlaybookCatalogChange, PlaybookStep
+
+
+def _phishing_playbook():
+    playbook = Playbook.objects.create(name="Phishing", incident_type='true_positive_phishing')
+    first = PlaybookStep.objects.create(playbook=playbook, step_number=2, description="Block sender")
+    second = PlaybookStep.objects.create(playbook=playbook, step_number=1, description="Reset mailbox")
+    first.depends_on.add(second)
+    return playbook
+
+
+@pytest.mark.django_db
+def test_lookups_are_served_from_memory_with_ordered_steps():
+    playbook = _phishing_playbook()
+    assert playbook_for('true_positive_phishing').playbook_id == playbook.pk
+    before = catalog_stats()
+
+    with CaptureQueriesContext(connection) as queries:
+        entry = playbook_for('true_positive_phishing')
+        assert get_playbook(playbook.pk) is entry
+    assert len(queries) == 0
+    assert [step.description for step in entry.steps] == ["Reset mailbox", "Block sender"]
+    assert entry.steps[1].depends_on == (entry.steps[0].id,)
+    assert catalog_stats()['hits'] == before['hits'] + 2
+    assert catalog_stats()['misses'] == before['misses']
+
+
+@pytest.mark.django_db
+def test_edits_are_picked_up_through_the_version():
+    playbook = _phishing_playbook()
+    version = get_catalog().version
+
+    # Local edits are seen on the next lookup
+    PlaybookStep.objects.create(playbook=playbook, step_number=3, description="Notify users")
+    assert len(playbook_for('true_positive_phishing').steps) == 3
+    assert get_catalog().version > version
+
+    # Edits from other processes only bump the version, noticed at the next check
+    Playbook.objects.filter(pk=playbook.pk).update(name="Phishing v2")
+    PlaybookCatalogChange.objects.create()
+    misses = catalog_stats()['misses']
+    assert get_catalog().by_id[playbook.pk].name == "Phishing"
+    assert get_catalog(max_age=0).by_id[playbook.pk].name == "Phishing v2"
+    assert catalog_stats()['misses'] == misses + 1
+
+
+@pytest.mark.django_db
+def test_rolled_back_edits_do_not_stay_cached():
+    playbook = _phishing_playbook()
+    with pytest.raises(RuntimeError), transaction.atomic():
+        PlaybookStep.objects.create(playbook=playbook, step_number=3, description="Never committed")
+        assert len(playbook_for('true_positive_phishing').steps) == 3
+        raise RuntimeError
+
+    assert len(get_catalog(max_age=0).by_id[playbook.pk].steps) == 2
+    assert playbook_for('no_such_type') is None
+
+
+@pytest.mark.django_db
+def test_old_changes_are_pruned_without_moving_the_version_back():
+    _phishing_playbook()
+    PlaybookCatalogChange.objects.update(changed_at=timezone.now() - timezone.timedelta(days=2))
+    version = get_catalog(max_age=0).version
+
+    Playbook.objects.create(name="Malware", incident_type='true_positive_malware')
+    assert PlaybookCatalogChange.objects.count() == 1
+    assert get_catalog(max_age=0).version[0] > version[0]
+    assert playbook_for('true_positive_malware').name == "Malware"
@@ -0,0 +1,197 @@
+import time
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.test import Client as HttpClient
+from django.utils import timezone
+from clients.models import Client
+from common.enums import IOCTypeChoices, PlaybookStatus
+from incidents.models import Incident, Analysis, Job
+from threat_intelligence.models import IOC, Playbook, PlaybookStep
+from threat_intelligence.playbook_engine import run_execution, run_script, topological_order
+from users.models import CustomUser, Analyst
+
+
+def _start(steps, incident_type="phishing", dependencies=None):
+    """Start a playbook of ``(script, timeout)`` steps; a None script is a manual step.
+
+    ``dependencies`` maps step numbers to the step numbers they depend on;
+    without it each step depends on the previous one, as new steps do.
+    """
+    playbook = Playbook.objects.create(name="Contain", incident_type=incident_type)
+    created = {}
+    for number, (script, timeout) in enumerate(steps, start=1):
+        created[number] = PlaybookStep.objects.create(
+            playbook=playbook, step_number=number, description=f"Step {number}",
+            is_automated=script is not None, automation_script=script, timeout_seconds=timeout,
+        )
+    if dependencies is not None:
+        for number, step in created.items():
+            step.depends_on.set([created[other] for other in dependencies.get(number, ())])
+    incident = Incident.objects.create(client=Client.objects.create(name="Test Client", contact_email="test@client.com"))
+    analyst = Analyst.objects.create(user=CustomUser.objects.create(username="analyst1", email="analyst1@ey.com"))
+    analysis = Analysis.objects.create(incident=incident, analyst=analyst, ticket=incident.ticket, notes="notes")
+    return incident.start_playbook(playbook, incident.ticket, analysis)
+
+
+def test_run_script_captures_output_and_enforces_limits():
+    outcome = run_script("print(context['step'] * 2)", {'step': 21})
+    assert outcome.ok and outcome.output == "42\n"
+
+    outcome = run_script("raise SystemExit(3)", {})
+    assert not outcome.ok and "status 3" in outcome.output
+
+    outcome = run_script("import time\nprint('started', flush=True)\ntime.sleep(30)", {}, timeout=1)
+    assert not outcome.ok and "started" in outcome.output and "Timed out" in outcome.output
+    assert outcome.duration < 10
+
+    outcome = run_script("data = bytearray(512 * 1024 * 1024)", {}, memory_limit=128 * 1024 * 1024)
+    assert not outcome.ok and "MemoryError" in outcome.output
+
+
+@pytest.mark.django_db
+def test_automated_steps_complete_in_order_with_their_output():
+    execution = _start([
+        ("print('isolate', context['incident'])", None),
+        ("print('block', [ioc['value'] for ioc in context['iocs']])", None),
+    ])
+    # Starting only queues the run, nothing executes on the request thread
+    assert list(Job.objects.values_list('name', 'payload')) == [
+        ('threat_intelligence.run_playbook', {'execution_id': execution.pk})
+    ]
+    assert execution.step_executions.filter(status=PlaybookStatus.NOT_STARTED).count() == 2
+    IOC.objects.create(type=IOCTypeChoices.IP, value="203.0.113.7").incidents.add(execution.incident)
+
+    assert run_execution(execution.pk) == PlaybookStatus.COMPLETED
+    steps = list(execution.step_executions.all())
+    assert [step.status for step in steps] == [PlaybookStatus.COMPLETED] * 2
+    assert steps[0].result == f"isolate {execution.incident_id}\n"
+    assert steps[1].result == "block ['203.0.113.7']\n"
+    assert steps[0].completion_time <= steps[1].start_time
+    execution.refresh_from_db()
+    assert execution.completion_time is not None
+
+
+@pytest.mark.django_db
+def test_failing_step_fails_the_execution_and_skips_the_rest():
+    execution = _start([("import time; time.sleep(30)", 1), ("print('never')", None)])
+
+    assert run_execution(execution.pk) == PlaybookStatus.FAILED
+    first, second = execution.step_executions.all()
+    assert first.status == PlaybookStatus.FAILED and "Timed out" in first.result
+    assert second.status == PlaybookStatus.NOT_STARTED
+
+
+@pytest.mark.django_db
+def test_manual_step_waits_for_the_analyst():
+    execution = _start([(None, None), ("print('done')", None)])
+
+    assert run_execution(execution.pk) == PlaybookStatus.IN_PROGRESS
+    manual, automated = execution.step_executions.all()
+    assert manual.status == PlaybookStatus.IN_PROGRESS
+    assert automated.status == PlaybookStatus.NOT_STARTED
+    # A second runner does not take over the claimed step
+    assert run_execution(execution.pk) == PlaybookStatus.IN_PROGRESS
+
+    manual.complete("checked")
+    assert Job.objects.filter(name='threat_intelligence.run_playbook').count() == 2
+    assert run_execution(execution.pk) == PlaybookStatus.COMPLETED
+    automated.refresh_from_db()
+    assert automated.result == "done\n"
+
+
+@pytest.mark.django_db
+def test_paused_execution_does_not_run():
+    execution = _start([("print('step')", None)])
+    execution.pause()
+
+    assert run_execution(execution.pk) == PlaybookStatus.PAUSED
+    assert execution.step_executions.get().status == PlaybookStatus.NOT_STARTED
+
+
+@pytest.mark.django_db
+def test_start_playbook_view_returns_before_the_steps_run():
+    execution = _start([("print('first run')", None)])
+    execution.complete()
+    http = HttpClient()
+    http.force_login(CustomUser.objects.create_user(username="viewer", password="testpass123", email="viewer@ey.com"))
+
+    response = http.post(
+        f'/threat-intel/incidents/{execution.incident_id}/start-playbook/{execution.playbook_id}/',
+        {'ticket_id': execution.ticket_id, 'analysis_id': execution.analysis_id},
+        HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+    )
+    new_execution = response.json()['execution_id']
+    assert Job.objects.filter(payload__execution_id=new_execution).exists()
+    assert run_execution(new_execution) == PlaybookStatus.COMPLETED
+
+
+@pytest.mark.django_db
+def test_independent_branches_run_concurrently_and_dependents_wait_for_them():
+    sleep = "import time; time.sleep(1); print(context['step'])"
+    execution = _start(
+        [(sleep, None), (sleep, None), ("print('report')", None)],
+        dependencies={3: [1, 2]},
+    )
+
+    started = time.perf_counter()
+    assert run_execution(execution.pk) == PlaybookStatus.COMPLETED
+    assert time.perf_counter() - started < 1.9
+    first, second, report = execution.step_executions.all()
+    assert first.start_time < second.completion_time and second.start_time < first.completion_time
+    assert report.start_time >= max(first.completion_time, second.completion_time)
+    execution.refresh_from_db()
+    expected = max(first.completion_time - first.start_time, second.completion_time - second.start_time) + \
+        (report.completion_time - report.start_time)
+    assert execution.critical_path_duration == expected
+    assert execution.critical_path_duration < sum(
+        (step.completion_time - step.start_time for step in (first, second, report)), timezone.timedelta(0)
+    )
+
+
+@pytest.mark.django_db
+def test_failed_branch_stops_its_dependents_and_fails_the_execution():
+    execution = _start(
+        [("raise SystemExit(1)", None), ("print('contained')", None), ("print('never')", None)],
+        dependencies={3: [1]},
+    )
+
+    assert run_execution(execution.pk) == PlaybookStatus.FAILED
+    statuses = [step.status for step in execution.step_executions.all()]
+    assert statuses[0] == PlaybookStatus.FAILED
+    assert statuses[2] == PlaybookStatus.NOT_STARTED
+
+
+@pytest.mark.django_db
+def test_step_dependencies_must_stay_acyclic_and_within_the_playbook():
+    execution = _start([("print(1)", None), ("print(2)", None)])
+    first, second = PlaybookStep.objects.filter(playbook=execution.playbook)
+    other = PlaybookStep.objects.create(playbook=Playbook.objects.create(name="Other"), step_number=1, description="x")
+    for add in (lambda: first.depends_on.add(second), lambda: second.dependents.add(first), lambda: first.depends_on.add(other)):
+        with pytest.raises(ValidationError), transaction.atomic():
+            add()
+    assert list(first.depends_on.all()) == [] and list(second.depends_on.all()) == [first]
+
+    # New steps run after the previous step_number unless told otherwise
+    third = PlaybookStep.objects.create(playbook=execution.playbook, step_number=3, description="Report")
+    assert list(third.depends_on.all()) == [second]
+    assert topological_order({1: set(), 2: {3}, 3: {1}}) == [1, 3, 2]
+
+
+@pytest.mark.django_db
+def test_steps_of_a_runner_that_died_are_run_again():
+    execution = _start([("print('isolate')", 1), (None, None)])
+    isolate, review = execution.step_executions.all()
+    # The first runner claimed both steps, then its worker was killed mid-script
+    isolate.execute()
+    review.execute()
+    assert run_execution(execution.pk) == PlaybookStatus.IN_PROGRESS
+    assert isolate.status == PlaybookStatus.IN_PROGRESS
+
+    execution.step_executions.update(start_time=timezone.now() - timezone.timedelta(minutes=5))
+    assert run_execution(execution.pk) == PlaybookStatus.IN_PROGRESS
+    isolate.refresh_from_db()
+    review.refresh_from_db()
+    assert isolate.status == PlaybookStatus.COMPLETED and isolate.result == "isolate\n"
+    # Manual steps wait for their analyst however long it takes
+    assert review.status == PlaybookStatus.IN_PROGRESS
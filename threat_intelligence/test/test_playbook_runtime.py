@@ -0,0 +1,101 @@
+import pytest
+from django.db import connection
+from django.test import Client as HttpClient
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from clients.models import Client
+from common.enums import PlaybookStatus
+from incidents.models import Incident, Analysis
+from threat_intelligence.models import Playbook, PlaybookCatalogChange, PlaybookExecution, PlaybookStep
+from threat_intelligence.catalog import get_playbook
+from threat_intelligence.playbook_engine import run_execution
+from threat_intelligence.playbook_runtime import PlaybookAlreadyRunning, start_playbook
+from users.models import CustomUser, Analyst
+
+
+@pytest.fixture
+def analysis():
+    incident = Incident.objects.create(client=Client.objects.create(name="Test Client", contact_email="test@client.com"))
+    analyst = Analyst.objects.create(user=CustomUser.objects.create(username="analyst1", email="analyst1@ey.com"))
+    return Analysis.objects.create(incident=incident, analyst=analyst, ticket=incident.ticket, notes="notes")
+
+
+def _playbook(steps):
+    playbook = Playbook.objects.create(name=f"Contain {steps}", incident_type="phishing")
+    PlaybookStep.objects.bulk_create(
+        PlaybookStep(playbook=playbook, step_number=number, description=f"Step {number}") for number in range(steps)
+    )
+    return playbook
+
+
+@pytest.mark.django_db
+def test_start_creates_every_step_execution_in_constant_queries(analysis):
+    counts = []
+    for steps in (2, 40):
+        playbook = _playbook(steps)
+        with CaptureQueriesContext(connection) as queries:
+            execution = start_playbook(analysis.incident, playbook, analysis.ticket, analysis)
+        counts.append(len(queries))
+        assert execution.status == PlaybookStatus.IN_PROGRESS and execution.start_time is not None
+        assert execution.step_executions.filter(status=PlaybookStatus.NOT_STARTED).count() == steps
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+def test_a_playbook_runs_once_per_incident_at_a_time(analysis):
+    playbook = _playbook(1)
+    execution = start_playbook(analysis.incident, playbook, analysis.ticket, analysis)
+    execution.pause()
+    with pytest.raises(PlaybookAlreadyRunning):
+        start_playbook(analysis.incident, playbook, analysis.ticket, analysis)
+
+    http = HttpClient()
+    http.force_login(CustomUser.objects.create_user(username="viewer", password="testpass123", email="viewer@ey.com"))
+    url = f'/threat-intel/incidents/{analysis.incident_id}/start-playbook/{playbook.pk}/'
+    data = {'ticket_id': analysis.ticket_id, 'analysis_id': analysis.pk}
+    assert http.post(url, data).json() == {'success': False, 'error': 'Playbook already running'}
+
+    execution.resume()
+    execution.complete()
+    assert http.post(url, data, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()['success']
+
+
+@pytest.mark.django_db
+def test_transitions_are_conditional_updates(analysis):
+    execution = start_playbook(analysis.incident, _playbook(1), analysis.ticket, analysis)
+    stale = PlaybookExecution.objects.get(pk=execution.pk)
+
+    assert execution.pause()
+    # The second copy still believes the execution is in progress, the UPDATE knows better
+    assert not stale.pause()
+    PlaybookExecution.objects.filter(pk=execution.pk).update(pause_time=timezone.now() - timezone.timedelta(minutes=10))
+    assert not stale.complete()
+    assert stale.resume()
+    assert stale.total_paused_time >= timezone.timedelta(minutes=10)
+    assert stale.pause_time is None
+    assert not execution.resume()
+
+    assert stale.fail()
+    execution.refresh_from_db()
+    assert execution.status == PlaybookStatus.FAILED
+    assert not execution.pause() and not execution.complete()
+    with pytest.raises(ValueError):
+        execution.transition(PlaybookStatus.NOT_STARTED)
+
+
+@pytest.mark.django_db
+def test_executions_follow_the_current_steps(analysis):
+    playbook = _playbook(2)
+    assert len(get_playbook(playbook.pk).steps) == 2
+    # Deleted by another process: only the version moves, before this process's next check
+    PlaybookStep.objects.filter(playbook=playbook, step_number=1)._raw_delete(using='default')
+    PlaybookCatalogChange.objects.create()
+
+    execution = start_playbook(analysis.incident, playbook, analysis.ticket, analysis)
+    assert list(execution.step_executions.values_list('step__step_number', flat=True)) == [0]
+
+    # Steps added while it runs no longer match the execution: it fails instead of hanging
+    PlaybookStep.objects.create(playbook=playbook, step_number=5, description="Added later")
+    assert run_execution(execution.pk) == PlaybookStatus.FAILED
+    execution.refresh_from_db()
+    assert "steps changed" in execution.notes
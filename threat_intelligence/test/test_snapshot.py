@@ -0,0 +1,54 @@
+import pytest
+from common.enums import IOCTypeChoices
+from threat_intelligence.matching import IOCMatcher
+from threat_intelligence.models import IOC
+from threat_intelligence.snapshot import build_snapshot, current_snapshot
+
+
+@pytest.mark.django_db
+def test_snapshot_matches_like_the_in_memory_matcher(tmp_path):
+    for ioc_type, value in [
+        (IOCTypeChoices.IP, "198.51.100.7"), (IOCTypeChoices.IP, "10.0.0.0/8"),
+        (IOCTypeChoices.DOMAIN, "evil.example"), (IOCTypeChoices.URL, "http://bad.example/login/"),
+        (IOCTypeChoices.HASH, "d41d8cd98f00b204e9800998ecf8427e"), (IOCTypeChoices.EMAIL, "ceo@phish.example"),
+    ]:
+        IOC.objects.create(type=ioc_type, value=value)
+    observables = [
+        ('ip', '198.51.100.7'), ('ip', '10.20.30.40'), ('ip', '192.0.2.1'), ('domain', 'mail.evil.example'),
+        ('domain', 'notevil.example'), ('url', 'hxxp://bad.example/login/form?id=1'),
+        ('hash', 'D41D8CD98F00B204E9800998ECF8427E'), ('email', 'CEO@phish.example'), ('email', 'x@phish.example'),
+    ]
+    snapshot = build_snapshot(tmp_path / 'iocs.bin')
+    assert len(snapshot) == 6
+    assert snapshot.match(observables) == IOCMatcher().load().match(observables)
+    snapshot.close()
+
+
+@pytest.mark.django_db
+def test_incremental_snapshot_applies_changes_and_is_picked_up_by_workers(tmp_path):
+    path = tmp_path / 'iocs.bin'
+    changed = IOC.objects.create(type=IOCTypeChoices.DOMAIN, value="old.example")
+    deleted = IOC.objects.create(type=IOCTypeChoices.HASH, value="abc123")
+    kept = IOC.objects.create(type=IOCTypeChoices.IP, value="192.0.2.10")
+    build_snapshot(path).close()
+    worker = current_snapshot(path)
+    assert worker.version == 1
+
+    changed.value = "new.example"
+    changed.save()
+    deleted_id = deleted.id
+    deleted.delete()
+    added = IOC.objects.create(type=IOCTypeChoices.IP, value="2001:db8::/32")
+    snapshot = build_snapshot(path)
+
+    assert snapshot.version == 2
+    assert len(snapshot) == 3
+    assert snapshot.match_one('domain', 'old.example') == set()
+    assert snapshot.match_one('domain', 'www.new.example') == {changed.id}
+    assert snapshot.match_one('hash', 'abc123') == set()
+    assert snapshot.match_one('ip', '192.0.2.10') == {kept.id}
+    assert snapshot.match_one('ip', '2001:db8::1') == {added.id}
+    # The worker keeps serving its old mapping until it notices the swap.
+    assert worker.match_one('hash', 'abc123') == {deleted_id}
+    assert current_snapshot(path) is worker
+    assert current_snapshot(path, max_age=0).version == 2
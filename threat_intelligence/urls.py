@@ -8,9 +8,15 @@ urlpatterns = [
     path('iocs/', views.ioc_list, name='ioc_list'),
     path('iocs/<int:ioc_id>/', views.ioc_detail, name='ioc_detail'),
     path('incidents/<int:incident_id>/add-ioc/', views.add_ioc_to_incident, name='add_ioc_to_incident'),
+    path('api/incidents/<int:incident_id>/iocs/', views.api_add_iocs_to_incident, name='api_add_iocs_to_incident'),
     path('playbooks/', views.playbook_list, name='playbook_list'),
     path('playbooks/<int:playbook_id>/', views.playbook_detail, name='playbook_detail'),
     path('incidents/<int:incident_id>/start-playbook/<int:playbook_id>/', views.start_playbook, name='start_playbook'),
     path('incidents/<int:incident_id>/check-ioc-matches/', views.check_ioc_matches, name='check_ioc_matches'),
     path('pause-playbook/<int:execution_id>/', views.pause_playbook, name='pause_playbook'),
+    path('api/iocs/', views.api_ioc_list, name='api_ioc_list'),
+    path('api/iocs/import/', views.api_import_iocs, name='api_import_iocs'),
+    path('api/iocs/import/<int:import_id>/', views.api_import_status, name='api_import_status'),
+    path('api/blocklists/<str:ioc_type>.<str:file_format>', views.api_blocklist, name='api_blocklist'),
+    path('api/playbooks/timings/', views.api_playbook_timings, name='api_playbook_timings'),
 ]
\ No newline at end of file
@@ -1,8 +1,27 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from .models import IOC, Playbook, PlaybookExecution,PlaybookStepExecution
+from django.db import transaction
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags
+from .models import IOC, IOCFeedImport, Playbook, PlaybookExecution, PlaybookTimingRollup
+from .playbook_runtime import PlaybookAlreadyRunning
 from incidents.models import Incident, Analysis, Ticket
+from common.enums import FeedFormat, IOCSourceChoices, IOCTypeChoices, TimingWindow
+from incidents.renderers import FastJSONRenderer
+from .analytics import summarize_timings
+from .blocklists import BLOCKLIST_FORMATS, artifact_path, delta, etag, export_blocklist, read_manifest
+from .enrichment import enrich_in_background
+from .feeds import queue_import
+from .pagination import IOCCursorPagination
+from .serializers import IOCSerializer
+from rest_framework.decorators import api_view, permission_classes, parser_classes, renderer_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from datetime import date
 import json
 
 
@@ -12,10 +31,41 @@ def threat_intel_home(request):
         'title': 'Threat Intelligence Dashboard'
     })
 
+def filter_iocs(params):
+    """IOCs narrowed by the ``type``, ``source``, ``is_blocked`` and ``q`` query parameters.
+
+    Raises ValueError with a message for the client on an unknown filter value.
+    """
+    iocs = IOC.objects.all()
+    if params.get('type'):
+        if params['type'] not in IOCTypeChoices.values:
+            raise ValueError(f"type must be one of {', '.join(IOCTypeChoices.values)}.")
+        iocs = iocs.filter(type=params['type'])
+    if params.get('source'):
+        if params['source'] not in IOCSourceChoices.values:
+            raise ValueError(f"source must be one of {', '.join(IOCSourceChoices.values)}.")
+        iocs = iocs.filter(source=params['source'])
+    if params.get('is_blocked'):
+        if params['is_blocked'] not in ('true', 'false'):
+            raise ValueError("is_blocked must be true or false.")
+        iocs = iocs.filter(is_blocked=params['is_blocked'] == 'true')
+    if params.get('q', '').strip():
+        iocs = iocs.search(params['q'].strip())
+    return iocs
+
 @login_required
 def ioc_list(request):
-    iocs = IOC.objects.all().order_by('-created_at')
-    return render(request, 'threat_intelligence/ioc_list.html', {'iocs': iocs})
+    paginator = IOCCursorPagination()
+    try:
+        iocs = paginator.paginate_queryset(filter_iocs(request.GET), Request(request))
+    except (ValueError, NotFound) as e:
+        # NotFound is DRF's answer to a malformed ?cursor=
+        return render(request, 'threat_intelligence/ioc_list.html', {'iocs': [], 'error': str(e)}, status=400)
+    return render(request, 'threat_intelligence/ioc_list.html', {
+        'iocs': iocs,
+        'next_url': paginator.get_next_link(),
+        'previous_url': paginator.get_previous_link(),
+    })
 
 @login_required
 def ioc_detail(request, ioc_id):
@@ -29,14 +79,44 @@ def add_ioc_to_incident(request, incident_id):
         ioc_type = request.POST.get('type')
         ioc_value = request.POST.get('value')
         source = request.POST.get('source', 'internal')
-        if not IOC.objects.filter(type=ioc_type, value=ioc_value).exists():
+        if not IOC.objects.matching(ioc_type, ioc_value).exists():
             ioc = incident.add_ioc(ioc_type, ioc_value, source)
+            # Providers are slow; look the indicator up after the response instead of during it.
+            transaction.on_commit(lambda: enrich_in_background([ioc.pk]))
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': True, 'ioc_id': ioc.id})
         else:
             return JsonResponse({'success': False, 'error': 'IOC already exists'})
     return redirect('incident_detail', pk=incident_id)
 
+ATTACH_IOCS_MAX_ITEMS = 500
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_add_iocs_to_incident(request, incident_id):
+    incident = get_object_or_404(Incident, pk=incident_id)
+    items = request.data.get('iocs') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items or len(items) > ATTACH_IOCS_MAX_ITEMS:
+        return Response({'error': f'iocs must be a list of 1 to {ATTACH_IOCS_MAX_ITEMS} {{"type", "value"}} objects.'}, status=400)
+    if not all(
+        isinstance(item, dict) and isinstance(item.get('type'), str) and isinstance(item.get('value'), str)
+        for item in items
+    ):
+        return Response({'error': 'Each IOC must be a {"type", "value"} object of strings.'}, status=400)
+    source = request.data.get('source', IOCSourceChoices.INTERNAL)
+    if source not in IOCSourceChoices.values:
+        return Response({'error': f"source must be one of {', '.join(IOCSourceChoices.values)}."}, status=400)
+
+    results = incident.add_iocs([(item.get('type'), item.get('value')) for item in items], source)
+    new_ids = [result['id'] for result in results if result.get('created')]
+    if new_ids:
+        transaction.on_commit(lambda: enrich_in_background(new_ids))
+    return Response({
+        'results': results,
+        'match_score': incident.check_iocs_against_db(),
+        'severity': incident.severity,
+    }, status=201)
+
 @login_required
 def playbook_list(request):
     playbooks = Playbook.objects.all()
@@ -57,14 +137,13 @@ def start_playbook(request, incident_id, playbook_id):
         ticket = get_object_or_404(Ticket, pk=ticket_id)
         analysis = get_object_or_404(Analysis, pk=analysis_id)
         
-        if not incident.playbook_executions.filter(playbook=playbook, status__in=['in_progress', 'paused']).exists(): 
+        try:
+            # Steps run on the playbook engine once the execution is committed
             execution = incident.start_playbook(playbook, ticket, analysis)
-            for step in playbook.steps.all():
-                PlaybookStepExecution.objects.create(playbook_execution=execution, step=step).execute()
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({'success': True, 'execution_id': execution.id})
-        else:
+        except PlaybookAlreadyRunning:
             return JsonResponse({'success': False, 'error': 'Playbook already running'})
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'success': True, 'execution_id': execution.id})
     return redirect('incident_detail', pk=incident_id)
 
 @login_required
@@ -73,7 +152,10 @@ def check_ioc_matches(request, incident_id):
     match_score = incident.check_iocs_against_db()
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({'match_score': match_score})
+        return JsonResponse({
+            'match_score': match_score,
+            'correlated_incidents': incident.correlated_incidents(limit=50),
+        })
     
     return redirect('incident_detail', pk=incident_id)
 
@@ -81,6 +163,101 @@ def check_ioc_matches(request, incident_id):
 def pause_playbook(request, execution_id):
     execution = get_object_or_404(PlaybookExecution, id=execution_id)
     if request.method == 'POST':
-        execution.pause()
-        return JsonResponse({'success': True})
-    return redirect('incident_detail', pk=execution.incident.id)
\ No newline at end of file
+        return JsonResponse({'success': execution.pause()})
+    return redirect('incident_detail', pk=execution.incident.id)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def api_import_iocs(request):
+    feed = request.FILES.get('file')
+    file_format = request.data.get('format')
+    source = request.data.get('source', IOCSourceChoices.EXTERNAL)
+    if not feed or file_format not in FeedFormat.values or source not in IOCSourceChoices.values:
+        return Response({'error': 'A file, a format (csv, jsonl or stix) and a valid source are required.'}, status=400)
+    # The upload is saved and imported by a job worker; its progress is polled from api_import_status.
+    job = queue_import(feed, file_format, source=source)
+    return Response({'import_id': job.id, 'status': job.status}, status=202)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_import_status(request, import_id):
+    job = get_object_or_404(IOCFeedImport, pk=import_id)
+    return Response({
+        'import_id': job.id,
+        'status': job.status,
+        'rows_read': job.rows_read,
+        'rows_upserted': job.rows_upserted,
+        'rows_rejected': job.rows_rejected,
+        'rows_per_second': job.rows_per_second,
+        'error': job.error,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
+def api_ioc_list(request):
+    # Keyset pages: follow the ``next`` link rather than building page numbers.
+    try:
+        iocs = filter_iocs(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    paginator = IOCCursorPagination()
+    page = paginator.paginate_queryset(iocs, request)
+    return paginator.get_paginated_response(IOCSerializer(page, many=True).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_blocklist(request, ioc_type, file_format):
+    # Polled every minute by firewalls: served from the pre-rendered files, not the IOC table.
+    if ioc_type not in IOCTypeChoices.values or file_format not in BLOCKLIST_FORMATS:
+        return Response({'error': f"Blocklists exist for {', '.join(IOCTypeChoices.values)} "
+                                  f"as {', '.join(BLOCKLIST_FORMATS)}."}, status=404)
+    exported = read_manifest().get(ioc_type)
+    if exported is None:
+        export_blocklist(ioc_type)
+        exported = read_manifest()[ioc_type]
+    version = exported['version']
+
+    since = request.query_params.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({'error': 'since must be a blocklist version.'}, status=400)
+        if since < exported['oldest_version']:
+            return Response({'error': 'Changes that old were pruned, download the full list.', 'version': version}, status=410)
+        tag = etag(ioc_type, f'since-{since}', exported)
+        if tag in parse_etags(request.headers.get('If-None-Match', '')):
+            return HttpResponseNotModified(headers={'ETag': tag})
+        response = Response(delta(ioc_type, since, version))
+    else:
+        tag = etag(ioc_type, file_format, exported)
+        if tag in parse_etags(request.headers.get('If-None-Match', '')):
+            return HttpResponseNotModified(headers={'ETag': tag})
+        response = FileResponse(open(artifact_path(ioc_type, file_format), 'rb'), content_type=BLOCKLIST_FORMATS[file_format])
+    response['ETag'] = tag
+    response['X-Blocklist-Version'] = version
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_playbook_timings(request):
+    # Served from PlaybookTimingRollup only, refreshed by `manage.py rebuild_playbook_timings`.
+    params = request.query_params
+    window = params.get('window', TimingWindow.DAY)
+    if window not in TimingWindow.values:
+        return Response({'error': f"window must be one of {', '.join(TimingWindow.values)}."}, status=400)
+    rollups = PlaybookTimingRollup.objects.filter(window=window)
+    try:
+        if params.get('since'):
+            rollups = rollups.filter(bucket__gte=date.fromisoformat(params['since']))
+        if params.get('until'):
+            rollups = rollups.filter(bucket__lte=date.fromisoformat(params['until']))
+    except ValueError:
+        return Response({'error': 'since/until must be YYYY-MM-DD dates.'}, status=400)
+    if params.get('playbook'):
+        if not params['playbook'].isdigit():
+            return Response({'error': 'playbook must be a playbook id.'}, status=400)
+        rollups = rollups.filter(playbook_id=params['playbook'])
+    return Response({'window': window, 'results': summarize_timings(rollups)})
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from incidents.models import Ticket, OPEN_TICKET_STATUSES
+from users.models import Analyst
+
+
+class Command(BaseCommand):
+    help = "Recompute Analyst.open_ticket_count from the assigned open tickets and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report analysts whose counter drifted.")
+
+    def handle(self, *args, **options):
+        open_tickets = Ticket.objects.filter(
+            assigned_analysts=OuterRef('pk'), status__in=OPEN_TICKET_STATUSES
+        ).order_by().values('assigned_analysts').annotate(total=Count('pk')).values('total')
+        real_count = Coalesce(Subquery(open_tickets), Value(0))
+
+        with transaction.atomic():
+            drifted = list(
+                Analyst.objects.select_for_update(of=('self',)).annotate(real_count=real_count)
+                .exclude(open_ticket_count=F('real_count'))
+                .values_list('pk', 'open_ticket_count', 'real_count')
+            )
+            for pk, stored, real in drifted:
+                self.stdout.write(f"Analyst {pk}: stored {stored}, actual {real}")
+            if drifted and not options['dry_run']:
+                Analyst.objects.filter(pk__in=[pk for pk, _, _ in drifted]).update(open_ticket_count=real_count)
+
+        verb = "Found" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(drifted)} drifted workload counter(s)."))
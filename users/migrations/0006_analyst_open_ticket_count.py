@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+OPEN_TICKET_STATUSES = ['new', 'assigned', 'in_progress']
+
+
+def populate_open_ticket_count(apps, schema_editor):
+    Analyst = apps.get_model('users', 'Analyst')
+    Ticket = apps.get_model('incidents', 'Ticket')
+    open_tickets = Ticket.objects.filter(
+        assigned_analysts=OuterRef('pk'), status__in=OPEN_TICKET_STATUSES
+    ).order_by().values('assigned_analysts').annotate(total=Count('pk')).values('total')
+    Analyst.objects.update(open_ticket_count=Coalesce(Subquery(open_tickets), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_customuser_email'),
+        ('incidents', '0004_alter_ticket_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyst',
+            name='open_ticket_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_open_ticket_count, migrations.RunPython.noop),
+    ]
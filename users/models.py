@@ -1,8 +1,9 @@
 from django.db import models
+from django.db.models import F, Case, When
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractUser
 from django.contrib.postgres.fields import ArrayField
 from django.core.validators import RegexValidator
-from common.enums import TicketStatus
 import uuid
 
 
@@ -19,16 +20,38 @@ class Analyst(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True)
     current_shift = models.ForeignKey('shifts.Shift', on_delete=models.SET_NULL, null=True, blank=True, related_name='analysts')
     max_capacity = models.PositiveIntegerField(default=5)
+    # Denormalized count of open tickets (new/assigned/in progress) assigned to this analyst.
+    # Kept in sync by the ticket lifecycle; `manage.py reconcile_workloads` repairs drift.
+    open_ticket_count = models.PositiveIntegerField(default=0)
 
     @property
     def current_workload(self):
-        return self.assigned_tickets.filter(
-            status__in=[TicketStatus.NEW, TicketStatus.ASSIGNED, TicketStatus.IN_PROGRESS]
-        ).count()
+        return self.open_ticket_count
 
     def can_take_ticket(self, severity):
+        self.refresh_from_db(fields=['open_ticket_count'])
         return self.current_workload < self.max_capacity
 
+    def reserve_ticket_slot(self):
+        """Atomically take one unit of capacity; returns False if the analyst is full."""
+        reserved = Analyst.objects.filter(
+            pk=self.pk, open_ticket_count__lt=F('max_capacity')
+        ).update(open_ticket_count=F('open_ticket_count') + 1)
+        if reserved:
+            self.open_ticket_count += 1
+        return bool(reserved)
+
+    @staticmethod
+    def adjust_workloads(deltas):
+        """Apply ``{analyst_pk: delta}`` to the open ticket counters in a single UPDATE."""
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        Analyst.objects.filter(pk__in=deltas).update(open_ticket_count=Greatest(
+            Case(*[When(pk=pk, then=F('open_ticket_count') + delta) for pk, delta in deltas.items()]),
+            0
+        ))
+
     def __str__(self):
         return f"Analyst: {self.user.get_full_name()}"
 